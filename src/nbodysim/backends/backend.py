@@ -0,0 +1,150 @@
+import numpy as np
+
+from nbodysim import nmath as nm
+
+class Backend:
+    """
+    Class defining a general gravity backend, acting as a "superclass" for all methods which NBody can use
+    to calculate accelerations in place of its direct summation over every pair of bodies
+    """
+
+    # True if the accelerations satisfy Newton's third law exactly (so the COM of the system doesn't drift)
+    symmetric = True
+
+    # True if the backend resolves close encounters between bodies, so collisions can be detected.
+    # Backends which aren't collisional must calculate the potential of each body (used for the GPE)
+    collisional = True
+
+    # True if the backend calculates the potential of each body, so the GPE doesn't require direct summation
+    potentials = False
+
+    # True if the backend calculates every interaction between pairs of bodies (accelerations, GPE, minimum distance & ratio |dx|/|dv|)
+    # in a single pass (see DirectBackend), which NBody then uses in place of its own direct summation
+    interactions = False
+
+    # attributes holding the results of the last evaluation (overloaded by backends which keep them), which aren't pickled
+    caches = ()
+
+    def __getstate__(self):
+        """
+        Pickles (and copies) the configuration of the backend only, so the results of its last evaluation (see caches) aren't sent
+        """
+
+        return {name: value for name, value in self.__dict__.items() if name not in self.caches}
+
+    def __setstate__(self, state):
+        """
+        Restores the configuration of the backend (see __getstate__), with empty results of the last evaluation
+        """
+
+        self.__dict__.update(state)
+
+        for name in self.caches:
+            setattr(self, name, None)
+
+    def get_acceleration(self, positions, masses, G = 1):
+        """
+        Overloaded method, dependent on the method used to calculate gravity.
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: an (n x 3) matrix, with each entry i corresponding to the acceleration of body i
+        """
+
+        return None
+
+    def get_potential(self, positions, masses, G = 1):
+        """
+        Overloaded method, for backends which can calculate the potential of each body alongside its acceleration.
+        If the backend doesn't calculate potentials (returning None), NBody calculates the GPE by direct summation.
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: an array with the potential -G * sum_j m_j/|r_i - r_j| of each body i
+        """
+
+        return None
+
+    def get_force_error(self, positions, masses, G = 1):
+        """
+        Compares the accelerations calculated by the backend against those calculated via direct summation.
+        Direct summation is O(n^2), so this should only be used on demand (i.e to choose the parameters of the backend)
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: an array with the relative error |a - a_direct|/|a_direct| of the acceleration of each body
+        """
+
+        acceleration = self.get_acceleration(positions, masses, G = G)
+        direct_acceleration = nm.direct_acceleration(positions, masses, G = G)
+
+        error = nm.ten_norm(acceleration - direct_acceleration, axis = 1, sqrt = True)
+        direct_norm = nm.ten_norm(direct_acceleration, axis = 1, sqrt = True)
+
+        # bodies which feel no acceleration are compared in absolute terms
+        return np.divide(error, direct_norm, out = error, where = direct_norm != 0)
+
+class FieldBackend(Backend):
+    """
+    Class defining a backend which calculates the acceleration and the potential of every body in a single evaluation,
+    acting as a "superclass" for FMM and ParticleMesh.
+    The result of the last evaluation is kept, so the potential used for the GPE (calculated right after the acceleration
+    of the same positions during an integration step) isn't recomputed.
+    """
+
+    potentials = True
+
+    # positions & masses, alongside the results of the last evaluation
+    caches = ("last_positions", "last_masses", "last_G", "last_acceleration", "last_potential")
+
+    def __init__(self):
+        for name in self.caches:
+            setattr(self, name, None)
+
+    def evaluate(self, positions, masses, G = 1):
+        """
+        Overloaded method, dependent on the method used to calculate gravity.
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: a tuple, with an (n x 3) matrix of accelerations, and an array with the potential of each body
+        """
+
+        return None, None
+
+    def update_evaluation(self, positions, masses, G):
+        """
+        Evaluates the backend, unless the last evaluation was performed for the same system
+        """
+
+        if not (self.last_G == G and np.array_equal(self.last_positions, positions) and np.array_equal(self.last_masses, masses)):
+            self.last_acceleration, self.last_potential = self.evaluate(positions, masses, G = G)
+            self.last_positions = np.array(positions)
+            self.last_masses = np.array(masses)
+            self.last_G = G
+
+    def get_acceleration(self, positions, masses, G = 1):
+        """
+        Calculates the acceleration of every body, reusing the last evaluation if it was performed for the same system
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: an (n x 3) matrix, with each entry i corresponding to the acceleration of body i
+        """
+
+        self.update_evaluation(positions, masses, G)
+
+        return self.last_acceleration
+
+    def get_potential(self, positions, masses, G = 1):
+        """
+        Calculates the potential of every body, reusing the last evaluation if it was performed for the same system
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: an array with the potential -G * sum_j m_j/|r_i - r_j| of each body i
+        """
+
+        self.update_evaluation(positions, masses, G)
+
+        return self.last_potential
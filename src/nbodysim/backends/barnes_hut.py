@@ -0,0 +1,198 @@
+import numpy as np
+
+from nbodysim import nmath as nm
+from nbodysim.backends.backend import Backend
+
+def morton_keys(cells, depth):
+    """
+    Interleaves the bits of the integer coordinates of a set of cells, producing their Morton (Z-order) keys
+    Cells which share the first 3l bits of their keys lie within the same node at level l of an octree
+    :param cells: an (n x 3) matrix of integer coordinates, each within [0, 2^depth)
+    :param depth: the number of bits used for each coordinate
+    :return: an array with the Morton key of each cell
+    """
+
+    keys = np.zeros(len(cells), dtype = np.int64)
+
+    for bit in range(depth):
+        for axis in range(3):
+            keys |= ((cells[:, axis] >> bit) & 1) << (3 * bit + (2 - axis))
+
+    return keys
+
+class BarnesHut(Backend):
+    """
+    Class defining a Barnes-Hut backend, which approximates gravity in O(n log n) using an octree.
+    A node of the octree which is far enough away from a body (as determined by the opening angle)
+    acts on it as a single body at its centre of mass, with the total mass of the node.
+    """
+
+    # approximated forces don't satisfy Newton's third law exactly
+    symmetric = False
+
+    # the octree of the last evaluation (see build_tree)
+    caches = ("size", "keys", "order", "node_level", "node_prefix", "node_start", "node_count", "node_side", "node_leaf",
+              "node_first_child", "node_n_children", "node_mass", "node_com")
+
+    def __init__(self, theta = 0.5, leaf_size = 8, max_depth = 16, chunk_size = 4096):
+        """
+        :param theta: opening angle. A node of side s, with centre of mass at distance d from a body is approximated if s/d < theta.
+                      Smaller theta leads to more accurate accelerations. If 0, the result is the same as direct summation.
+        :param leaf_size: maximum number of bodies in a node before it is split into 8 children
+        :param max_depth: maximum depth of the octree (at most 21, so that the keys of the nodes fit in 64 bits)
+        :param chunk_size: number of bodies for which the octree is walked at once. Used to limit memory usage.
+        """
+
+        assert theta >= 0, f"The opening angle must be non-negative, but was {theta}"
+        assert 0 < max_depth <= 21, f"The maximum depth must be between 1 and 21, but was {max_depth}"
+
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.max_depth = max_depth
+        self.chunk_size = chunk_size
+
+    def build_tree(self, positions, masses):
+        """
+        Builds the octree for a system of bodies, level by level.
+        The bodies are sorted by their Morton keys, so every node corresponds to a contiguous block of the sorted bodies,
+        and the children of every node are contiguous within the following level.
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        """
+
+        n = len(positions)
+        depth = self.max_depth
+
+        # the root node is the smallest cube containing every body
+        corner = np.min(positions, axis = 0)
+        self.size = np.max(np.max(positions, axis = 0) - corner)
+
+        if self.size == 0:
+            self.size = 1
+
+        # compute the cell containing each body at the deepest level of the octree, alongside its Morton key
+        cells = np.floor((positions - corner) * (2**depth / self.size)).astype(np.int64)
+        cells = np.clip(cells, 0, 2**depth - 1)
+
+        self.keys = morton_keys(cells, depth)
+        self.order = np.argsort(self.keys, kind = "stable")
+        sorted_keys = self.keys[self.order]
+
+        # compute the nodes of each level, stopping once every node is a leaf
+        levels = []
+
+        for level in range(depth + 1):
+            prefixes = sorted_keys >> (3 * (depth - level))
+            starts = np.flatnonzero(np.concatenate(([True], prefixes[1:] != prefixes[:-1])))
+            counts = np.diff(np.append(starts, n))
+
+            levels.append((prefixes[starts], starts, counts))
+
+            if (counts <= self.leaf_size).all():
+                break
+
+        # the number of nodes within the levels before each level
+        offsets = np.cumsum([0] + [len(prefixes) for prefixes, _, _ in levels])
+
+        self.node_level = np.concatenate([np.full(len(prefixes), level) for level, (prefixes, _, _) in enumerate(levels)])
+        self.node_prefix = np.concatenate([prefixes for prefixes, _, _ in levels])
+        self.node_start = np.concatenate([starts for _, starts, _ in levels])
+        self.node_count = np.concatenate([counts for _, _, counts in levels])
+        self.node_side = self.size / 2.0**self.node_level
+        self.node_leaf = (self.node_count <= self.leaf_size) | (self.node_level == len(levels) - 1)
+
+        # the children of a node are the nodes in the following level sharing its prefix
+        self.node_first_child = np.zeros(offsets[-1], dtype = np.int64)
+        self.node_n_children = np.zeros(offsets[-1], dtype = np.int64)
+
+        for level in range(len(levels) - 1):
+            parent_prefixes = levels[level][0]
+            child_parents = levels[level + 1][0] >> 3
+            first = np.searchsorted(child_parents, parent_prefixes, side = "left")
+            last = np.searchsorted(child_parents, parent_prefixes, side = "right")
+
+            self.node_first_child[offsets[level]:offsets[level + 1]] = first + offsets[level + 1]
+            self.node_n_children[offsets[level]:offsets[level + 1]] = last - first
+
+        # compute the total mass and the centre of mass of each node
+        sorted_masses = masses[self.order]
+        sorted_positions = positions[self.order]
+
+        self.node_mass = np.add.reduceat(sorted_masses, self.node_start)
+        weighted_positions = np.add.reduceat(sorted_masses[:, np.newaxis] * sorted_positions, self.node_start, axis = 0)
+
+        # nodes without mass are placed at the mean position of their bodies (they don't exert any force anyway)
+        self.node_com = np.add.reduceat(sorted_positions, self.node_start, axis = 0) / self.node_count[:, np.newaxis]
+        np.divide(weighted_positions, self.node_mass[:, np.newaxis], out = self.node_com, where = self.node_mass[:, np.newaxis] != 0)
+
+    def add_acceleration(self, acceleration, bodies, distances, masses):
+        """
+        Adds the acceleration felt by a set of bodies due to a set of point masses
+        :param acceleration: (n x 3) matrix, on which the accelerations are accumulated
+        :param bodies: index of the body feeling each interaction
+        :param distances: direction vector from the body to the point mass, for each interaction
+        :param masses: the mass of the point mass, for each interaction
+        """
+
+        dist_mag = nm.ten_norm(distances, axis = 1, sqrt = False)
+
+        # bodies at the same position exert no force (same as in direct summation)
+        dist_mag[dist_mag == 0] = np.inf
+
+        acc_direction = (masses * dist_mag**(-1.5))[:, np.newaxis] * distances
+
+        for k in range(3):
+            acceleration[:, k] += np.bincount(bodies, weights = acc_direction[:, k], minlength = len(acceleration))
+
+    def get_acceleration(self, positions, masses, G = 1):
+        """
+        Calculates the acceleration of every body by walking the octree.
+        The walk is performed for every body simultaneously, keeping track of the (body, node) pairs still to be visited.
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: an (n x 3) matrix, with each entry i corresponding to the acceleration of body i
+        """
+
+        n = len(positions)
+        self.build_tree(positions, masses)
+
+        acceleration = np.zeros(shape = (n, 3))
+
+        for chunk_start in range(0, n, self.chunk_size):
+            # every body starts the walk at the root
+            bodies = np.arange(chunk_start, min(chunk_start + self.chunk_size, n))
+            nodes = np.zeros(len(bodies), dtype = np.int64)
+
+            while len(bodies) > 0:
+                distances = self.node_com[nodes] - positions[bodies]
+
+                # a node containing the body can never be approximated (the body would attract itself)
+                contains = self.node_prefix[nodes] == self.keys[bodies] >> (3 * (self.max_depth - self.node_level[nodes]))
+
+                # opening criterion: s/d < theta
+                approximate = (self.node_side[nodes]**2 < self.theta**2 * nm.ten_norm(distances, axis = 1, sqrt = False)) & ~contains
+
+                self.add_acceleration(acceleration, bodies[approximate], distances[approximate], self.node_mass[nodes[approximate]])
+
+                # leaves which can't be approximated interact directly with each of their bodies
+                leaves = ~approximate & self.node_leaf[nodes]
+                leaf_counts = self.node_count[nodes[leaves]]
+                leaf_bodies = np.repeat(bodies[leaves], leaf_counts)
+                leaf_members = self.order[nm.expand_ranges(self.node_start[nodes[leaves]], leaf_counts)]
+
+                not_self = leaf_members != leaf_bodies
+                leaf_bodies = leaf_bodies[not_self]
+                leaf_members = leaf_members[not_self]
+
+                self.add_acceleration(acceleration, leaf_bodies, positions[leaf_members] - positions[leaf_bodies], masses[leaf_members])
+
+                # the remaining nodes are opened, so the walk continues with their children
+                opened = ~approximate & ~self.node_leaf[nodes]
+                n_children = self.node_n_children[nodes[opened]]
+                bodies = np.repeat(bodies[opened], n_children)
+                nodes = nm.expand_ranges(self.node_first_child[nodes[opened]], n_children)
+
+        acceleration *= G
+
+        return acceleration
@@ -0,0 +1,124 @@
+import numpy as np
+
+from nbodysim import nmath as nm
+from nbodysim import jit_kernels as jk
+from nbodysim.backends.backend import Backend
+
+class DirectBackend(Backend):
+    """
+    Class defining a backend which calculates gravity exactly, by direct summation over every distinct pair of bodies,
+    acting as a "superclass" for the different implementations of direct summation.
+    The accelerations, GPE, minimum distance and minimum ratio |dx|/|dv| are calculated in a single fused pass,
+    which NBody uses in place of its own (so they are reused within a step, as with backend = None).
+    """
+
+    interactions = True
+
+    def get_interactions(self, positions, masses, G = 1, acceleration = True, velocities = None):
+        """
+        Overloaded method, dependent on the implementation of direct summation.
+        :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :param acceleration: if False, the accelerations aren't calculated
+        :param velocities: an (n x d) matrix with the velocities of the bodies. If None, the minimum ratio |dx|/|dv| isn't calculated
+        :return: a tuple, with the (n x d) matrix of accelerations (None if acceleration is False), the GPE of the system,
+                 the minimum distance between any 2 bodies, and the minimum ratio |dx|/|dv| (None if velocities is None)
+        """
+
+        return None, None, None, None
+
+    def get_acceleration(self, positions, masses, G = 1):
+        """
+        Calculates the acceleration of every body by direct summation
+        :param positions: an (n x d) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: an (n x d) matrix, with each entry i corresponding to the acceleration of body i
+        """
+
+        return self.get_interactions(positions, masses, G = G)[0]
+
+class TiledDirect(DirectBackend):
+    """
+    Class defining direct summation in square tiles of pairs of bodies, which fit within a memory budget (see nm.tiled_interactions).
+    With several workers, the tiles are split over a pool of threads.
+    This is the same direct summation used by NBody without a backend.
+    """
+
+    def __init__(self, memory = 2**26, workers = 1):
+        """
+        :param memory: maximum number of bytes used at any time by the tiles
+        :param workers: number of threads over which the tiles are split
+        """
+
+        self.memory = memory
+        self.workers = workers
+
+    def get_interactions(self, positions, masses, G = 1, acceleration = True, velocities = None):
+        """
+        Calculates the interactions between every pair of bodies via nm.tiled_interactions (see DirectBackend.get_interactions)
+        """
+
+        return nm.tiled_interactions(positions, masses, G = G, memory = self.memory, acceleration = acceleration,
+                                     velocities = velocities, workers = self.workers)
+
+class VectorisedDirect(DirectBackend):
+    """
+    Class defining direct summation over every pair of bodies at once, as flat arrays of the n(n-1)/2 pairs of nm.pair_indices.
+    It avoids the overhead of looping over tiles, but uses O(n^2) memory, so it is only suited to small systems.
+    """
+
+    def get_interactions(self, positions, masses, G = 1, acceleration = True, velocities = None):
+        """
+        Calculates the interactions between every pair of bodies as flat arrays of pairs (see DirectBackend.get_interactions)
+        """
+
+        positions = np.asarray(positions, dtype = np.float64)
+        n = len(positions)
+        i, j = nm.pair_indices(n)
+
+        pair_distances = positions[j] - positions[i]
+        distances = nm.ten_norm(pair_distances, axis = 1, sqrt = True)
+        min_distance = np.min(distances) if n > 1 else np.inf
+
+        min_ratio = None
+
+        if velocities is not None:
+            velocities = np.asarray(velocities, dtype = np.float64)
+            pair_velocities = nm.ten_norm(velocities[j] - velocities[i], axis = 1, sqrt = True)
+
+            # bodies moving with the same velocity never approach each other, so they don't restrict the timestep
+            ratios = np.divide(distances, pair_velocities, out = np.full(len(distances), np.inf), where = pair_velocities != 0)
+            min_ratio = np.min(ratios) if n > 1 else np.inf
+
+        # bodies at the same position have no potential energy, as they exert no force on each other
+        gpe = -G * np.sum(np.divide(masses[i] * masses[j], distances, out = np.zeros(len(distances)), where = distances != 0))
+
+        total_acceleration = None
+
+        if acceleration:
+            total_acceleration = nm.pair_acceleration(pair_distances, masses[i, np.newaxis], masses[j, np.newaxis], n, G = G)
+
+        return total_acceleration, gpe, min_distance, min_ratio
+
+class CompiledDirect(DirectBackend):
+    """
+    Class defining direct summation by a loop over every pair of bodies, compiled with numba (see jk.direct_interactions).
+    It avoids the overhead of numpy for small systems. If numba isn't installed, the loop runs (slowly) in Python.
+    """
+
+    def get_interactions(self, positions, masses, G = 1, acceleration = True, velocities = None):
+        """
+        Calculates the interactions between every pair of bodies via a compiled loop (see DirectBackend.get_interactions)
+        """
+
+        positions = np.asarray(positions)
+
+        # the compiled kernel only has a single signature, so missing velocities are passed as an empty matrix
+        kernel_velocities = np.zeros(shape = (0, positions.shape[1]), dtype = positions.dtype) if velocities is None else np.asarray(velocities, dtype = positions.dtype)
+
+        total_acceleration, gpe, min_distance, min_ratio = jk.direct_interactions(positions, kernel_velocities, np.asarray(masses, dtype = np.float64),
+                                                                                  float(G), acceleration)
+
+        return (total_acceleration if acceleration else None), gpe, min_distance, (None if velocities is None else min_ratio)
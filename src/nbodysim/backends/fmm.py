@@ -0,0 +1,319 @@
+import itertools
+from math import factorial
+
+import numpy as np
+
+from nbodysim import nmath as nm
+from nbodysim.backends.backend import FieldBackend
+
+def binomial(n, k):
+    """
+    Binomial coefficient n choose k, for integers 0 <= k <= n
+    """
+    return factorial(n) // (factorial(k) * factorial(n - k))
+
+class FMM(FieldBackend):
+    """
+    Class defining a Fast Multipole Method backend, which calculates gravity in O(n).
+    Space is divided into a uniform octree. The bodies in each box are described by a Cartesian multipole expansion,
+    which is converted into a local (Taylor) expansion about the centre of every well-separated box, and then passed down the tree.
+    Bodies in neighbouring boxes of the deepest level interact directly.
+    Alongside the accelerations, the potential of each body is calculated, so NBody can obtain the GPE in O(n).
+    Systems with at most leaf_size bodies are summed directly, so their accelerations are exact.
+    Otherwise, the relative error of the accelerations (median / maximum, for 1000 to 10^4 bodies with a Gaussian distribution) is
+    ~1e-2 / 0.1-0.2 with order 2, ~1e-3 / 1e-2 with order 4 (the default), ~2e-4 / 5e-3 with order 6 and ~5e-5 / 2e-3 with order 8
+    (see Backend.get_force_error).
+    """
+    def __init__(self, order = 4, leaf_size = 16, chunk_size = 2**20):
+        """
+        :param order: the order of the multipole and local expansions. Higher orders lead to more accurate (but slower) results.
+        :param leaf_size: the average number of bodies desired in each box of the deepest level of the octree
+        :param chunk_size: maximum number of pairs of bodies interacting directly at once. Used to limit memory usage.
+        """
+
+        assert order >= 1, f"The order of the expansions must be at least 1, but was {order}"
+
+        # execute initialisation from superclass
+        super().__init__()
+
+        self.order = order
+        self.leaf_size = leaf_size
+        self.chunk_size = chunk_size
+
+        # multi-indices (a,b,c) with a + b + c <= order, sorted by their total degree
+        self.exponents = np.array([(a, b, total - a - b) for total in range(order + 1)
+                                   for a in range(total, -1, -1) for b in range(total - a, -1, -1)])
+        self.n_terms = len(self.exponents)
+        term_index = {tuple(k): idx for idx, k in enumerate(self.exponents)}
+        unit = np.eye(3, dtype = int)
+
+        # tables used by the recurrence of the Taylor coefficients of 1/|R|: the indices of k - e_i and k - 2e_i (-1 if negative)
+        self.lower_1 = np.array([[term_index.get(tuple(k - unit[i]), -1) for i in range(3)] for k in self.exponents])
+        self.lower_2 = np.array([[term_index.get(tuple(k - 2 * unit[i]), -1) for i in range(3)] for k in self.exponents])
+
+        # tables used to shift expansions: every pair (k, l) with l <= k, alongside the index of k - l and the coefficient C(k, l)
+        shift_pairs = [(k, l) for k in range(self.n_terms) for l in range(self.n_terms)
+                       if (self.exponents[l] <= self.exponents[k]).all()]
+        self.shift_k = np.array([k for k, _ in shift_pairs])
+        self.shift_l = np.array([l for _, l in shift_pairs])
+        self.shift_diff = np.array([term_index[tuple(self.exponents[k] - self.exponents[l])] for k, l in shift_pairs])
+        self.shift_binomial = np.array([np.prod([binomial(a, b) for a, b in zip(self.exponents[k], self.exponents[l])]) for k, l in shift_pairs])
+
+        # tables used to convert multipole into local expansions: every pair (j, k) with |j| + |k| <= order,
+        # alongside the index of j + k and the coefficient C(j + k, j)
+        m2l_pairs = [(j, k) for j in range(self.n_terms) for k in range(self.n_terms)
+                     if np.sum(self.exponents[j]) + np.sum(self.exponents[k]) <= order]
+        self.m2l_j = np.array([j for j, _ in m2l_pairs])
+        self.m2l_k = np.array([k for _, k in m2l_pairs])
+        self.m2l_sum = np.array([term_index[tuple(self.exponents[j] + self.exponents[k])] for j, k in m2l_pairs])
+        self.m2l_binomial = np.array([np.prod([binomial(a + b, a) for a, b in zip(self.exponents[j], self.exponents[k])]) for j, k in m2l_pairs])
+
+        # tables used to differentiate local expansions: for each axis d, every term j with j_d > 0, alongside the index of j - e_d
+        self.grad_terms = [np.flatnonzero(self.exponents[:, d] > 0) for d in range(3)]
+        self.grad_lower = [np.array([term_index[tuple(self.exponents[j] - unit[d])] for j in self.grad_terms[d]]) for d in range(3)]
+
+        # well-separated boxes: children of the neighbours of the parent of a box, which aren't neighbours of the box
+        # only offsets with a component of 3 (or -3) depend on the position of the box within its parent
+        self.offsets = np.array([o for o in itertools.product(range(-3, 4), repeat = 3) if np.max(np.abs(o)) > 1])
+        self.neighbour_offsets = np.array(list(itertools.product(range(-1, 2), repeat = 3)))
+
+    def monomials(self, vectors):
+        """
+        Calculates the monomials v^k = v_x^a * v_y^b * v_z^c for every multi-index k = (a,b,c) of the expansions
+        :param vectors: an (m x 3) matrix of vectors
+        :return: an (m x n_terms) matrix, with entry (i, k) containing the kth monomial of the ith vector
+        """
+
+        powers = vectors[:, :, np.newaxis] ** np.arange(self.order + 1)
+
+        return powers[:, 0, self.exponents[:, 0]] * powers[:, 1, self.exponents[:, 1]] * powers[:, 2, self.exponents[:, 2]]
+
+    def taylor_coefficients(self, vectors):
+        """
+        Calculates the Taylor coefficients D^k(1/|R|)/k! of 1/|R| for every multi-index k of the expansions, via the recurrence
+        |k||R|^2 b_k + (2|k| - 1) sum_i R_i b_{k - e_i} + (|k| - 1) sum_i b_{k - 2e_i} = 0
+        :param vectors: an (m x 3) matrix of (non-zero) vectors R
+        :return: an (m x n_terms) matrix, with entry (i, k) containing the kth Taylor coefficient at the ith vector
+        """
+
+        coefficients = np.zeros(shape = (len(vectors), self.n_terms))
+        norm_sq = nm.ten_norm(vectors, axis = 1, sqrt = False)
+        coefficients[:, 0] = 1 / np.sqrt(norm_sq)
+
+        for k in range(1, self.n_terms):
+            degree = np.sum(self.exponents[k])
+            total = np.zeros(len(vectors))
+
+            for i in range(3):
+                if self.lower_1[k, i] != -1:
+                    total += (2 * degree - 1) * vectors[:, i] * coefficients[:, self.lower_1[k, i]]
+                if self.lower_2[k, i] != -1:
+                    total += (degree - 1) * coefficients[:, self.lower_2[k, i]]
+
+            coefficients[:, k] = -total / (degree * norm_sq)
+
+        return coefficients
+
+    def shift_matrix(self, shift):
+        """
+        Matrix A used to shift expansions by a vector s, with entry (k, l) = C(k, l) * s^(k - l) for l <= k
+        Multipole expansions are shifted from a child to its parent as M_parent = A M_child, with s = c_parent - c_child
+        Local expansions are shifted from a parent to its child as L_child = A^T L_parent, with s = c_child - c_parent
+        :param shift: the vector s by which the expansion is shifted
+        :return: an (n_terms x n_terms) matrix
+        """
+
+        matrix = np.zeros(shape = (self.n_terms, self.n_terms))
+        matrix[self.shift_k, self.shift_l] = self.shift_binomial * self.monomials(shift[np.newaxis, :])[0, self.shift_diff]
+
+        return matrix
+
+    def m2l_matrices(self, vectors):
+        """
+        Matrices T used to convert a multipole expansion about c into a local expansion about z,
+        with entry (j, k) = C(j + k, j) * b_{j + k}(z - c), so that L = T M
+        :param vectors: an (m x 3) matrix, with the vectors z - c for each conversion
+        :return: an (m x n_terms x n_terms) tensor
+        """
+
+        matrices = np.zeros(shape = (len(vectors), self.n_terms, self.n_terms))
+        matrices[:, self.m2l_j, self.m2l_k] = self.m2l_binomial * self.taylor_coefficients(vectors)[:, self.m2l_sum]
+
+        return matrices
+
+    def find_boxes(self, keys, cells, side):
+        """
+        Finds the index of boxes within a level of the octree
+        :param keys: the sorted keys of the occupied boxes of the level
+        :param cells: an (m x 3) matrix with the integer coordinates of the boxes to find
+        :param side: the number of boxes along each axis of the level
+        :return: a tuple, with the index of each box (within keys) and a mask indicating whether the box is occupied
+        """
+
+        inside = ((cells >= 0) & (cells < side)).all(axis = 1)
+        cell_keys = (cells[:, 0] * side + cells[:, 1]) * side + cells[:, 2]
+
+        idx = np.minimum(np.searchsorted(keys, cell_keys), len(keys) - 1)
+
+        return idx, inside & (keys[idx] == cell_keys)
+
+    def add_direct(self, potential, gradient, positions, masses, targets, sources):
+        """
+        Adds the potential (without the factor -G) and acceleration (without the factor G) of pairs of bodies interacting directly
+        :param potential: an array with the potential of each body, to which the pairs are added in place
+        :param gradient: an (n x 3) matrix with the acceleration of each body, to which the pairs are added in place
+        :param targets: an array with the body feeling each interaction
+        :param sources: an array with the body exerting each interaction
+        """
+
+        n = len(positions)
+        distances = positions[sources] - positions[targets]
+        dist_mag = nm.ten_norm(distances, axis = 1, sqrt = True)
+
+        # a body doesn't interact with itself (nor with bodies at the same position)
+        dist_mag[dist_mag == 0] = np.inf
+
+        potential += np.bincount(targets, weights = masses[sources] / dist_mag, minlength = n)
+        acc_direction = (masses[sources] / dist_mag**3)[:, np.newaxis] * distances
+
+        for d in range(3):
+            gradient[:, d] += np.bincount(targets, weights = acc_direction[:, d], minlength = n)
+
+    def evaluate(self, positions, masses, G = 1):
+        """
+        Calculates the acceleration and the potential of every body via the FMM
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: a tuple, with an (n x 3) matrix of accelerations, and an array with the potential of each body
+        """
+
+        n = len(positions)
+
+        # systems which fit within a single leaf are summed directly (exactly), as no box would be well-separated
+        if n <= self.leaf_size:
+            potential = np.zeros(n)
+            gradient = np.zeros(shape = (n, 3))
+            targets, sources = nm.box_pairs([0], [n], [0], [n])
+            self.add_direct(potential, gradient, positions, masses, targets, sources)
+
+            return G * gradient, -G * potential
+
+        # at least 2 levels are required for boxes to be well-separated
+        depth = max(2, int(np.ceil(np.log(max(n / self.leaf_size, 1)) / np.log(8))))
+
+        # the root box is the smallest cube containing every body
+        corner = np.min(positions, axis = 0)
+        size = np.max(np.max(positions, axis = 0) - corner)
+
+        if size == 0:
+            size = 1
+
+        # sort the bodies by the box containing them at the deepest level
+        cells = np.clip(np.floor((positions - corner) * (2**depth / size)).astype(np.int64), 0, 2**depth - 1)
+        leaf_keys = (cells[:, 0] * 2**depth + cells[:, 1]) * 2**depth + cells[:, 2]
+        order = np.argsort(leaf_keys, kind = "stable")
+
+        sorted_positions = positions[order]
+        sorted_masses = masses[order]
+        sorted_keys = leaf_keys[order]
+
+        leaf_starts = np.flatnonzero(np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1])))
+        leaf_counts = np.diff(np.append(leaf_starts, n))
+        leaf_of_body = np.repeat(np.arange(len(leaf_starts)), leaf_counts)
+
+        # occupied boxes at each level: keys, integer coordinates and the index of their parent
+        keys = {depth: sorted_keys[leaf_starts]}
+        box_cells = {depth: cells[order][leaf_starts]}
+        parents = {}
+
+        for level in range(depth, 2, -1):
+            parent_cells = box_cells[level] >> 1
+            parent_keys = (parent_cells[:, 0] * 2**(level - 1) + parent_cells[:, 1]) * 2**(level - 1) + parent_cells[:, 2]
+            keys[level - 1], first, parents[level] = np.unique(parent_keys, return_index = True, return_inverse = True)
+            box_cells[level - 1] = parent_cells[first]
+
+        def centres(level):
+            return corner + (box_cells[level] + 0.5) * (size / 2**level)
+
+        # upward pass: multipole expansions of the bodies in each leaf, which are then shifted to the parents
+        multipoles = {depth: np.add.reduceat(sorted_masses[:, np.newaxis] * self.monomials(centres(depth)[leaf_of_body] - sorted_positions),
+                                             leaf_starts, axis = 0)}
+
+        for level in range(depth, 2, -1):
+            multipoles[level - 1] = np.zeros(shape = (len(keys[level - 1]), self.n_terms))
+            octants = box_cells[level] & 1
+            half_side = size / 2**(level + 1)
+
+            for octant in itertools.product(range(2), repeat = 3):
+                children = (octants == octant).all(axis = 1)
+                shift = self.shift_matrix((1 - 2 * np.array(octant)) * half_side)
+                np.add.at(multipoles[level - 1], parents[level][children], multipoles[level][children] @ shift.T)
+
+        # downward pass: local expansions from the well-separated boxes of each level, which are then shifted to the children
+        local_expansions = {}
+
+        for level in range(2, depth + 1):
+            side = 2**level
+            local_expansions[level] = np.zeros(shape = (len(keys[level]), self.n_terms))
+
+            if level > 2:
+                octants = box_cells[level] & 1
+                half_side = size / 2**(level + 1)
+
+                for octant in itertools.product(range(2), repeat = 3):
+                    children = (octants == octant).all(axis = 1)
+                    shift = self.shift_matrix((2 * np.array(octant) - 1) * half_side)
+                    local_expansions[level][children] += local_expansions[level - 1][parents[level][children]] @ shift
+
+            # the vector from the centre of a source box to the centre of the target box is -offset * box side
+            m2l = self.m2l_matrices(-self.offsets * (size / side))
+            parities = box_cells[level] & 1
+
+            for offset, matrix in zip(self.offsets, m2l):
+                # offsets of 3 (or -3) only reach well-separated boxes from boxes with parity 0 (or 1) in that axis
+                targets = np.flatnonzero(((offset != 3) | (parities == 0)).all(axis = 1) & ((offset != -3) | (parities == 1)).all(axis = 1))
+                sources, occupied = self.find_boxes(keys[level], box_cells[level][targets] + offset, side)
+
+                if occupied.any():
+                    local_expansions[level][targets[occupied]] += multipoles[level][sources[occupied]] @ matrix.T
+
+        # evaluate the local expansions (and their gradient) at each body
+        local_bodies = local_expansions[depth][leaf_of_body]
+        body_monomials = self.monomials(sorted_positions - centres(depth)[leaf_of_body])
+
+        potential = np.sum(local_bodies * body_monomials, axis = 1)
+        gradient = np.zeros(shape = (n, 3))
+
+        for d in range(3):
+            gradient[:, d] = np.sum(local_bodies[:, self.grad_terms[d]] * self.exponents[self.grad_terms[d], d] * body_monomials[:, self.grad_lower[d]], axis = 1)
+
+        # bodies in neighbouring leaves interact directly
+        leaf_sources = []
+        leaf_targets = []
+
+        for offset in self.neighbour_offsets:
+            sources, occupied = self.find_boxes(keys[depth], box_cells[depth] + offset, 2**depth)
+            leaf_targets.append(np.flatnonzero(occupied))
+            leaf_sources.append(sources[occupied])
+
+        leaf_targets = np.concatenate(leaf_targets)
+        leaf_sources = np.concatenate(leaf_sources)
+
+        # split the pairs of leaves so that at most chunk_size pairs of bodies interact at once
+        pair_counts = np.cumsum(leaf_counts[leaf_targets] * leaf_counts[leaf_sources])
+        chunk_ends = np.searchsorted(pair_counts, np.arange(self.chunk_size, pair_counts[-1], self.chunk_size), side = "right")
+
+        for chunk in np.split(np.arange(len(leaf_targets)), chunk_ends):
+            targets, sources = nm.box_pairs(leaf_starts[leaf_targets[chunk]], leaf_counts[leaf_targets[chunk]],
+                                            leaf_starts[leaf_sources[chunk]], leaf_counts[leaf_sources[chunk]])
+
+            self.add_direct(potential, gradient, sorted_positions, sorted_masses, targets, sources)
+
+        # undo the sorting of the bodies
+        acceleration = np.zeros(shape = (n, 3))
+        acceleration[order] = G * gradient
+        body_potential = np.zeros(n)
+        body_potential[order] = -G * potential
+
+        return acceleration, body_potential
@@ -0,0 +1,182 @@
+import itertools
+
+import numpy as np
+
+from nbodysim.backends.backend import FieldBackend
+
+class ParticleMesh(FieldBackend):
+    """
+    Class defining a particle-mesh backend, used for smooth, collisionless systems with many bodies.
+    The mass of the bodies is assigned to a uniform grid, Poisson's equation is solved on the grid via FFTs,
+    and the resulting forces are interpolated back to the bodies (using the same assignment scheme, so bodies don't attract themselves).
+    The grid is padded with zeros, so the potential is that of an isolated system (no periodic images).
+    Gravity is smoothed on the scale of a grid cell, so close encounters (and collisions) aren't resolved.
+    """
+
+    # the grid smooths gravity on the scale of a cell, so collisions can't be detected
+    collisional = False
+
+    # finite differences on a bounded grid don't satisfy Newton's third law exactly
+    symmetric = False
+
+    # number of cells on each side of a body to which its mass is assigned, for each assignment scheme
+    schemes = {"NGP": 1, "CIC": 2, "TSC": 3}
+
+    # mean of 1/r over a cube of unit side centred at the origin (used for the potential of a cell on itself)
+    mean_inverse_distance = 2.3800774
+
+    def __init__(self, grid_size = 64, scheme = "CIC"):
+        """
+        :param grid_size: the number of cells along each side of the grid. Larger grids lead to more accurate (but slower) results.
+        :param scheme: the scheme used to assign masses to the grid (and to interpolate forces back to the bodies):
+                       "NGP" (nearest grid point), "CIC" (cloud in cell) or "TSC" (triangular shaped cloud)
+        """
+
+        assert scheme in self.schemes, f"Assignment scheme must be one of {list(self.schemes)}, but was {scheme}"
+        assert grid_size >= 4, f"The grid must have at least 4 cells per side, but had {grid_size}"
+
+        # execute initialisation from superclass
+        super().__init__()
+
+        self.grid_size = grid_size
+        self.scheme = scheme
+
+    def get_weights(self, coords):
+        """
+        Computes the cells to which each body is assigned along a single axis, alongside the weight of each of them
+        :param coords: the coordinate of each body along the axis, in units of cells (cell i has centre i + 0.5)
+        :return: a tuple of 2 (n x s) matrices, with the index and the weight of each of the s cells to which each body is assigned
+        """
+
+        if self.scheme == "NGP":
+            cells = np.floor(coords).astype(np.int64)[:, np.newaxis]
+            weights = np.ones(shape = (len(coords), 1))
+        elif self.scheme == "CIC":
+            left = np.floor(coords - 0.5).astype(np.int64)
+            frac = coords - 0.5 - left
+            cells = np.stack([left, left + 1], axis = 1)
+            weights = np.stack([1 - frac, frac], axis = 1)
+        else:
+            centre = np.floor(coords).astype(np.int64)
+            d = coords - 0.5 - centre
+            cells = np.stack([centre - 1, centre, centre + 1], axis = 1)
+            weights = np.stack([0.5 * (0.5 - d)**2, 0.75 - d**2, 0.5 * (0.5 + d)**2], axis = 1)
+
+        return cells, weights
+
+    def get_self_potential(self, axis_weights, cell_side, G):
+        """
+        Computes the potential which each body induces on itself, due to its own mass being assigned to the grid.
+        The potential between cells only depends on their offset, so this reduces to a sum over the (2s-1)^3 possible offsets,
+        weighted by the autocorrelation of the weights along each axis.
+        :param axis_weights: a list with the cells and weights of each body along each axis (as returned by get_weights)
+        :param cell_side: the side of each cell of the grid
+        :param G: constant of gravitation
+        :return: an array with the potential that each body of unit mass induces on itself
+        """
+
+        support = self.schemes[self.scheme]
+        offsets = range(1 - support, support)
+
+        # autocorrelation of the weights along each axis, for each offset between the cells
+        correlations = []
+
+        for _, weights in axis_weights:
+            correlations.append({d: np.sum(weights[:, max(0, -d):support - max(0, d)] * weights[:, max(0, d):support + min(0, d)], axis = 1)
+                                 for d in offsets})
+
+        self_potential = np.zeros(len(axis_weights[0][1]))
+
+        for dx, dy, dz in itertools.product(offsets, repeat = 3):
+            r = np.sqrt(dx**2 + dy**2 + dz**2) * cell_side
+
+            if r == 0:
+                r = cell_side / self.mean_inverse_distance
+
+            self_potential += (-G / r) * correlations[0][dx] * correlations[1][dy] * correlations[2][dz]
+
+        return self_potential
+
+    def green_function(self, cell_side, G):
+        """
+        Computes the potential -G/r due to a unit mass, at every cell of the padded (2N x 2N x 2N) grid
+        Cells beyond N along an axis correspond to negative separations, so the convolution is performed without periodic images
+        :param cell_side: the side of each cell of the grid
+        :param G: constant of gravitation
+        :return: the Fourier transform of the potential on the padded grid
+        """
+
+        padded = 2 * self.grid_size
+        separations = np.arange(padded)
+        separations = np.where(separations < self.grid_size, separations, separations - padded) * cell_side
+
+        x, y, z = np.meshgrid(separations, separations, separations, indexing = "ij")
+        r = np.sqrt(x**2 + y**2 + z**2)
+        r[0, 0, 0] = cell_side / self.mean_inverse_distance
+
+        return np.fft.rfftn(-G / r, axes = (0, 1, 2))
+
+    def evaluate(self, positions, masses, G = 1):
+        """
+        Calculates the acceleration and potential of every body via the particle-mesh method
+        :param positions: an (n x 3) matrix with the positions of the bodies
+        :param masses: an array with the mass of each body
+        :param G: constant of gravitation
+        :return: a tuple, with an (n x 3) matrix of accelerations, and an array with the potential of each body
+        """
+
+        N = self.grid_size
+
+        # the grid contains every body, leaving enough space for the assignment scheme (and finite differences) at the edges
+        margin = self.schemes[self.scheme] + 1
+        corner = np.min(positions, axis = 0)
+        extent = np.max(np.max(positions, axis = 0) - corner)
+
+        if extent == 0:
+            extent = 1
+
+        cell_side = extent / (N - 2 * margin)
+        coords = (positions - corner) / cell_side + margin
+
+        # cells (and weights) to which each body is assigned along each axis
+        axis_weights = [self.get_weights(coords[:, axis]) for axis in range(3)]
+        support = self.schemes[self.scheme]
+
+        # flattened index and weight of each of the cells to which the bodies are assigned
+        cells = []
+        weights = []
+
+        for a, b, c in itertools.product(range(support), repeat = 3):
+            cells.append((axis_weights[0][0][:, a] * N + axis_weights[1][0][:, b]) * N + axis_weights[2][0][:, c])
+            weights.append(axis_weights[0][1][:, a] * axis_weights[1][1][:, b] * axis_weights[2][1][:, c])
+
+        # assign the mass of the bodies to the grid
+        density = np.zeros(N**3)
+
+        for cell, weight in zip(cells, weights):
+            density += np.bincount(cell, weights = masses * weight, minlength = N**3)
+
+        # solve Poisson's equation, by convolving the mass of the cells with the potential of a unit mass
+        padded_density = np.zeros(shape = (2 * N, 2 * N, 2 * N))
+        padded_density[:N, :N, :N] = density.reshape((N, N, N))
+
+        potential = np.fft.irfftn(np.fft.rfftn(padded_density, axes = (0, 1, 2)) * self.green_function(cell_side, G), s = padded_density.shape, axes = (0, 1, 2))
+        potential = potential[:N, :N, :N]
+
+        # acceleration on the grid, as minus the gradient of the potential (via central differences)
+        grid_acceleration = [-gradient.ravel() for gradient in np.gradient(potential, cell_side)]
+        potential = potential.ravel()
+
+        # interpolate back to the bodies, using the same weights used for assignment
+        acceleration = np.zeros(shape = (len(positions), 3))
+        body_potential = np.zeros(len(positions))
+
+        for cell, weight in zip(cells, weights):
+            for axis in range(3):
+                acceleration[:, axis] += weight * grid_acceleration[axis][cell]
+            body_potential += weight * potential[cell]
+
+        # bodies don't interact with themselves, so the potential which each body induces on itself is removed
+        body_potential -= masses * self.get_self_potential(axis_weights, cell_side, G)
+
+        return acceleration, body_potential
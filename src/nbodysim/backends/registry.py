@@ -0,0 +1,194 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from nbodysim import nmath as nm
+from nbodysim import jit_kernels as jk
+from nbodysim.backends.direct import TiledDirect, VectorisedDirect, CompiledDirect
+from nbodysim.backends.barnes_hut import BarnesHut
+from nbodysim.backends.fmm import FMM
+from nbodysim.backends.particle_mesh import ParticleMesh
+
+# Helper file containing the registry of every backend which NBody can use (by name), alongside an autotuner,
+# which benchmarks the registered backends for a given system and caches the fastest of them on disk
+
+# registered backends, by name. Each entry contains:
+# "factory": function creating the backend for a number of workers
+# "exact": True if the backend calculates gravity exactly (by direct summation)
+# "suitable": function returning True if the backend is a candidate for a number of bodies and workers
+backends = {}
+
+# file in which the results of the autotuner are cached (as JSON), so later runs use the fastest backend right away
+cache_file = os.path.join(os.path.expanduser("~"), ".nbodysim", "autotune.json")
+
+def register_backend(name, factory, exact = True, suitable = None):
+    """
+    Registers a backend, so it can be used by NBody by name (and considered by the autotuner)
+    :param name: the name of the backend
+    :param factory: function creating the backend, given the number of workers of the NBody (i.e lambda workers: BarnesHut())
+    :param exact: True if the backend calculates gravity exactly. Only exact backends are considered by default by the autotuner.
+    :param suitable: function (of the number of bodies and workers) returning True if the backend should be considered by the autotuner
+                     If None, the backend is always considered.
+    """
+
+    backends[name] = {"factory": factory, "exact": exact, "suitable": suitable}
+
+def get_backend(name, n = None, precision = "double", workers = 1):
+    """
+    Creates a registered backend by name
+    :param name: the name of the backend, or "auto" to use the fastest exact backend for the system (see autotune)
+    :param n: the number of bodies of the system (only required for "auto")
+    :param precision: the precision of the system (see NBody)
+    :param workers: the number of workers of the system (see NBody)
+    :return: the Backend instance
+    """
+
+    if name == "auto":
+        name = autotune(n, precision = precision, workers = workers)
+
+    assert name in backends, f"Backend must be one of {list(backends) + ['auto']}, but was {name}"
+
+    return backends[name]["factory"](workers)
+
+def get_candidates(n, workers = 1, exact = True):
+    """
+    Finds the registered backends to be considered by the autotuner for a system
+    :param n: the number of bodies of the system
+    :param workers: the number of workers of the system
+    :param exact: if True, only backends which calculate gravity exactly are considered
+    :return: a list with the names of the candidate backends
+    """
+
+    return [name for name, entry in backends.items()
+            if (entry["exact"] or not exact) and (entry["suitable"] is None or entry["suitable"](n, workers))]
+
+def benchmark_backend(factory, positions, masses, workers = 1, repeats = 3):
+    """
+    Measures the time taken by a backend to calculate everything NBody requires in a step:
+    the accelerations, the GPE and (for exact backends) the minimum distance between bodies
+    :param factory: function creating the backend, given the number of workers
+    :param positions: an (n x 3) matrix with the positions of the bodies (stored in the precision of the system)
+    :param masses: an array with the mass of each body
+    :param workers: the number of workers of the system
+    :param repeats: the number of timed repetitions (after a first, untimed one, i.e to compile kernels)
+    :return: the fastest time (in seconds) over the repetitions
+    """
+
+    times = []
+
+    for repeat in range(repeats + 1):
+        # a new backend is created for every repetition, so the results of previous evaluations aren't reused
+        backend = factory(workers)
+        start = time.perf_counter()
+
+        if backend.interactions:
+            backend.get_interactions(positions, masses)
+        else:
+            backend.get_acceleration(positions.astype(np.float64), masses)
+
+            if backend.potentials:
+                backend.get_potential(positions.astype(np.float64), masses)
+            else:
+                nm.tiled_interactions(positions, masses, acceleration = False, workers = workers)
+
+        times.append(time.perf_counter() - start)
+
+    return min(times[1:])
+
+def get_cache_key(n, precision = "double", workers = 1, exact = True):
+    """
+    Computes the key under which the autotuner caches its result for a system.
+    Systems are grouped by the power of 2 closest to their number of bodies, so similar systems share the same result.
+    :return: the key, as a string
+    """
+
+    return f"n={2**int(np.round(np.log2(max(n, 1))))},precision={precision},workers={workers},exact={exact}"
+
+def load_cache(path):
+    """
+    Loads the results cached by the autotuner
+    :param path: the path of the cache file
+    :return: a dictionary with the result for each cache key (empty if the file doesn't exist, or can't be read, i.e if it's corrupt)
+    """
+
+    try:
+        with open(path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    return cache if isinstance(cache, dict) else {}
+
+def save_cache(cache, path):
+    """
+    Saves the results of the autotuner. The cache is shared between processes (i.e the workers of a Pool), so it is written
+    to a temporary file in the same directory, which then replaces the cache file at once (readers never see a partial file)
+    :param cache: a dictionary with the result for each cache key
+    :param path: the path of the cache file
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok = True)
+
+    descriptor, temporary_path = tempfile.mkstemp(dir = directory, prefix = os.path.basename(path), suffix = ".tmp")
+
+    try:
+        with os.fdopen(descriptor, "w") as file:
+            json.dump(cache, file, indent = 4)
+
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+def autotune(n, precision = "double", workers = 1, exact = True, repeats = 3, path = None, seed = 42):
+    """
+    Finds the fastest registered backend for a system of n bodies, by benchmarking every candidate on a random system.
+    The result is cached on disk, so the benchmark is only performed on first use for each (n, precision, workers).
+    :param n: the number of bodies of the system
+    :param precision: the precision of the system (see NBody)
+    :param workers: the number of workers of the system
+    :param exact: if True, only backends which calculate gravity exactly are considered
+    :param repeats: the number of timed repetitions for each backend
+    :param path: the path of the cache file. If None, uses cache_file
+    :param seed: seed of the random system used for the benchmark
+    :return: the name of the fastest backend
+    """
+
+    path = cache_file if path is None else path
+    key = get_cache_key(n, precision = precision, workers = workers, exact = exact)
+    cache = load_cache(path)
+
+    # check: the cached backend is still registered
+    if isinstance(cache.get(key), dict) and cache[key].get("backend") in backends:
+        return cache[key]["backend"]
+
+    # random (Gaussian) cluster of bodies, stored in the precision of the system
+    rng = np.random.default_rng(seed)
+    positions = rng.normal(size = (n, 3)).astype(np.float32 if precision == "mixed" else np.float64)
+    masses = rng.uniform(0.5, 1.5, size = n) / n
+
+    timings = {name: benchmark_backend(backends[name]["factory"], positions, masses, workers = workers, repeats = repeats)
+               for name in get_candidates(n, workers = workers, exact = exact)}
+
+    fastest = min(timings, key = timings.get)
+
+    # the cache is read again, so the results written by other processes during the benchmark are kept
+    cache = load_cache(path)
+    cache[key] = {"backend": fastest, "timings": timings}
+    save_cache(cache, path)
+
+    return fastest
+
+# backends registered by default. Compiled loops require numba, vectorised direct summation stores every pair of bodies at once
+# (so it is only considered for small systems), and threads are only considered with more than 1 worker
+register_backend("direct-compiled", lambda workers: CompiledDirect(), suitable = lambda n, workers: jk.jit_available)
+register_backend("direct-vectorised", lambda workers: VectorisedDirect(), suitable = lambda n, workers: n <= 2048)
+register_backend("direct-tiled", lambda workers: TiledDirect())
+register_backend("direct-threaded", lambda workers: TiledDirect(workers = workers), suitable = lambda n, workers: workers > 1)
+register_backend("barnes-hut", lambda workers: BarnesHut(), exact = False)
+register_backend("fmm", lambda workers: FMM(), exact = False)
+register_backend("particle-mesh", lambda workers: ParticleMesh(), exact = False)
@@ -0,0 +1,135 @@
+import itertools
+
+import numpy as np
+
+from nbodysim import nmath as nm
+from nbodysim.exceptions import BodyCollisionException, check_exception
+
+class CollisionGrid:
+    """
+    Class used to detect collisions between bodies in O(n) per step, without a pass over every pair of bodies.
+    Bodies are hashed into a uniform grid of cells (of side collision_tolerance + skin), so only bodies in neighbouring cells can collide.
+    The pairs within collision_tolerance + skin of each other are kept as a (Verlet) neighbour list, which remains valid
+    until some body moves further than skin/2, so the grid is only rebuilt every few steps.
+    """
+
+    # number of bits used for the cell coordinate along each axis, when hashing the cells
+    bits = 21
+
+    def __init__(self, skin = None):
+        """
+        :param skin: the extra distance (beyond collision_tolerance) within which pairs of bodies are kept in the neighbour list.
+                     Larger skins lead to longer lists which are rebuilt less often. If None, equal to collision_tolerance.
+        """
+
+        self.skin = skin
+
+        # collision tolerance & skin used for the neighbour list, alongside the positions for which it was built
+        self.tolerance = None
+        self.radius = None
+        self.reference_positions = None
+
+        # bodies i and j of each pair within the neighbour list
+        self.pairs_i = None
+        self.pairs_j = None
+
+    def get_cell_pairs(self, positions, cell_side):
+        """
+        Hashes the bodies into a uniform grid, and finds every distinct pair of bodies within the same or neighbouring cells
+        :param positions: an (n x d) matrix with the positions of the bodies
+        :param cell_side: the side of each cell of the grid
+        :return: a tuple (i, j) of arrays, containing the bodies of each pair
+        """
+
+        n, dims = positions.shape
+
+        # the coordinates of the cells must fit within the bits of the hash, so the cells of very spread out systems are enlarged
+        corner = np.min(positions, axis = 0)
+        extent = np.max(np.max(positions, axis = 0) - corner)
+        cell_side = max(cell_side, extent / (2**self.bits - 3))
+
+        # cells are offset by 1, so the neighbours of every cell have non-negative coordinates
+        cells = np.floor((positions - corner) / cell_side).astype(np.int64) + 1
+        shifts = np.int64(self.bits) * np.arange(dims - 1, -1, -1, dtype = np.int64)
+        keys = np.sum(cells << shifts, axis = 1)
+
+        # bodies sorted by their cell, so the bodies of every cell are contiguous
+        order = np.argsort(keys, kind = "stable")
+        cell_keys, starts, counts = np.unique(keys[order], return_index = True, return_counts = True)
+
+        pairs_a = []
+        pairs_b = []
+
+        # each pair of neighbouring cells is only visited once, via the offsets which are lexicographically positive (half of the stencil)
+        for offset in itertools.product(range(-1, 2), repeat = dims):
+            if offset < (0,) * dims:
+                continue
+
+            neighbour_keys = cell_keys + np.sum(np.array(offset, dtype = np.int64) << shifts)
+            neighbours = np.minimum(np.searchsorted(cell_keys, neighbour_keys), len(cell_keys) - 1)
+            found = cell_keys[neighbours] == neighbour_keys
+
+            a, b = nm.box_pairs(starts[found], counts[found], starts[neighbours[found]], counts[neighbours[found]])
+
+            # within the same cell, only the pairs with a < b are distinct
+            if offset == (0,) * dims:
+                distinct = a < b
+                a, b = a[distinct], b[distinct]
+
+            pairs_a.append(order[a])
+            pairs_b.append(order[b])
+
+        return np.concatenate(pairs_a), np.concatenate(pairs_b)
+
+    def update_neighbours(self, positions, tolerance):
+        """
+        Rebuilds the neighbour list, unless it remains valid for the positions (no body moved further than skin/2 since it was built)
+        :param positions: an (n x d) matrix with the positions of the bodies
+        :param tolerance: the collision tolerance
+        """
+
+        skin = tolerance if self.skin is None else self.skin
+
+        if self.tolerance == tolerance and self.reference_positions is not None and self.reference_positions.shape == positions.shape:
+            displacements = nm.ten_norm(positions - self.reference_positions, axis = 1, sqrt = False)
+
+            if len(displacements) == 0 or np.max(displacements) <= (skin / 2)**2:
+                return
+
+        radius = tolerance + skin
+        i, j = self.get_cell_pairs(positions, radius)
+
+        # only the pairs close enough to collide before the list is rebuilt are kept
+        close = nm.ten_norm(positions[j] - positions[i], axis = 1, sqrt = False) <= radius**2
+
+        self.pairs_i = i[close]
+        self.pairs_j = j[close]
+        self.tolerance = tolerance
+        self.radius = radius
+        self.reference_positions = np.array(positions)
+
+    def check(self, positions, tolerance):
+        """
+        Checks that no pair of bodies is closer than the collision tolerance
+        :param positions: an (n x d) matrix with the positions of the bodies
+        :param tolerance: the collision tolerance
+        :return: the minimum distance between any 2 bodies of the neighbour list (infinity if there are none).
+                 Pairs further apart than collision_tolerance + skin/2 may be missing, so this is only exact below that distance.
+        """
+
+        positions = np.asarray(positions, dtype = np.float64)
+
+        self.update_neighbours(positions, tolerance)
+
+        if len(self.pairs_i) == 0:
+            return np.inf
+
+        distances = nm.ten_norm(positions[self.pairs_j] - positions[self.pairs_i], axis = 1, sqrt = True)
+        closest = np.argmin(distances)
+
+        check_exception(distances[closest] >= tolerance,
+                        BodyCollisionException,
+                        lambda: f"A collision occurred. Distance between bodies {self.pairs_i[closest]} and {self.pairs_j[closest]} was {distances[closest]}, "
+                                f"but the collision distance is {tolerance}.")
+
+        return distances[closest]
@@ -31,5 +31,13 @@ class Figure8InitException(Exception):
         super().__init__(msg)
 
 def check_exception(condition, exception, msg = "An exception occurred!"):
+    """
+    Raises an exception if a condition isn't satisfied
+    :param condition: the condition to check
+    :param exception: the class of the exception to raise
+    :param msg: the message of the exception, or a function returning it (i.e a lambda around an f-string),
+                so that messages which are expensive to build (i.e formatting numpy arrays) are only built if the check fails
+    """
+
     if not condition:
-        raise exception(msg)
\ No newline at end of file
+        raise exception(msg() if callable(msg) else msg)
\ No newline at end of file
@@ -0,0 +1,347 @@
+import math
+
+import numpy as np
+
+from nbodysim import nmath as nm
+from nbodysim.nbody import NBody
+
+# Generators of initial conditions for systems of any number of bodies (i.e for scaling work)
+# Every generator draws from a seeded random generator (so systems are repeatable), and is vectorised over the bodies,
+# returning the (n x 3) positions and velocities alongside the masses, in the COM frame.
+# The get_*_nbod functions return the corresponding NBody instances, ready to integrate.
+
+def random_directions(rng, n):
+    """
+    Draws unit vectors uniformly distributed over the sphere
+    :param rng: numpy random generator
+    :param n: the number of vectors
+    :return: an (n x 3) matrix of unit vectors
+    """
+
+    cos_theta = rng.uniform(-1, 1, size = n)
+    sin_theta = np.sqrt(1 - cos_theta**2)
+    phi = rng.uniform(0, 2 * np.pi, size = n)
+
+    return np.stack([sin_theta * np.cos(phi), sin_theta * np.sin(phi), cos_theta], axis = 1)
+
+def to_com_frame(positions, velocities, masses):
+    """
+    Moves a system to its COM frame (the COM at the origin, with no total linear momentum)
+    :return: a tuple with the positions, velocities and masses of the system
+    """
+
+    total_mass = np.sum(masses)
+    positions = positions - masses @ positions / total_mass
+    velocities = velocities - masses @ velocities / total_mass
+
+    return positions, velocities, masses
+
+# ------------------------------ PLUMMER ------------------------------
+
+def plummer_sphere(n, mass = 1, scale_radius = 1, cutoff = 10, G = 1, seed = 42):
+    """
+    Draws the bodies of a Plummer sphere in virial equilibrium (Aarseth, Henon & Wielen, 1974), with equal masses
+    :param n: the number of bodies
+    :param mass: the total mass of the sphere
+    :param scale_radius: the Plummer radius a, with density proportional to (1 + r^2/a^2)^(-5/2)
+    :param cutoff: bodies are only drawn within cutoff * scale_radius of the centre
+    :param G: constant of gravitation
+    :param seed: seed of the random generator
+    :return: a tuple with the positions, velocities and masses of the bodies
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # radii drawn from the inverse of the enclosed mass M(r)/M = r^3/(r^2 + a^2)^(3/2), up to the cutoff
+    max_fraction = cutoff**3 / (1 + cutoff**2)**1.5
+    fractions = rng.uniform(0, max_fraction, size = n)
+    radii = scale_radius / np.sqrt(fractions**(-2 / 3) - 1)
+
+    # ratios q = v/v_esc follow g(q) = q^2 (1 - q^2)^(7/2), drawn by rejection (max g(q) < 0.1)
+    # every round redraws the rejected bodies at once, so the number of rounds (not of bodies) is looped over
+    q = np.zeros(n)
+    rejected = np.arange(n)
+
+    while len(rejected) > 0:
+        candidates = rng.uniform(0, 1, size = len(rejected))
+        accepted = rng.uniform(0, 0.1, size = len(rejected)) < candidates**2 * (1 - candidates**2)**3.5
+        q[rejected[accepted]] = candidates[accepted]
+        rejected = rejected[~accepted]
+
+    escape_velocities = np.sqrt(2 * G * mass / scale_radius) * (1 + (radii / scale_radius)**2)**(-0.25)
+
+    positions = radii[:, np.newaxis] * random_directions(rng, n)
+    velocities = (q * escape_velocities)[:, np.newaxis] * random_directions(rng, n)
+
+    return to_com_frame(positions, velocities, np.full(n, mass / n))
+
+def get_plummer_nbod(n, mass = 1, scale_radius = 1, cutoff = 10, G = 1, seed = 42, collision_tolerance = None, **kwargs):
+    """
+    Produces an NBody instance for a Plummer sphere (see plummer_sphere)
+    :param collision_tolerance: collision tolerance of the NBody (large systems start with some bodies very close to each other)
+    :param kwargs: any other parameter of NBody (i.e backend)
+    :return: an NBody instance for a Plummer sphere
+    """
+
+    return NBody(*plummer_sphere(n, mass = mass, scale_radius = scale_radius, cutoff = cutoff, G = G, seed = seed),
+                 collision_tolerance = collision_tolerance, **kwargs)
+
+# ------------------------------ KING ------------------------------
+
+def king_density(W):
+    """
+    Density of a King model (relative to its central density, up to a constant) at dimensionless potential W >= 0
+    """
+
+    return math.exp(W) * math.erf(math.sqrt(W)) - math.sqrt(4 * W / math.pi) * (1 + 2 * W / 3)
+
+def king_profile(W0, step = 10**-2):
+    """
+    Solves Poisson's equation for a King model, from its centre to its tidal radius,
+    in units of the King radius r_0 and of the velocity dispersion (with G = 1)
+    :param W0: the dimensionless potential at the centre (larger W0 lead to more concentrated models)
+    :param step: the step in ln(r) used to integrate the profile (via RK4)
+    :return: a tuple of arrays, with increasing radii, and the potential W and enclosed mass at each radius
+    """
+
+    central_density = king_density(W0)
+
+    # with s = ln(r) and u = r dW/dr, Poisson's equation becomes dW/ds = u, du/ds = -u - 9 r^2 rho(W)/rho(W0)
+    def derivatives(s, W, u):
+        return u, -u - 9 * math.exp(2 * s) * king_density(max(W, 0)) / central_density
+
+    # near the centre, the density is constant, so W = W0 - 3/2 r^2
+    s = math.log(10**-4)
+    W = W0 - 1.5 * math.exp(2 * s)
+    u = -3 * math.exp(2 * s)
+    profile = [(s, W, u)]
+
+    while W > 0:
+        k1 = derivatives(s, W, u)
+        k2 = derivatives(s + step / 2, W + step / 2 * k1[0], u + step / 2 * k1[1])
+        k3 = derivatives(s + step / 2, W + step / 2 * k2[0], u + step / 2 * k2[1])
+        k4 = derivatives(s + step, W + step * k3[0], u + step * k3[1])
+
+        s += step
+        W += step / 6 * (k1[0] + 2 * k2[0] + 2 * k3[0] + k4[0])
+        u += step / 6 * (k1[1] + 2 * k2[1] + 2 * k3[1] + k4[1])
+        profile.append((s, W, u))
+
+    s, W, u = np.array(profile).T
+
+    # the tidal radius is found by interpolating the last step, where W reaches 0
+    s[-1] = s[-2] + (s[-1] - s[-2]) * W[-2] / (W[-2] - W[-1])
+    u[-1] = u[-2] + (u[-1] - u[-2]) * W[-2] / (W[-2] - W[-1])
+    W[-1] = 0
+
+    radii = np.exp(s)
+
+    # in these units, the mass enclosed within r is -r^2 dW/dr = -r u
+    return radii, W, -radii * u
+
+def king_model(n, W0 = 6, mass = 1, core_radius = 1, G = 1, seed = 42):
+    """
+    Draws the bodies of a King model (King, 1966) in equilibrium, with equal masses
+    :param n: the number of bodies
+    :param W0: the dimensionless potential at the centre (typically between 1 and 12)
+    :param mass: the total mass of the model
+    :param core_radius: the King radius r_0
+    :param G: constant of gravitation
+    :param seed: seed of the random generator
+    :return: a tuple with the positions, velocities and masses of the bodies
+    """
+
+    rng = np.random.default_rng(seed)
+    profile_radii, profile_W, enclosed_mass = king_profile(W0)
+
+    # radii drawn from the inverse of the enclosed mass, with the potential at each radius interpolated from the profile
+    radii = np.interp(rng.uniform(0, enclosed_mass[-1], size = n), enclosed_mass, profile_radii)
+    W = np.interp(radii, profile_radii, profile_W)
+
+    # speeds x (in units of the velocity dispersion) follow x^2 (exp(W - x^2/2) - 1) for x < sqrt(2W), drawn by rejection,
+    # bounded by the maximum of x^2 exp(W - x^2/2) over x < sqrt(2W)
+    speeds = np.zeros(n)
+    rejected = np.arange(n)
+
+    while len(rejected) > 0:
+        local_W = W[rejected]
+        candidates = rng.uniform(0, 1, size = len(rejected)) * np.sqrt(2 * local_W)
+        bounds = np.where(local_W > 1, 2 * np.exp(local_W - 1), 2 * local_W)
+        accepted = rng.uniform(0, 1, size = len(rejected)) * bounds < candidates**2 * np.expm1(local_W - candidates**2 / 2)
+        speeds[rejected[accepted]] = candidates[accepted]
+        rejected = rejected[~accepted]
+
+    # the model is scaled from units with G = 1, r_0 = 1 and unit velocity dispersion to the given mass and radius
+    velocity_scale = np.sqrt(G * mass / (enclosed_mass[-1] * core_radius))
+
+    positions = (core_radius * radii)[:, np.newaxis] * random_directions(rng, n)
+    velocities = (velocity_scale * speeds)[:, np.newaxis] * random_directions(rng, n)
+
+    return to_com_frame(positions, velocities, np.full(n, mass / n))
+
+def get_king_nbod(n, W0 = 6, mass = 1, core_radius = 1, G = 1, seed = 42, collision_tolerance = None, **kwargs):
+    """
+    Produces an NBody instance for a King model (see king_model)
+    :param collision_tolerance: collision tolerance of the NBody (large systems start with some bodies very close to each other)
+    :param kwargs: any other parameter of NBody (i.e backend)
+    :return: an NBody instance for a King model
+    """
+
+    return NBody(*king_model(n, W0 = W0, mass = mass, core_radius = core_radius, G = G, seed = seed),
+                 collision_tolerance = collision_tolerance, **kwargs)
+
+# ------------------------------ UNIFORM SPHERE ------------------------------
+
+def uniform_sphere(n, mass = 1, radius = 1, seed = 42):
+    """
+    Draws the bodies of a cold (at rest) sphere of uniform density, with equal masses (i.e for cold collapse)
+    :param n: the number of bodies
+    :param mass: the total mass of the sphere
+    :param radius: the radius of the sphere
+    :param seed: seed of the random generator
+    :return: a tuple with the positions, velocities and masses of the bodies
+    """
+
+    rng = np.random.default_rng(seed)
+
+    radii = radius * np.cbrt(rng.uniform(0, 1, size = n))
+    positions = radii[:, np.newaxis] * random_directions(rng, n)
+
+    return to_com_frame(positions, np.zeros(shape = (n, 3)), np.full(n, mass / n))
+
+def get_uniform_sphere_nbod(n, mass = 1, radius = 1, seed = 42, collision_tolerance = None, **kwargs):
+    """
+    Produces an NBody instance for a cold uniform sphere (see uniform_sphere)
+    :param collision_tolerance: collision tolerance of the NBody (large systems start with some bodies very close to each other)
+    :param kwargs: any other parameter of NBody (i.e backend)
+    :return: an NBody instance for a cold uniform sphere
+    """
+
+    return NBody(*uniform_sphere(n, mass = mass, radius = radius, seed = seed), collision_tolerance = collision_tolerance, **kwargs)
+
+# ------------------------------ ROTATING DISC ------------------------------
+
+def rotating_disc(n, mass = 1, radius = 1, central_mass = 0, G = 1, seed = 42):
+    """
+    Draws the bodies of a disc of uniform surface density in the xy-plane, rotating on (approximately) circular orbits, with equal masses.
+    The circular velocity of each body is given by the mass enclosed within its radius, as if it were spherically distributed.
+    :param n: the number of bodies (including the central body, if any)
+    :param mass: the total mass of the disc (excluding the central body)
+    :param radius: the radius of the disc
+    :param central_mass: the mass of a body at the centre of the disc (i.e a star). If 0, there is no central body.
+    :param G: constant of gravitation
+    :param seed: seed of the random generator
+    :return: a tuple with the positions, velocities and masses of the bodies (the central body, if any, being the first)
+    """
+
+    rng = np.random.default_rng(seed)
+    n_disc = n - 1 if central_mass > 0 else n
+
+    radii = radius * np.sqrt(rng.uniform(0, 1, size = n_disc))
+    phi = rng.uniform(0, 2 * np.pi, size = n_disc)
+
+    # mass of the disc enclosed within each body, given by the rank of its radius
+    enclosed_mass = np.empty(n_disc)
+    enclosed_mass[np.argsort(radii)] = np.arange(n_disc) * mass / n_disc
+
+    circular_velocities = np.sqrt(G * (central_mass + enclosed_mass) / radii)
+
+    positions = np.stack([radii * np.cos(phi), radii * np.sin(phi), np.zeros(n_disc)], axis = 1)
+    velocities = np.stack([-circular_velocities * np.sin(phi), circular_velocities * np.cos(phi), np.zeros(n_disc)], axis = 1)
+    masses = np.full(n_disc, mass / n_disc)
+
+    if central_mass > 0:
+        positions = np.vstack([np.zeros(shape = (1, 3)), positions])
+        velocities = np.vstack([np.zeros(shape = (1, 3)), velocities])
+        masses = np.concatenate([[central_mass], masses])
+
+    return to_com_frame(positions, velocities, masses)
+
+def get_rotating_disc_nbod(n, mass = 1, radius = 1, central_mass = 0, G = 1, seed = 42, collision_tolerance = None, planar = None, **kwargs):
+    """
+    Produces an NBody instance for a rotating disc (see rotating_disc)
+    :param collision_tolerance: collision tolerance of the NBody (large systems start with some bodies very close to each other)
+    :param planar: if None, the disc is stored as a planar system whenever gravity is calculated by direct summation (see NBody)
+    :param kwargs: any other parameter of NBody (i.e backend)
+    :return: an NBody instance for a rotating disc
+    """
+
+    return NBody(*rotating_disc(n, mass = mass, radius = radius, central_mass = central_mass, G = G, seed = seed),
+                 collision_tolerance = collision_tolerance, planar = planar, **kwargs)
+
+# ------------------------------ HIERARCHICAL MULTIPLE ------------------------------
+
+def hierarchical_multiple(n, mass = 1, separation = 1, ratio = 0.1, G = 1, seed = 42):
+    """
+    Builds a hierarchical multiple system, by splitting the system into a circular binary of 2 subsystems (with half of the bodies each),
+    and each subsystem into binaries in turn, until every subsystem is a single body (i.e a binary of binaries for n = 4).
+    Every binary has a random orientation. The subsystems of every level are split at once, so the number of levels (log2(n)) is looped over.
+    :param n: the number of bodies
+    :param mass: the total mass of the system
+    :param separation: the separation of the outermost binary
+    :param ratio: the ratio between the separations of the binaries of consecutive levels (small ratios lead to stable systems)
+    :param G: constant of gravitation
+    :param seed: seed of the random generator
+    :return: a tuple with the positions, velocities and masses of the bodies
+    """
+
+    rng = np.random.default_rng(seed)
+
+    # number of bodies, mass, position and velocity of every subsystem of the current level
+    counts = np.array([n])
+    masses = np.array([float(mass)])
+    positions = np.zeros(shape = (1, 3))
+    velocities = np.zeros(shape = (1, 3))
+
+    while np.any(counts > 1):
+        split = counts > 1
+        k = np.count_nonzero(split)
+
+        # each subsystem which is split is replaced by its 2 components (consecutively), the others by themselves
+        parents = np.repeat(np.arange(len(counts)), np.where(split, 2, 1))
+        first = np.concatenate([[True], parents[1:] != parents[:-1]])
+        second = ~first
+
+        counts_a = (counts[split] + 1) // 2
+        counts_b = counts[split] - counts_a
+        masses_a = masses[split] * counts_a / counts[split]
+        masses_b = masses[split] - masses_a
+
+        # components orbit their COM along random (perpendicular) directions of separation and motion
+        directions = random_directions(rng, k)
+        motions = nm.mat_cross(directions, random_directions(rng, k))
+        motions /= nm.ten_norm(motions, axis = 1, sqrt = True)[:, np.newaxis]
+        speeds = np.sqrt(G * masses[split] / separation)
+
+        new_counts = counts[parents]
+        new_masses = masses[parents]
+        new_positions = positions[parents]
+        new_velocities = velocities[parents]
+
+        split_first = split[parents] & first
+        split_second = split[parents] & second
+
+        new_counts[split_first] = counts_a
+        new_counts[split_second] = counts_b
+        new_masses[split_first] = masses_a
+        new_masses[split_second] = masses_b
+        new_positions[split_first] += (masses_b / masses[split] * separation)[:, np.newaxis] * directions
+        new_positions[split_second] -= (masses_a / masses[split] * separation)[:, np.newaxis] * directions
+        new_velocities[split_first] += (masses_b / masses[split] * speeds)[:, np.newaxis] * motions
+        new_velocities[split_second] -= (masses_a / masses[split] * speeds)[:, np.newaxis] * motions
+
+        counts, masses, positions, velocities = new_counts, new_masses, new_positions, new_velocities
+        separation *= ratio
+
+    return to_com_frame(positions, velocities, masses)
+
+def get_hierarchical_nbod(n, mass = 1, separation = 1, ratio = 0.1, G = 1, seed = 42, collision_tolerance = None, **kwargs):
+    """
+    Produces an NBody instance for a hierarchical multiple system (see hierarchical_multiple)
+    :param collision_tolerance: collision tolerance of the NBody (the innermost binaries of large systems are very tight)
+    :param kwargs: any other parameter of NBody (i.e backend)
+    :return: an NBody instance for a hierarchical multiple system
+    """
+
+    return NBody(*hierarchical_multiple(n, mass = mass, separation = separation, ratio = ratio, G = G, seed = seed),
+                 collision_tolerance = collision_tolerance, **kwargs)
@@ -0,0 +1,15 @@
+from nbodysim.integrators.composition import Composition
+
+class BlanesMoan(Composition):
+    """
+    Class defining an integrator via the 4th order Runge-Kutta-Nystrom method of Blanes & Moan (2002), with optimised coefficients.
+    A step is a symmetric composition of 7 kicks and 6 drifts, requiring 6 accelerations,
+    with a much smaller error than Forest-Ruth for the same number of accelerations.
+    """
+
+    # coefficients b_1, b_2, b_3 (with b_4 = 1 - 2(b_1 + b_2 + b_3)) and a_1, a_2 (with a_3 = 1/2 - (a_1 + a_2)), from their table 3 (SRKN_6^b)
+    b = (0.0829844064174052, 0.396309801498368, -0.0390563049223486)
+    a = (0.245298957184271, 0.604872665711080)
+
+    kicks = b + (1 - 2 * sum(b),) + b[::-1]
+    drifts = a + (0.5 - sum(a),) + (0.5 - sum(a),) + a[::-1]
@@ -0,0 +1,167 @@
+import numpy as np
+
+from nbodysim.integrators.error_controlled import ErrorControlled
+from nbodysim.exceptions import SmallAdaptiveDeltaException, check_exception
+
+class BulirschStoer(ErrorControlled):
+    """
+    Class defining an integrator via the Bulirsch-Stoer method (Deuflhard's variant, as in Hairer, Nørsett & Wanner's ODEX).
+    A step of Δt is calculated by the modified midpoint method with an increasing number of substeps (2, 4, 6, ...), whose results are
+    extrapolated to infinitely many substeps (Richardson extrapolation, as a polynomial in (Δt/substeps)^2).
+    Extrapolation stops once consecutive orders agree to within epsilon, and the timestep and order of the next step are chosen to minimise
+    the accelerations calculated per unit of time. Steps which don't converge are recalculated with a smaller timestep (see ErrorControlled).
+    """
+
+    # largest and smallest ratios between consecutive timesteps, and safety factors of the error control (from ODEX)
+    max_ratio = 4
+    min_ratio = 0.02
+    safety_factor = 0.94
+    error_target = 0.65
+
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, epsilon = 1e-10, max_order = 8, delta_lim =10 ** -10, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
+        """
+        :param nbody: NBody instance which we integrate
+        :param steps: the number of steps (of delta) to integrate for, so the integration runs until steps*delta
+        :param delta: timestep to use for the first step, which is then controlled by epsilon
+        :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param epsilon: the accuracy of a step, as the relative (and absolute) difference between the positions and velocities
+                        of consecutive orders of the extrapolation. Smaller epsilon leads to more accurate orbits.
+        :param max_order: the largest number of rows of the extrapolation (so a step uses at most 2*max_order midpoint substeps)
+        :param delta_lim: smallest value allowed for the timestep
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
+        """
+
+        # check: at least 2 rows, so the error of a step can be estimated
+        assert max_order >= 2, f"Bulirsch-Stoer requires a max_order of at least 2, but was {max_order}"
+
+        # number of midpoint substeps of each row of the extrapolation, alongside the accelerations calculated up to each row
+        # (including the acceleration at the end of the step)
+        self.substeps = 2 * np.arange(1, max_order + 1)
+        self.costs = np.cumsum(self.substeps) + 1
+
+        # execute initialisation from superclass
+        super().__init__(nbody, steps, delta, tolerance = tolerance, epsilon = epsilon, delta_lim = delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
+
+    def set_arrays(self):
+        """
+        Initialises the arrays used by the integrator (see Integrator), alongside the acceleration and the order of the first step
+        """
+
+        # save acceleration for next iteration (used by the first substep of every row)
+        self.acc_t = self.nbody.get_acceleration(jit = self.jit)
+
+        # the row of the extrapolation at which the next step is expected to converge
+        self.order = min(4, len(self.substeps) - 1)
+
+        super().set_arrays()
+
+    def modified_midpoint(self, positions, velocities, delta, substeps):
+        """
+        Calculates a step of delta via the modified midpoint method, with Gragg's smoothing of the last substep
+        z_1 = z_0 + h*f(z_0), z_{m + 1} = z_{m - 1} + 2h*f(z_m), z(Δt) = (z_n + z_{n - 1} + h*f(z_n))/2, for h = Δt/n and z = (x, v)
+        :param substeps: the number of substeps n
+        :return: the positions and velocities at the end of the step, stacked in a single matrix
+        """
+
+        h = delta / substeps
+
+        previous_positions, previous_velocities = positions, velocities
+        positions = previous_positions + h * previous_velocities
+        velocities = previous_velocities + h * self.acc_t
+
+        for substep in range(1, substeps):
+            acceleration = self.nbody.get_acceleration(positions = positions, jit = self.jit)
+
+            previous_positions, positions = positions, previous_positions + 2 * h * velocities
+            previous_velocities, velocities = velocities, previous_velocities + 2 * h * acceleration
+
+        acceleration = self.nbody.get_acceleration(positions = positions, jit = self.jit)
+        self.step_evaluations += substeps
+
+        return np.concatenate([(positions + previous_positions + h * velocities) / 2, (velocities + previous_velocities + h * acceleration) / 2])
+
+    def integration_step(self, t, delta):
+        """
+        Integration step for the Bulirsch-Stoer method. Rows of the extrapolation are added until consecutive orders agree,
+        then the timestep and order of the next step are chosen, or the step is recalculated with a smaller timestep if it didn't converge
+        :param t: the step at which the calculation is made
+        :return the new positions and velocities, alongside the acceleration for step t+1
+        """
+
+        positions = self.current_positions
+        velocities = self.current_velocities
+        state = np.concatenate([positions, velocities])
+
+        delta = self.get_step_delta(t, delta)
+        self.step_evaluations = 1
+        self.step_rejections = 0
+
+        while True:
+            # the last row of the extrapolation table, alongside the timestep which would reach the target error at each order
+            row = []
+            optimal_deltas = np.zeros(len(self.substeps))
+            converged = None
+            last_row = min(self.order + 1, len(self.substeps) - 1)
+
+            for k in range(last_row + 1):
+                new_row = [self.modified_midpoint(positions, velocities, delta, self.substeps[k])]
+
+                # Aitken-Neville extrapolation of the rows to zero substep size, T_{k, j} = T_{k, j-1} + (T_{k, j-1} - T_{k-1, j-1}) / ((n_k/n_{k-j})^2 - 1)
+                for j in range(1, k + 1):
+                    new_row.append(new_row[j - 1] + (new_row[j - 1] - row[j - 1]) / ((self.substeps[k] / self.substeps[k - j])**2 - 1))
+
+                row = new_row
+
+                if k == 0:
+                    continue
+
+                # error of the order k, as the difference with the order k-1 relative to epsilon (scaled by the state)
+                scale = self.epsilon * (1 + np.maximum(np.abs(state), np.abs(row[k])))
+                error = np.max(np.abs(row[k] - row[k - 1]) / scale)
+
+                ratio = self.max_ratio if error == 0 else self.safety_factor * (self.error_target / error)**(1 / (2 * k + 1))
+                optimal_deltas[k] = delta * np.clip(ratio, self.min_ratio, self.max_ratio)
+
+                # check: convergence is only accepted around the expected order (earlier orders might agree by chance)
+                if error <= 1 and k >= self.order - 1:
+                    converged = k
+                    break
+
+            if converged is not None:
+                break
+
+            # steps which didn't converge are recalculated with the timestep of the expected order
+            new_delta = optimal_deltas[min(self.order, last_row)]
+            self.step_rejections += 1
+
+            if self.delta_lim is not None:
+                check_exception(new_delta > self.delta_lim, SmallAdaptiveDeltaException, lambda: f"Adaptive delta was made too small ({new_delta}) - orbit unfeasible")
+
+            delta = new_delta
+
+        # the order of the next step minimises the accelerations calculated per unit of time (the work)
+        k = converged
+        work = self.costs / np.where(optimal_deltas > 0, optimal_deltas, np.nan)
+
+        if k > 1 and work[k - 1] < 0.8 * work[k]:
+            self.order = k - 1
+            self.next_delta = optimal_deltas[k - 1]
+        elif (k == 1 or work[k] < 0.9 * work[k - 1]) and k + 1 < len(self.substeps):
+            self.order = k + 1
+            self.next_delta = optimal_deltas[k] * self.costs[k + 1] / self.costs[k]
+        else:
+            self.order = k
+            self.next_delta = optimal_deltas[k]
+
+        new_positions, new_velocities = np.split(row[k], 2)
+        acc_tt = self.nbody.get_acceleration(positions = new_positions, jit = self.jit)
+        self.step_delta = delta
+
+        return new_positions, new_velocities, acc_tt
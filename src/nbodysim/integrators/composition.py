@@ -0,0 +1,79 @@
+import numpy as np
+
+from nbodysim.integrators.integrator import Integrator
+
+class Composition(Integrator):
+    """
+    Class defining a symplectic integrator via a composition of kicks (of the velocities) and drifts (of the positions),
+    acting as a "superclass" for higher order methods (i.e Forest-Ruth, Yoshida and Blanes-Moan)
+    A step alternates kicks and drifts, starting and ending with a kick:
+    v += kicks[0]*a(x)*Δt, x += drifts[0]*v*Δt, v += kicks[1]*a(x)*Δt, ..., x += drifts[-1]*v*Δt, v += kicks[-1]*a(x)*Δt
+    The acceleration at the end of a step is reused by the first kick of the next step, so a step requires one acceleration per drift
+    (intermediate drifts followed by a kick of 0 don't require one, whilst the acceleration at the end of the step is always calculated)
+    """
+
+    # coefficients of the kicks and drifts of a step (overloaded by each method). There is one more kick than drifts
+    kicks = (0.5, 0.5)
+    drifts = (1,)
+
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 1, delta_lim =10 ** -5, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
+        """
+        :param nbody: NBody instance which we integrate
+        :param steps: the number of steps to integrate for
+        :param delta: timestep to use for the integrator. Smaller timesteps lead to more accurate orbits.
+        :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param adaptive: if True, the Integrator will use an adaptive timestep (instead of a fixed one)
+        :param adaptive_constant: constant used when calculating adaptive timestep. Smaller adaptive_constant leads to more accurate orbits.
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
+        """
+
+        # check: one more kick than drifts, with both summing to 1 (so a step advances the system by Δt)
+        assert len(self.kicks) == len(self.drifts) + 1, f"A composition requires one more kick than drifts, but had {len(self.kicks)} kicks and {len(self.drifts)} drifts"
+        assert np.isclose(sum(self.kicks), 1) and np.isclose(sum(self.drifts), 1), "The kicks and drifts of a composition must each sum to 1"
+
+        # execute initialisation from superclass
+        super().__init__(nbody, steps, delta, tolerance = tolerance, adaptive = adaptive, adaptive_constant= adaptive_constant, delta_lim = delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
+
+        # number of accelerations calculated at each step (the last one is always calculated, for the next step)
+        self.step_evaluations = sum(1 for kick in self.kicks[1:-1] if kick != 0) + 1
+
+        # save acceleration for next iteration (used by the first kick)
+        self.acc_t = self.nbody.get_acceleration(jit = self.jit)
+
+    def integration_step(self, t, delta):
+        """
+        Integration step for a composition of kicks and drifts (see Composition)
+        :param t: the step at which the calculation is made
+        :return the new positions and velocities, alongside the acceleration for step t+1
+        """
+
+        # intermediate stages are kept in double precision (even if the orbits are stored in single precision),
+        # within preallocated arrays (see Workspace)
+        positions = self.workspace.get("stage_positions", self.position_steps[t - 1].shape)
+        velocities = self.workspace.get("stage_velocities", self.velocity_steps[t - 1].shape)
+        positions[...] = self.position_steps[t - 1]
+        velocities[...] = self.velocity_steps[t - 1]
+
+        acceleration = self.acc_t
+
+        for stage, kick in enumerate(self.kicks):
+            if stage > 0:
+                # x += drift*v*Δt
+                positions += (self.drifts[stage - 1] * delta) * velocities
+
+                # the acceleration at the end of the step is always calculated, as it's used by the first kick of the next step
+                last = stage == len(self.kicks) - 1
+                acceleration = None if kick == 0 and not last else self.nbody.get_acceleration(positions = positions, jit = self.jit)
+
+            # v += kick*a(x)*Δt
+            if kick != 0:
+                velocities += (kick * delta) * acceleration
+
+        return positions, velocities, acceleration
@@ -0,0 +1,25 @@
+import numpy as np
+
+from nbodysim.integrators.embedded_runge_kutta import EmbeddedRungeKutta
+
+class DormandPrince5(EmbeddedRungeKutta):
+    """
+    Class defining an integrator via the Dormand-Prince 5(4) method (Dormand & Prince, 1980), as in Hairer's DOPRI5.
+    A step has 7 stages, the last of which is the end of the step (first same as last), so it requires 6 accelerations.
+    The error is estimated by the difference with the embedded 4th order method.
+    """
+
+    # Butcher tableau of the method
+    c = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+    a = np.array([[0, 0, 0, 0, 0, 0, 0],
+                  [1 / 5, 0, 0, 0, 0, 0, 0],
+                  [3 / 40, 9 / 40, 0, 0, 0, 0, 0],
+                  [44 / 45, -56 / 15, 32 / 9, 0, 0, 0, 0],
+                  [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729, 0, 0, 0],
+                  [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656, 0, 0],
+                  [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0]])
+    b = a[-1]
+
+    # difference between the 5th and 4th order weights
+    error_weights = (np.array([71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40]),)
+    order = 5
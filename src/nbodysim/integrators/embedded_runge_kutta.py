@@ -0,0 +1,152 @@
+import numpy as np
+
+from nbodysim.integrators.error_controlled import ErrorControlled
+from nbodysim.exceptions import SmallAdaptiveDeltaException, check_exception
+
+class EmbeddedRungeKutta(ErrorControlled):
+    """
+    Class defining an integrator via an explicit Runge-Kutta method with an embedded error estimate, acting as a "superclass" for
+    Dormand-Prince methods. The positions and velocities are integrated as a first order system, z = (x, v) with dz/dt = (v, a(x)):
+    z_i = z_t + Δt * sum over j < i of a_ij k_j for each stage i, with k_i = f(z_i), and z_{t + 1} = z_t + Δt * sum over i of b_i k_i
+    The error of a step is estimated by weights e_i (the difference between b and the weights of a lower order method), relative to epsilon,
+    and the timestep is chosen by a PI controller (Gustafsson, 1991), Δt' = Δt * safety * err^(-α) * err_old^β, with α = 1/order - 0.75β
+    Steps whose error is larger than epsilon are recalculated with a smaller timestep (see ErrorControlled).
+    """
+
+    # Butcher tableau of the method (overloaded by each method): nodes c, coefficients a (lower triangular), and weights b
+    c = np.array([0, 1])
+    a = np.array([[0, 0], [1, 0]])
+    b = np.array([0.5, 0.5])
+
+    # weights of the error estimates (the difference of b with the weights of lower order methods), and the order used by the PI controller
+    error_weights = (np.array([-0.5, 0.5]),)
+    order = 2
+
+    # accuracy of a step used if epsilon isn't given (overloaded by methods of higher order)
+    default_epsilon = 10**-10
+
+    # parameters of the PI controller (from Hairer's DOPRI5): exponent β of the last error, safety factor, and ratios between consecutive timesteps
+    beta = 0.04
+    safety_factor = 0.9
+    min_ratio = 0.2
+    max_ratio = 10
+
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, epsilon = None, delta_lim =10 ** -10, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
+        """
+        :param nbody: NBody instance which we integrate
+        :param steps: the number of steps (of delta) to integrate for, so the integration runs until steps*delta
+        :param delta: timestep to use for the first step, which is then controlled by epsilon
+        :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param epsilon: the accuracy of a step, as the relative (and absolute) local error of the positions and velocities.
+                        Smaller epsilon leads to more accurate orbits. If None, uses the default_epsilon of the method.
+        :param delta_lim: smallest value allowed for the timestep
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
+        """
+
+        # check: consistent tableau, with the coefficients of each stage summing to its node
+        assert np.allclose(np.sum(self.a, axis = 1), self.c) and np.isclose(np.sum(self.b), 1), "Inconsistent Butcher tableau"
+
+        # methods whose last stage is the end of the step (first same as last) reuse its acceleration for the next step
+        self.fsal = self.c[-1] == 1 and np.array_equal(self.a[-1], self.b)
+
+        if epsilon is None:
+            epsilon = self.default_epsilon
+
+        # execute initialisation from superclass
+        super().__init__(nbody, steps, delta, tolerance = tolerance, epsilon = epsilon, delta_lim = delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
+
+    def set_arrays(self):
+        """
+        Initialises the arrays used by the integrator (see Integrator), alongside the acceleration and the last error of the PI controller
+        """
+
+        # save acceleration for next iteration (the first stage of a step)
+        self.acc_t = self.nbody.get_acceleration(jit = self.jit)
+
+        # error of the last accepted step (initially small, so the first timestep isn't reduced by it)
+        self.last_error = 10**-4
+
+        super().set_arrays()
+
+    def get_error(self, estimates, scale):
+        """
+        Combines the error estimates of a step into a single error (relative to epsilon, so the step is accepted if it's at most 1).
+        Overloaded by methods with several estimates (i.e DormandPrince8)
+        :param estimates: a list with the estimated error of the positions and velocities, for each estimate
+        :param scale: the allowed error of each position and velocity
+        :return: the error of the step
+        """
+
+        return np.max(np.abs(estimates[0]) / scale)
+
+    def integration_step(self, t, delta):
+        """
+        Integration step for an embedded Runge-Kutta method (see EmbeddedRungeKutta).
+        The stages are calculated, then the step is accepted or recalculated with a smaller timestep, depending on its error
+        :param t: the step at which the calculation is made
+        :return the new positions and velocities, alongside the acceleration for step t+1
+        """
+
+        positions = self.current_positions
+        velocities = self.current_velocities
+
+        # velocities and accelerations of each stage (the derivatives of the positions and velocities), within preallocated arrays (see Workspace)
+        stage_velocities = self.workspace.get("stage_velocities", (len(self.c),) + positions.shape)
+        stage_accelerations = self.workspace.get("stage_accelerations", (len(self.c),) + positions.shape)
+
+        delta = self.get_step_delta(t, delta)
+        self.step_evaluations = 0 if self.fsal else 1
+        self.step_rejections = 0
+
+        while True:
+            stage_velocities[0] = velocities
+            stage_accelerations[0] = self.acc_t
+
+            for stage in range(1, len(self.c)):
+                stage_positions = positions + delta * np.tensordot(self.a[stage, :stage], stage_velocities[:stage], axes = 1)
+                stage_velocities[stage] = velocities + delta * np.tensordot(self.a[stage, :stage], stage_accelerations[:stage], axes = 1)
+                stage_accelerations[stage] = self.nbody.get_acceleration(positions = stage_positions, jit = self.jit)
+
+            self.step_evaluations += len(self.c) - 1
+
+            new_positions = positions + delta * np.tensordot(self.b, stage_velocities, axes = 1)
+            new_velocities = velocities + delta * np.tensordot(self.b, stage_accelerations, axes = 1)
+
+            # allowed error of each position and velocity, relative to the largest of its values at the start and end of the step
+            scale = self.epsilon * (1 + np.concatenate([np.maximum(np.abs(positions), np.abs(new_positions)), np.maximum(np.abs(velocities), np.abs(new_velocities))]))
+            estimates = [delta * np.concatenate([np.tensordot(weights, stage_velocities, axes = 1), np.tensordot(weights, stage_accelerations, axes = 1)])
+                         for weights in self.error_weights]
+            error = self.get_error(estimates, scale)
+
+            # PI controller: the timestep depends on the errors of the step and the last accepted step
+            alpha = 1 / self.order - 0.75 * self.beta
+            ratio = self.max_ratio if error == 0 else self.safety_factor * error**(-alpha) * self.last_error**self.beta
+            ratio = min(max(ratio, self.min_ratio), self.max_ratio)
+
+            if error <= 1:
+                break
+
+            # steps whose error is too large are recalculated with a smaller timestep
+            new_delta = delta * min(ratio, 1)
+            self.step_rejections += 1
+
+            if self.delta_lim is not None:
+                check_exception(new_delta > self.delta_lim, SmallAdaptiveDeltaException, lambda: f"Adaptive delta was made too small ({new_delta}) - orbit unfeasible")
+
+            delta = new_delta
+
+        # the timestep doesn't increase straight after a rejection
+        self.next_delta = delta * (min(ratio, 1) if self.step_rejections > 0 else ratio)
+        self.last_error = max(error, 10**-4)
+        self.step_delta = delta
+
+        acc_tt = np.array(stage_accelerations[-1]) if self.fsal else self.nbody.get_acceleration(positions = new_positions, jit = self.jit)
+
+        return new_positions, new_velocities, acc_tt
@@ -0,0 +1,141 @@
+import warnings
+
+import numpy as np
+
+from nbodysim.integrators.integrator import Integrator
+
+class ErrorControlled(Integrator):
+    """
+    Class defining an integrator which controls its own timestep from the error of each step, acting as a "superclass" for IAS15, Bulirsch-Stoer and embedded Runge-Kutta methods.
+    The integration always uses an adaptive timestep, running until steps*delta (so at most 10^5 steps are stored), with delta as the first timestep.
+    Each integration step provides the timestep of the next one, and steps whose error is too large are recalculated with a smaller timestep
+    (so only accepted steps are stored in times, whilst the rejections before each of them are counted). The last step is shortened to end at the target time.
+    The positions and velocities are integrated in double precision (even if the orbits are stored in single precision), as the error of a step
+    is compared to epsilon.
+    For systems in mixed precision, whose forces are calculated from positions in single precision, epsilon is limited to min_epsilon.
+    """
+
+    # each step is only calculated once (besides rejections), with the timestep given by the error control of the last step
+    reversible = False
+
+    # smallest accuracy of a step for systems in mixed precision (smaller errors are dominated by the rounding of the forces)
+    min_epsilon = 10**-6
+
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, epsilon = 1e-9, delta_lim =10 ** -10, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
+        """
+        :param nbody: NBody instance which we integrate
+        :param steps: the number of steps (of delta) to integrate for, so the integration runs until steps*delta
+        :param delta: timestep to use for the first step, which is then controlled by epsilon
+        :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param epsilon: the accuracy of a step (defined by each method). Smaller epsilon leads to smaller timesteps
+        :param delta_lim: smallest value allowed for the timestep
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
+        """
+
+        # check: epsilon isn't smaller than the rounding of the forces of systems in mixed precision
+        if nbody.precision == "mixed" and epsilon < self.min_epsilon:
+            warnings.warn(f"The forces of systems in mixed precision are calculated from positions in single precision, "
+                          f"so epsilon was increased from {epsilon} to {self.min_epsilon}")
+            epsilon = self.min_epsilon
+
+        self.epsilon = epsilon
+
+        # execute initialisation from superclass
+        super().__init__(nbody, steps, delta, tolerance = tolerance, adaptive = True, adaptive_constant = epsilon, delta_lim = delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
+
+    def set_arrays(self):
+        """
+        Initialises the arrays used by the integrator (see Integrator), alongside the timestep of the next step and the count of rejected steps
+        """
+
+        # timestep of the next step, and timestep used by the last step (smaller than the one provided if the step was rejected)
+        self.next_delta = None
+        self.step_delta = None
+
+        # number of times steps were recalculated with a smaller timestep (as their error was too large), in total and for the last step
+        self.rejected_steps = 0
+        self.step_rejections = 0
+
+        super().set_arrays()
+
+        # the rejections before each accepted step are stored alongside the adaptive timestep (see simulation_step)
+        if self.store_properties:
+            self.historic_rejections = np.zeros(self.steps, dtype = int)
+
+        # positions and velocities at the end of the last step, in double precision (the orbit arrays store rounded copies)
+        self.current_positions = np.array(self.nbody.all_positions, dtype = np.float64)
+        self.current_velocities = np.array(self.nbody.all_velocities, dtype = np.float64)
+
+    def get_adaptive_delta(self, positions, velocities):
+        """
+        Provides the timestep for the next step, as given by the error control of the last step (or delta, before any step)
+        :return: the timestep
+        """
+
+        return self.delta if self.next_delta is None else self.next_delta
+
+    def get_step_delta(self, t, delta):
+        """
+        :param t: the step at which the calculation is made
+        :param delta: the timestep provided for the step
+        :return: the timestep to attempt, shortened so that the last step ends at the target time
+        """
+
+        return min(delta, self.target_time - self.times[t - 1])
+
+    def update_simulation(self, t, new_positions, new_velocities, symplectic):
+        """
+        Keeps the newly calculated positions and velocities in double precision for the next step, then updates the simulation (see Integrator)
+        """
+
+        self.current_positions = np.asarray(new_positions, dtype = np.float64)
+        self.current_velocities = np.asarray(new_velocities, dtype = np.float64)
+
+        super().update_simulation(t, new_positions, new_velocities, symplectic)
+
+    def update_historic(self, t):
+        """
+        Updates the historic arrays (see Integrator), storing the timestep used by the accepted step t as its adaptive timestep
+        (so historic_delta[t] = times[t] - times[t - 1], whilst historic_delta[0] is the timestep provided for the first step)
+        :param t: the step for which the historic quantites are calculated
+        """
+
+        super().update_historic(t)
+
+        self.historic_delta[t] = self.step_delta
+
+    def simulation_step(self, t):
+        """
+        Performs a step (see Integrator), then sets the time of the step to the timestep it actually used
+        (steps whose error was too large were recalculated with a smaller timestep), and counts its rejections
+        :param t: the step at which the calculation is made
+        """
+
+        super().simulation_step(t)
+
+        self.times[t] = self.times[t - 1] + self.step_delta
+        self.rejected_steps += self.step_rejections
+
+        if self.store_properties:
+            self.historic_rejections[t] = self.step_rejections
+
+    def get_orbits(self):
+        """
+        Performs the integration (see Integrator), then shortens the rejections to the number of steps required to reach the target time
+        """
+
+        super().get_orbits()
+
+        if self.store_properties:
+            self.historic_rejections = self.historic_rejections[:self.steps]
+
+        # check: the integration reached the target time within the largest number of steps
+        if self.times[-1] < self.target_time:
+            warnings.warn(f"The integration stopped at t = {self.times[-1]} after {len(self.times) - 1} steps, before the target time {self.target_time}")
@@ -0,0 +1,13 @@
+from nbodysim.integrators.composition import Composition
+
+class ForestRuth(Composition):
+    """
+    Class defining an integrator via the 4th order Forest-Ruth method (Forest & Ruth, 1990), also derived by Yoshida (1990).
+    A step is a composition of 3 Leapfrog steps (of Δt*θ, Δt*(1 - 2θ) and Δt*θ, with θ = 1/(2 - 2^(1/3))), requiring 3 accelerations.
+    """
+
+    # weights of the Leapfrog steps
+    theta = 1 / (2 - 2**(1 / 3))
+
+    kicks = (theta / 2, (1 - theta) / 2, (1 - theta) / 2, theta / 2)
+    drifts = (theta, 1 - 2 * theta, theta)
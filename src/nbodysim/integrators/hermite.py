@@ -0,0 +1,158 @@
+import numpy as np
+
+from nbodysim.integrators.integrator import Integrator
+from nbodysim import nmath as nm
+from nbodysim.exceptions import SmallAdaptiveDeltaException, check_exception
+
+class Hermite(Integrator):
+    """
+    Class defining an integrator via the 4th order Hermite predictor-corrector method (Makino & Aarseth, 1992),
+    which uses the jerk (time derivative of the acceleration) alongside the acceleration, calculated in the same pass over every pair of bodies.
+    With an adaptive timestep, uses Aarseth's criterion (shared by every body), so steps shrink during close encounters.
+    Accelerations and jerks are always calculated by direct summation, so only systems without a backend (or with a DirectBackend) are supported,
+    and tracers aren't supported either.
+    The positions and velocities are integrated in double precision (even if the orbits are stored in single precision).
+    """
+
+    # each adaptive step is only calculated once, with the timestep given by the end of the last step
+    reversible = False
+
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 0.02, delta_lim =10 ** -5, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
+        """
+        :param nbody: NBody instance which we integrate
+        :param steps: the number of steps to integrate for
+        :param delta: timestep to use for the integrator. Smaller timesteps lead to more accurate orbits.
+        :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param adaptive: if True, the Integrator will use an adaptive timestep given by Aarseth's criterion (instead of a fixed one)
+        :param adaptive_constant: accuracy parameter η of Aarseth's criterion. Smaller adaptive_constant leads to more accurate orbits.
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
+        """
+
+        # check: only massive bodies are integrated
+        assert nbody.n_tracers == 0, "Hermite integrators don't support tracers"
+
+        # check: the force model of the system is direct summation, as used for the accelerations and jerks
+        assert nbody.backend is None or nbody.backend.interactions, \
+            "Hermite integrators calculate gravity by direct summation, so they require a system without a backend (or with a DirectBackend)"
+
+        # execute initialisation from superclass
+        super().__init__(nbody, steps, delta, tolerance = tolerance, adaptive = adaptive, adaptive_constant= adaptive_constant, delta_lim = delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
+
+    def set_arrays(self):
+        """
+        Initialises the arrays used by the integrator (see Integrator), alongside the acceleration and jerk of the system
+        """
+
+        # save acceleration and jerk for next iteration. Only require 1 calculation of both per step
+        self.acc_t, self.jerk_t = self.nbody.get_acceleration_jerk(jit = self.jit)
+
+        # snap and crackle (2nd and 3rd time derivatives of the acceleration) at the end of the last step, used by Aarseth's criterion
+        self.snap = None
+        self.crackle = None
+
+        super().set_arrays()
+
+        # positions and velocities at the end of the last step, in double precision (the orbit arrays store rounded copies)
+        self.current_positions = np.array(self.nbody.all_positions, dtype = np.float64)
+        self.current_velocities = np.array(self.nbody.all_velocities, dtype = np.float64)
+
+    def get_adaptive_delta(self, positions, velocities):
+        """
+        Calculates the adaptive timestep via Aarseth's criterion, as the smallest over every body of
+        Δt = sqrt(η (|a||a^(2)| + |a^(1)|^2) / (|a^(1)||a^(3)| + |a^(2)|^2)), using the derivatives of the acceleration at the end of the last step.
+        Before any step is made, the starting criterion Δt = η |a|/|a^(1)| is used instead.
+        :param positions: the positions of the bodies (the derivatives of the acceleration are those of the last step)
+        :param velocities: the velocities of the bodies
+        :return: the adaptive timestep
+        """
+
+        if self.snap is None:
+            acceleration, jerk = self.nbody.get_acceleration_jerk(positions, velocities, jit = self.jit)
+            numerator = nm.ten_norm(acceleration, axis = 1, sqrt = True)
+            denominator = nm.ten_norm(jerk, axis = 1, sqrt = True)
+        else:
+            acceleration, jerk = self.acc_tt, self.jerk_tt
+            acc_mag = nm.ten_norm(acceleration, axis = 1, sqrt = True)
+            jerk_mag = nm.ten_norm(jerk, axis = 1, sqrt = True)
+            snap_mag = nm.ten_norm(self.snap, axis = 1, sqrt = True)
+            crackle_mag = nm.ten_norm(self.crackle, axis = 1, sqrt = True)
+            numerator = acc_mag * snap_mag + jerk_mag**2
+            denominator = jerk_mag * crackle_mag + snap_mag**2
+
+        # bodies whose acceleration doesn't change (i.e a single body) don't restrict the timestep
+        ratios = np.divide(numerator, denominator, out = np.full(len(numerator), np.inf), where = denominator != 0)
+        ratio = np.min(ratios)
+
+        if not np.isfinite(ratio):
+            return self.delta
+
+        variable_delta = self.adaptive_constant * ratio if self.snap is None else np.sqrt(self.adaptive_constant * ratio)
+
+        # check; if delta is provided, ensure that the calculated variable delta does not become smaller than the minimum allowed
+        if self.delta_lim is not None:
+            check_exception(variable_delta > self.delta_lim, SmallAdaptiveDeltaException, lambda: f"Adaptive delta was made too small ({variable_delta}) - orbit unfeasible")
+
+        return variable_delta
+
+    def integration_step(self, t, delta):
+        """
+        Integration step for the Hermite predictor-corrector method.
+        x_p = x_t + v_t*Δt + a_t*Δt^2/2 + j_t*Δt^3/6
+        v_p = v_t + a_t*Δt + j_t*Δt^2/2
+        a_{t + 1}, j_{t + 1} calculated at x_p, v_p
+        v_{t + 1} = v_t + (a_t + a_{t + 1})*Δt/2 + (j_t - j_{t + 1})*Δt^2/12
+        x_{t + 1} = x_t + (v_t + v_{t + 1})*Δt/2 + (a_t - a_{t + 1})*Δt^2/12
+        :param t: the step at which the calculation is made
+        :return the new positions and velocities, alongside the acceleration for step t+1
+        """
+
+        positions = self.current_positions
+        velocities = self.current_velocities
+
+        # predict the positions and velocities via Taylor series
+        predicted_positions = positions + delta * (velocities + delta * (self.acc_t / 2 + delta * self.jerk_t / 6))
+        predicted_velocities = velocities + delta * (self.acc_t + delta * self.jerk_t / 2)
+
+        acc_tt, jerk_tt = self.nbody.get_acceleration_jerk(predicted_positions, predicted_velocities, jit = self.jit)
+
+        # correct the positions and velocities via the Hermite interpolation of the acceleration
+        new_velocities = velocities + delta * ((self.acc_t + acc_tt) / 2 + delta * (self.jerk_t - jerk_tt) / 12)
+        new_positions = positions + delta * ((velocities + new_velocities) / 2 + delta * (self.acc_t - acc_tt) / 12)
+
+        # snap and crackle at the end of the step, from the interpolation of the acceleration (for Aarseth's criterion)
+        crackle = (12 * (self.acc_t - acc_tt) + 6 * delta * (self.jerk_t + jerk_tt)) / delta**3
+        self.snap = (-6 * (self.acc_t - acc_tt) - delta * (4 * self.jerk_t + 2 * jerk_tt)) / delta**2 + delta * crackle
+        self.crackle = crackle
+
+        # the jerk is kept alongside the acceleration, until the step is accepted (see simulation_step)
+        self.acc_tt = acc_tt
+        self.jerk_tt = jerk_tt
+
+        return new_positions, new_velocities, acc_tt
+
+    def update_simulation(self, t, new_positions, new_velocities, symplectic):
+        """
+        Keeps the newly calculated positions and velocities in double precision for the next step, then updates the simulation (see Integrator)
+        """
+
+        self.current_positions = np.asarray(new_positions, dtype = np.float64)
+        self.current_velocities = np.asarray(new_velocities, dtype = np.float64)
+
+        super().update_simulation(t, new_positions, new_velocities, symplectic)
+
+    def simulation_step(self, t):
+        """
+        Performs a step (see Integrator), then sets the calculated jerk for the next iteration
+        :param t: the step at which the calculation is made
+        """
+
+        super().simulation_step(t)
+
+        self.jerk_t = self.jerk_tt
@@ -0,0 +1,202 @@
+from math import comb
+
+import numpy as np
+
+from nbodysim.integrators.error_controlled import ErrorControlled
+from nbodysim.exceptions import SmallAdaptiveDeltaException, check_exception
+
+class IAS15(ErrorControlled):
+    """
+    Class defining an integrator via a 15th order Gauss-Radau predictor-corrector method, in the style of IAS15 (Rein & Spiegel, 2015).
+    Within a step, the acceleration is approximated by a polynomial of degree 7 in time, a(h) = a_0 + b_0*h + b_1*h^2 + ... + b_6*h^7,
+    whose coefficients are found by iterating over the accelerations at the 7 Gauss-Radau substeps until they converge to machine precision.
+    The timestep is controlled by the error of the last coefficient (see ErrorControlled), and steps whose error is too large are recalculated.
+    Increments of the positions and velocities are added with compensated summation, so rounding errors don't accumulate.
+    """
+
+    # spacings of the Gauss-Radau substeps within a step (as fractions of the timestep)
+    spacings = np.array([0, 0.0562625605369221464656521910318, 0.180240691736892364987579942780, 0.352624717113169637373907769648,
+                         0.547153626330555383001448554766, 0.734210177215410531523210605558, 0.885320946839095768090359771030,
+                         0.977520613561287501891174488626])
+
+    # the polynomial is also written in Newton form, a(h) = a_0 + g_0*h + g_1*h*(h - h_1) + ... + g_6*h*(h - h_1)...(h - h_6)
+    # column k of newton_to_monomial contains the coefficients of h*(h - h_1)...(h - h_k) (of h^1 to h^7), so b = newton_to_monomial @ g
+    newton_to_monomial = np.zeros(shape = (7, 7))
+
+    for k in range(7):
+        newton_to_monomial[:k + 1, k] = np.polynomial.polynomial.polyfromroots(spacings[1:k + 1])
+
+    del k
+    monomial_to_newton = np.linalg.inv(newton_to_monomial)
+
+    # the polynomial is re-expanded around the end of a step, with b'_k = q^(k+1) * sum over m >= k of C(m+1, k+1) b_m (for q = Δt'/Δt)
+    binomials = np.array([[comb(m + 1, k + 1) for m in range(7)] for k in range(7)], dtype = np.float64)
+
+    # the coefficients are considered converged once the last one changes by less than pc_epsilon (relative to the accelerations)
+    pc_epsilon = 10**-16
+    max_iterations = 12
+
+    # smallest and largest ratios between consecutive timesteps (steps with smaller ratios are recalculated)
+    safety_factor = 0.25
+
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, epsilon = 1e-9, delta_lim = 10 ** -10, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
+        """
+        :param nbody: NBody instance which we integrate
+        :param steps: the number of steps (of delta) to integrate for, so the integration runs until steps*delta
+        :param delta: timestep to use for the first step, which is then controlled by epsilon
+        :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param epsilon: the accuracy of a step, as the error of the last coefficient of the acceleration relative to the acceleration.
+                        Smaller epsilon leads to smaller timesteps (10^-9 keeps the energy error near machine precision)
+        :param delta_lim: smallest value allowed for the timestep
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
+        """
+
+        # check: forces calculated in double precision, as the error of a step is estimated from differences of the accelerations near machine precision
+        assert nbody.precision == "double", "IAS15 requires a system in double precision (the orbits can still be stored in mixed precision)"
+
+        # execute initialisation from superclass
+        super().__init__(nbody, steps, delta, tolerance = tolerance, epsilon = epsilon, delta_lim = delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
+
+    def set_arrays(self):
+        """
+        Initialises the arrays used by the integrator (see Integrator), alongside the coefficients of the acceleration and the compensations
+        """
+
+        # save acceleration for next iteration (the acceleration at the start of a step)
+        self.acc_t = self.nbody.get_acceleration(jit = self.jit)
+
+        # coefficients b of the polynomial of the acceleration (predicted from the last step)
+        self.b = np.zeros(shape = (7,) + self.acc_t.shape)
+
+        # rounding errors of the positions and velocities, which are compensated at the next step
+        self.position_compensation = np.zeros(shape = self.acc_t.shape)
+        self.velocity_compensation = np.zeros(shape = self.acc_t.shape)
+
+        super().set_arrays()
+
+    def get_substep_positions(self, positions, velocities, h, delta):
+        """
+        Calculates the positions at a fraction of the step, by integrating the polynomial of the acceleration twice
+        x(h) = x_0 + v_0*h*Δt + (h*Δt)^2 * (a_0/2 + b_0*h/6 + b_1*h^2/12 + ... + b_6*h^7/72)
+        :param h: the fraction of the step
+        :return: the positions at h
+        """
+
+        powers = h ** np.arange(1, 8)
+        factors = powers / ((np.arange(1, 8) + 1) * (np.arange(1, 8) + 2))
+
+        return positions + (h * delta) * velocities + (h * delta)**2 * (self.acc_t / 2 + np.tensordot(factors, self.b, axes = 1))
+
+    def integration_step(self, t, delta):
+        """
+        Integration step for the Gauss-Radau predictor-corrector method. The coefficients are iterated until they converge,
+        then the step is recalculated with a smaller timestep if its error is too large
+        :param t: the step at which the calculation is made
+        :return the new positions and velocities, alongside the acceleration for step t+1
+        """
+
+        positions = self.current_positions
+        velocities = self.current_velocities
+        acc_scale = np.max(np.abs(self.acc_t))
+        delta = self.get_step_delta(t, delta)
+        self.step_evaluations = 1
+        self.step_rejections = 0
+
+        while True:
+            # coefficients in Newton form, consistent with the predicted coefficients
+            g = np.tensordot(self.monomial_to_newton, self.b, axes = 1)
+            last_change = np.inf
+
+            for iteration in range(self.max_iterations):
+                previous_b6 = np.array(self.b[6])
+
+                for substep in range(1, 8):
+                    h = self.spacings[substep]
+                    acceleration = self.nbody.get_acceleration(positions = self.get_substep_positions(positions, velocities, h, delta), jit = self.jit)
+                    self.step_evaluations += 1
+
+                    # divided differences give the Newton coefficient of the substep, from the accelerations of the earlier substeps
+                    new_g = (acceleration - self.acc_t) / h
+
+                    for k in range(substep - 1):
+                        new_g = (new_g - g[k]) / (h - self.spacings[k + 1])
+
+                    # the change of the Newton coefficient only changes the monomial coefficients up to b_substep
+                    self.b += self.newton_to_monomial[:, substep - 1, np.newaxis, np.newaxis] * (new_g - g[substep - 1])
+                    g[substep - 1] = new_g
+
+                # check: the coefficients converged, or stopped improving (because of rounding)
+                change = np.max(np.abs(self.b[6] - previous_b6)) / acc_scale if acc_scale > 0 else 0
+
+                if change < self.pc_epsilon or (iteration > 1 and change >= last_change):
+                    break
+
+                last_change = change
+
+            # the error of the step is estimated by the last coefficient, so the timestep scales as its 7th root
+            error = np.max(np.abs(self.b[6])) / acc_scale if acc_scale > 0 else 0
+            ratio = 1 / self.safety_factor if error == 0 else min((self.epsilon / error)**(1 / 7), 1 / self.safety_factor)
+            new_delta = delta * ratio
+
+            # steps whose error is too large are recalculated with the smaller timestep, from coefficients predicted for it
+            if ratio >= self.safety_factor:
+                break
+
+            if self.delta_lim is not None:
+                check_exception(new_delta > self.delta_lim, SmallAdaptiveDeltaException, lambda: f"Adaptive delta was made too small ({new_delta}) - orbit unfeasible")
+
+            self.b = self.predict_coefficients(new_delta / delta, end = False)
+            self.step_rejections += 1
+            delta = new_delta
+
+        # the increments of the positions and velocities over the step are added with compensated summation
+        orders = np.arange(1, 8)
+        position_increment = delta * velocities + delta**2 * (self.acc_t / 2 + np.tensordot(1 / ((orders + 1) * (orders + 2)), self.b, axes = 1))
+        velocity_increment = delta * (self.acc_t + np.tensordot(1 / (orders + 1), self.b, axes = 1))
+
+        new_positions, self.position_compensation = self.compensated_sum(positions, position_increment, self.position_compensation)
+        new_velocities, self.velocity_compensation = self.compensated_sum(velocities, velocity_increment, self.velocity_compensation)
+
+        acc_tt = self.nbody.get_acceleration(positions = new_positions, jit = self.jit)
+
+        # the coefficients of the next step are predicted by re-expanding the polynomial around the end of the step
+        self.b = self.predict_coefficients(new_delta / delta)
+        self.step_delta = delta
+        self.next_delta = new_delta
+
+        return new_positions, new_velocities, acc_tt
+
+    def predict_coefficients(self, q, end = True):
+        """
+        Predicts the coefficients of the acceleration for a step with a different timestep
+        :param q: the ratio between the new and current timesteps
+        :param end: if True, the polynomial is re-expanded around the end of the step (for the next step).
+                    Otherwise, around its start (for the same step, recalculated with a smaller timestep)
+        :return: the predicted coefficients
+        """
+
+        powers = q ** np.arange(1, 8)
+
+        if end:
+            return powers[:, np.newaxis, np.newaxis] * np.tensordot(self.binomials, self.b, axes = 1)
+
+        return powers[:, np.newaxis, np.newaxis] * self.b
+
+    @staticmethod
+    def compensated_sum(values, increments, compensation):
+        """
+        Adds increments to values via Kahan summation, keeping the rounding error to compensate it at the next addition
+        :return: a tuple with the sums and their rounding errors
+        """
+
+        increments = increments - compensation
+        sums = values + increments
+
+        return sums, (sums - values) - increments
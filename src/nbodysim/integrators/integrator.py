@@ -1,13 +1,26 @@
+import warnings
+
 import numpy as np
 
 from nbodysim import nmath as nm
+from nbodysim import jit_kernels as jk
 from nbodysim.orbit_plotter import OrbitPlotter
+from nbodysim.workspace import Workspace
 
 class Integrator:
     """
     Class defining a general integrator, acting as a "superclass" for Euler, Euler-Cromer and all Leapfrog methods
     """
-    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 1, delta_lim =10 ** -5, store_properties = False):
+
+    # if True, each adaptive step is recalculated with the average of the adaptive deltas at its start and end, so the integrator remains time-reversible
+    # integrators which aren't symplectic (i.e Hermite) only calculate each step once, with the adaptive delta at its start
+    reversible = True
+
+    # number of accelerations calculated by an integration step (the acceleration reused from the last step isn't counted)
+    # overloaded by methods calculating several, and set at each step by those calculating a varying number (i.e BulirschStoer)
+    step_evaluations = 1
+
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 1, delta_lim =10 ** -5, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
         """
         :param nbody: NBody instance which we integrate
         :param steps: the number of steps to integrate for
@@ -15,6 +28,14 @@ class Integrator:
         :param tolerance: allowed absolute error for determining conservation of calculated quantities
         :param adaptive: if True, the Integrator will use an adaptive timestep (instead of a fixed one)
         :param adaptive_constant: constant used when calculating adaptive timestep. Smaller adaptive_constant leads to more accurate orbits.
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
         """
 
         self.nbody = nbody
@@ -31,6 +52,30 @@ class Integrator:
 
         self.store_properties = store_properties
 
+        # compiled kernels perform direct summation, so they can't be used alongside a backend
+        if jit and not jk.jit_available:
+            warnings.warn("numba is not installed, so the integrator uses numpy instead of compiled kernels (jit = False)")
+
+        self.jit = jit and jk.jit_available and nbody.backend is None
+
+        # orbits can be stored in single precision, independently of the NBody (i.e to halve the memory of long trajectories)
+        self.precision = nbody.precision if precision is None else precision
+
+        assert self.precision in nbody.precisions, f"Precision must be one of {list(nbody.precisions)}, but was {self.precision}"
+
+        self.dtype = nbody.precisions[self.precision]
+
+        assert diagnostics is None or diagnostics == "end" or (isinstance(diagnostics, int) and diagnostics >= 1), \
+            f"Diagnostics must be a positive integer, \"end\" or None, but was {diagnostics}"
+
+        self.diagnostics = diagnostics
+
+        # reducers of the quantities of the system, updated at every step (see reducers.py)
+        self.reducers = [] if reducers is None else reducers
+
+        # preallocated arrays reused by every integration step (see Workspace)
+        self.workspace = Workspace()
+
         # creates all arrays used by integrator
         # these hold the positions and velocities of the calculated orbits,
         # alongside the change of quantities which should be conserved if the integrator is symplectic (i.e energy)
@@ -39,6 +84,24 @@ class Integrator:
         # the number of steps that the integrator has been run for
         self.int_step = 1
 
+    @property
+    def position_orbit(self):
+        """
+        :return: a view of shape (n x steps x 3) of the positions of the calculated orbit, so position_orbit[i] is the orbit of body i
+                 (the transpose of position_steps, without copying it)
+        """
+
+        return self.position_steps.transpose(1, 0, 2)
+
+    @property
+    def velocity_orbit(self):
+        """
+        :return: a view of shape (n x steps x 3) of the velocities of the calculated orbit, so velocity_orbit[i] is the orbit of body i
+                 (the transpose of velocity_steps, without copying it)
+        """
+
+        return self.velocity_steps.transpose(1, 0, 2)
+
     def integration_step(self, t, delta):
         """
         Overloaded method, dependent on the integration scheme utilised.
@@ -51,6 +114,17 @@ class Integrator:
 
         return None, None, None
 
+    def get_adaptive_delta(self, positions, velocities):
+        """
+        Calculates the adaptive timestep for a system (see NBody.get_variable_delta).
+        Overloaded by integrators with their own timestep criterion (i.e Hermite).
+        :param positions: the positions of the bodies
+        :param velocities: the velocities of the bodies
+        :return: the adaptive timestep
+        """
+
+        return self.nbody.get_variable_delta(positions, velocities, adaptive_constant = self.adaptive_constant, delta_lim = self.delta_lim)
+
     def simulation_step(self, t):
         """
         For a given step, calculates the new positions and velocities via the integration step.
@@ -66,18 +140,24 @@ class Integrator:
                                    f"Expected Step to Integrate: {self.int_step}\n"
 
         new_positions, new_velocities, acc_tt = self.integration_step(t, self.delta)
+        self.force_evaluations += self.step_evaluations
 
         # calculate adaptive delta by using a time-reversible delta
-        if self.adaptive:
+        if self.adaptive and self.reversible:
             # average of adaptive delta at time t and t+1
-            reversible_delta = 0.5 * (self.delta + nm.variable_delta(new_positions, new_velocities, adaptive_constant= self.adaptive_constant, delta_lim = self.delta_lim))
+            reversible_delta = 0.5 * (self.delta + self.get_adaptive_delta(new_positions, new_velocities))
 
             # use reversible delta at time t again to calculate new positions and velocities
             # this ensures that when using adaptive delta, the integrator remains symplectic
             new_positions, new_velocities, acc_tt = self.integration_step(t, delta=reversible_delta)
+            self.force_evaluations += self.step_evaluations
 
             # recalculate adaptive timestep
-            self.delta = nm.variable_delta(new_positions, new_velocities, adaptive_constant= self.adaptive_constant, delta_lim = self.delta_lim)
+            self.delta = self.get_adaptive_delta(new_positions, new_velocities)
+
+        # otherwise, the adaptive delta for the next step is calculated once the step is made
+        elif self.adaptive:
+            self.delta = self.get_adaptive_delta(new_positions, new_velocities)
 
         self.update_simulation(t, new_positions, new_velocities, symplectic=True)
 
@@ -102,6 +182,26 @@ class Integrator:
         if self.adaptive:
             self.historic_delta[t] = self.delta
 
+    def get_quantity(self, quantity):
+        """
+        Provides the current value of a quantity of the system, for the reducers
+        :param quantity: the name of the quantity (an attribute of NBody, or "delta" for the timestep of the integrator)
+        :return: the value of the quantity
+        """
+
+        if quantity == "delta":
+            return self.delta
+
+        return getattr(self.nbody, quantity)
+
+    def update_reducers(self):
+        """
+        Updates every reducer with the current value of its quantity
+        """
+
+        for reducer in self.reducers:
+            reducer.update(self.get_quantity(reducer.quantity))
+
     def update_simulation(self, t, new_positions, new_velocities, symplectic):
         """
         Given newly calculated positions and velocities, updates NBody, alongside historic arrays
@@ -112,16 +212,24 @@ class Integrator:
                            checks that energy,angular momentum.etc... are conserved after the update
         """
 
+        # the quantities of the system are only calculated (and checked for conservation) at the steps given by the diagnostics policy
+        diagnose = isinstance(self.diagnostics, int) and t % self.diagnostics == 0
+
         # update the simulation with the calculated position and velocities
-        self.nbody.update(new_positions, new_velocities, symplectic=symplectic, tolerance=self.tolerance)
+        self.nbody.update(new_positions, new_velocities, symplectic=symplectic, tolerance=self.tolerance, jit = self.jit, diagnose = diagnose)
 
         # add the newly calculated energies and angular momentum (and adaptive delta) to the historic arrays
         if self.store_properties:
             self.update_historic(t)
 
-        # set the newly calculated positions and velocities to the orbit arrays
-        self.position_orbit[:, t, :] = new_positions
-        self.velocity_orbit[:, t, :] = new_velocities
+        # reduce the newly calculated quantities, without storing them
+        if self.reducers:
+            self.update_reducers()
+
+        # set the newly calculated positions and velocities to the orbit arrays (a single contiguous block per step)
+        # for integrators which write them directly into the orbit arrays (i.e Leapfrog3), numpy skips the copy
+        self.position_steps[t] = new_positions
+        self.velocity_steps[t] = new_velocities
 
         # increment the int_step to ensure that integration_step is performed on continuous steps
         self.int_step = t + 1
@@ -151,8 +259,8 @@ class Integrator:
                     self.full_run = True
 
                 self.steps = len(self.times)
-                self.position_orbit = self.position_orbit[:, :self.steps,:]
-                self.velocity_orbit = self.velocity_orbit[:, :self.steps, :]
+                self.position_steps = self.position_steps[:self.steps]
+                self.velocity_steps = self.velocity_steps[:self.steps]
 
                 if self.store_properties:
                     self.historic_energy = self.historic_energy[:self.steps]
@@ -165,6 +273,10 @@ class Integrator:
                 while self.int_step < self.steps:
                     self.simulation_step(self.int_step)
 
+            # check: quantities of the system conserved once the orbits are calculated
+            if self.diagnostics == "end":
+                self.nbody.check_conservation(tolerance = self.tolerance)
+
             # update flag
             self.integrated = True
 
@@ -205,19 +317,20 @@ class Integrator:
         if self.adaptive:
             self.target_time = self.steps * self.delta
             self.steps = 10**5
-            self.delta = nm.variable_delta(self.nbody.positions, self.nbody.velocities, adaptive_constant=self.adaptive_constant, delta_lim = self.delta_lim)
-            self.historic_delta = np.zeros(self.steps)
-            self.historic_delta[0] = self.delta
+            self.delta = self.get_adaptive_delta(self.nbody.positions, self.nbody.velocities)
             self.times = [0]
             self.full_run = False
 
-        # tensor of shape (n x steps x 3), containing the positions of the n bodies throughout the calculated orbit
-        self.position_orbit = np.zeros((self.nbody.n, self.steps, 3))
-        self.position_orbit[:, 0, :] = self.nbody.positions
+        # contiguous tensor of shape (steps x n x 3), containing the positions of the n bodies at each step of the calculated orbit
+        # (so each step is written as a single contiguous block, and truncating the steps doesn't copy)
+        # planar systems only store the x and y components, as a tensor of shape (steps x n x 2)
+        # the tracers of the NBody (if any) are integrated alongside the massive bodies, as the rows following them
+        self.position_steps = np.zeros((self.steps, self.nbody.n + self.nbody.n_tracers, self.nbody.dims), dtype = self.dtype)
+        self.position_steps[0] = self.nbody.all_positions
 
-        # tensor of shape (n x steps x 3), containing the velocities of the n bodies throughout the calculated orbit
-        self.velocity_orbit = np.zeros((self.nbody.n, self.steps, 3))
-        self.velocity_orbit[:, 0, :] = self.nbody.velocities
+        # contiguous tensor of shape (steps x n x 3), containing the velocities of the n bodies at each step of the calculated orbit
+        self.velocity_steps = np.zeros((self.steps, self.nbody.n + self.nbody.n_tracers, self.nbody.dims), dtype = self.dtype)
+        self.velocity_steps[0] = self.nbody.all_velocities
 
         # save constants (energies, angular momentum) across time (for plotting purposes)
         if self.store_properties:
@@ -230,5 +343,19 @@ class Integrator:
             self.historic_angular_momentum = np.zeros(shape=(self.steps, 3))
             self.historic_angular_momentum[0] = self.nbody.total_angular_momentum
 
+            # the adaptive timestep is only stored alongside the other properties
+            if self.adaptive:
+                self.historic_delta = np.zeros(self.steps)
+                self.historic_delta[0] = self.delta
+
+        # number of accelerations calculated by the integration steps, to compare the cost of integrators
+        self.force_evaluations = 0
+
+        # reducers start from the initial values of their quantities (so they are cleared when the integrator is run again)
+        for reducer in self.reducers:
+            reducer.reset()
+
+        self.update_reducers()
+
         # reset flag (this method is used when the integrator is going to be run)
         self.integrated = False
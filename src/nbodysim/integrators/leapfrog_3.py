@@ -2,12 +2,13 @@ import numpy as np
 
 from nbodysim.integrators.integrator import Integrator
 from nbodysim import nmath as nm
+from nbodysim import jit_kernels as jk
 
 class Leapfrog3(Integrator):
     """
     Class defining an integrator via the 3-Step Leapfrog 2-Step Method
     """
-    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 1, delta_lim =10 ** -5, store_properties = False):
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 1, delta_lim =10 ** -5, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
         """
         :param nbody: NBody instance which we integrate
         :param steps: the number of steps to integrate for
@@ -15,14 +16,22 @@ class Leapfrog3(Integrator):
         :param tolerance: allowed absolute error for determining conservation of calculated quantities
         :param adaptive: if True, the Integrator will use an adaptive timestep (instead of a fixed one)
         :param adaptive_constant: constant used when calculating adaptive timestep. Smaller adaptive_constant leads to more accurate orbits.
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
         """
 
         # execute initialisation from superclass
-        super().__init__(nbody, steps, delta, tolerance = tolerance, adaptive = adaptive, adaptive_constant= adaptive_constant, delta_lim = delta_lim, store_properties = store_properties)
+        super().__init__(nbody, steps, delta, tolerance = tolerance, adaptive = adaptive, adaptive_constant= adaptive_constant, delta_lim = delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
 
         # save acceleration for next iteration.
         # Only require 1 expensive acceleration calculation per step
-        self.acc_t = self.nbody.get_acceleration()
+        self.acc_t = self.nbody.get_acceleration(jit = self.jit)
 
     def integration_step(self, t, delta):
         """
@@ -34,9 +43,42 @@ class Leapfrog3(Integrator):
         :return the new positions and velocities, alongside the acceleration for step t+1
         """
 
-        new_half_velocities = self.velocity_orbit[:, t - 1, :] + self.acc_t * delta * 0.5
-        new_positions = self.position_orbit[:, t - 1, :] + new_half_velocities * delta
-        acc_tt = self.nbody.get_acceleration(positions=new_positions)
-        new_velocities = new_half_velocities + acc_tt * delta * 0.5
+        # the results are written directly into the orbit arrays at step t, and intermediate quantities into preallocated arrays,
+        # so no temporary arrays are created in steady state
+        new_positions = self.position_steps[t]
+        new_velocities = self.velocity_steps[t]
+        half_velocities = self.workspace.get("half_velocities", new_positions.shape)
 
-        return new_positions, new_velocities, acc_tt
\ No newline at end of file
+        # accelerations alternate between 2 preallocated matrices, so acc_t isn't overwritten by acc_tt
+        new_acceleration = self.workspace.get("acceleration_0", new_positions.shape)
+
+        if new_acceleration is self.acc_t:
+            new_acceleration = self.workspace.get("acceleration_1", new_positions.shape)
+
+        # the whole step is performed by a single compiled kernel (which only integrates massive bodies, so not with tracers)
+        if self.jit and self.nbody.n_tracers == 0:
+            min_distance = jk.leapfrog3_step(self.position_steps[t - 1], self.velocity_steps[t - 1], self.acc_t, self.nbody.masses,
+                                             delta, self.nbody.G, new_positions, new_velocities, new_acceleration, half_velocities)
+            self.nbody.check_collision(min_distance, new_positions)
+
+            return new_positions, new_velocities, new_acceleration
+
+        kick = self.workspace.get("kick", new_positions.shape)
+
+        # v_{t + 1/2} = v_t + 0.5*a_t*Δt
+        np.multiply(self.acc_t, delta, out = kick)
+        np.multiply(kick, 0.5, out = kick)
+        np.add(self.velocity_steps[t - 1], kick, out = half_velocities)
+
+        # x_{t + 1} = x_t + v_{t + 1/2}*Δt
+        np.multiply(half_velocities, delta, out = kick)
+        np.add(self.position_steps[t - 1], kick, out = new_positions)
+
+        acc_tt = self.nbody.get_acceleration(positions = new_positions, jit = self.jit, out = new_acceleration)
+
+        # v_{t + 1} = v_{t + 1/2} + 0.5*a_{t + 1}*Δt
+        np.multiply(acc_tt, delta, out = kick)
+        np.multiply(kick, 0.5, out = kick)
+        np.add(half_velocities, kick, out = new_velocities)
+
+        return new_positions, new_velocities, acc_tt
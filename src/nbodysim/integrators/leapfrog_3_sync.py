@@ -1,13 +1,13 @@
 import warnings
 
-from nbodysim.integrator import Integrator
+from nbodysim.integrators.integrator import Integrator
 from nbodysim import nmath as nm
 
 class Leapfrog2Int(Integrator):
     """
     Class defining an integrator via the Integer 3-Step Leapfrog 2-Step Method
     """
-    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 1, delta_lim =10 ** -5, store_properties = False):
+    def __init__(self, nbody, steps, delta, tolerance = 1e-6, adaptive = False, adaptive_constant = 1, delta_lim =10 ** -5, store_properties = False, jit = False, precision = None, diagnostics = 1, reducers = None):
         """
         :param nbody: NBody instance which we integrate
         :param steps: the number of steps to integrate for
@@ -15,6 +15,14 @@ class Leapfrog2Int(Integrator):
         :param tolerance: allowed absolute error for determining conservation of calculated quantities
         :param adaptive: if True, the Integrator will use an adaptive timestep (instead of a fixed one)
         :param adaptive_constant: constant used when calculating adaptive timestep. Smaller adaptive_constant leads to more accurate orbits.
+        :param jit: if True, the integrator uses kernels compiled with numba (see jit_kernels), which are faster for small systems.
+                    Falls back to numpy if numba isn't installed, or if the NBody uses a backend.
+        :param precision: precision of the orbit arrays ("double" for float64, "mixed" for float32, see NBody). If None, uses the precision of the NBody
+        :param diagnostics: how often the quantities of the system (momenta and energies) are calculated and checked for conservation:
+                            every k steps for an integer k (1 for every step), "end" for only once the orbits are calculated, or None for never.
+                            Collisions and escapes are checked at every step, and stored properties are calculated at every step.
+        :param reducers: a list of reducers (see reducers.py), updated with the quantities of the system at every step in O(1) memory,
+                         as an alternative to the historic arrays of store_properties (i.e to only keep the maximum energy error)
         """
 
         if adaptive:
@@ -23,11 +31,11 @@ class Leapfrog2Int(Integrator):
             adaptive = False
 
         # execute initialisation from superclass
-        super().__init__(nbody, steps, delta, tolerance = tolerance, adaptive = adaptive, adaptive_constant= adaptive_constant, delta_lim= delta_lim, store_properties = store_properties)
+        super().__init__(nbody, steps, delta, tolerance = tolerance, adaptive = adaptive, adaptive_constant= adaptive_constant, delta_lim= delta_lim, store_properties = store_properties, jit = jit, precision = precision, diagnostics = diagnostics, reducers = reducers)
 
         # save acceleration for next iteration.
         # Only require 1 expensive acceleration calculation per step
-        self.acc_t = self.nbody.get_acceleration()
+        self.acc_t = self.nbody.get_acceleration(jit = self.jit)
 
     def integration_step(self, t, delta):
         """
@@ -38,11 +46,11 @@ class Leapfrog2Int(Integrator):
         """
 
         # perform Integer 3-Step Leapfrog step
-        new_positions = self.position_orbit[:, t - 1, :] \
-                        + delta * self.velocity_orbit[:, t - 1, :] \
+        new_positions = self.position_steps[t - 1] \
+                        + delta * self.velocity_steps[t - 1] \
                         + 0.5 * self.acc_t * delta**2
-        acc_tt = self.nbody.get_acceleration(positions = new_positions)
-        new_velocities = self.velocity_orbit[:, t - 1, :] \
+        acc_tt = self.nbody.get_acceleration(positions = new_positions, jit = self.jit)
+        new_velocities = self.velocity_steps[t - 1] \
                          + 0.5 * (self.acc_t + acc_tt) * delta
 
         return new_positions, new_velocities, acc_tt
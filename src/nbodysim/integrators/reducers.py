@@ -0,0 +1,209 @@
+import numpy as np
+
+class Reducer:
+    """
+    Class defining an online reduction of a quantity of the simulation (i.e the energy) across the steps of an integrator,
+    acting as a "superclass" for the different reductions.
+    Reducers are updated at every step in O(1) memory (except Sample), as an alternative to the historic arrays of store_properties.
+    """
+
+    def __init__(self, quantity, error = None):
+        """
+        :param quantity: the name of the quantity to reduce: an attribute of NBody (i.e "energy", "kinetic_energy", "gpe",
+                         "total_angular_momentum" or "total_linear_momentum"), or "delta" for the timestep of the integrator
+        :param error: if None, the values of the quantity are reduced.
+                      If "absolute", its difference from the initial value (value - initial) is reduced instead.
+                      If "relative", the difference is divided by the magnitude of the initial value (or left as is, if it's zero).
+        """
+
+        assert error in [None, "absolute", "relative"], f"Error must be None, \"absolute\" or \"relative\", but was {error}"
+
+        self.quantity = quantity
+        self.error = error
+
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the reduction (i.e when the integrator is run again)
+        """
+
+        # initial and last values of the quantity, alongside the number of values reduced
+        self.initial = None
+        self.last = None
+        self.count = 0
+
+    def update(self, value):
+        """
+        Adds the value of the quantity at a new step (the first value is that of the initial system)
+        :param value: the value of the quantity (a scalar, or a vector)
+        """
+
+        value = np.array(value, dtype = np.float64)
+
+        if self.initial is None:
+            self.initial = value
+
+        self.last = value
+        self.count += 1
+
+        self.reduce(self.get_error(value))
+
+    def get_error(self, value):
+        """
+        Transforms a value of the quantity as specified by error (see __init__)
+        :param value: the value of the quantity
+        :return: the value, or its (absolute or relative) difference from the initial value
+        """
+
+        if self.error is None:
+            return value
+
+        if self.error == "absolute":
+            return value - self.initial
+
+        # quantities which are initially zero (i.e the total linear momentum about the centre of mass) have no relative error,
+        # so their absolute error is used instead
+        norm = np.sqrt(np.sum(np.square(self.initial)))
+
+        return (value - self.initial) / norm if norm > 0 else value - self.initial
+
+    def reduce(self, value):
+        """
+        Overloaded method, dependent on the reduction.
+        :param value: the (transformed) value of the quantity at a new step
+        """
+
+        pass
+
+    def get_result(self):
+        """
+        Overloaded method, dependent on the reduction.
+        :return: the result of the reduction (the last value of the quantity, for reductions which don't define one)
+        """
+
+        return self.last
+
+class MaxAbs(Reducer):
+    """
+    Class defining the maximum absolute value of a quantity (over its components), i.e the maximum relative energy error with error = "relative"
+    """
+
+    def reset(self):
+        super().reset()
+        self.max = 0.0
+
+    def reduce(self, value):
+        """
+        Updates the maximum with a new value
+        """
+
+        self.max = max(self.max, np.max(np.abs(value)))
+
+    def get_result(self):
+        """
+        :return: the maximum absolute value
+        """
+
+        return self.max
+
+class Moments(Reducer):
+    """
+    Class defining the running mean and variance of a quantity (per component), via Welford's algorithm,
+    alongside its root mean square (i.e the RMS drift of the energy with error = "absolute")
+    """
+
+    def reset(self):
+        super().reset()
+        self.mean = 0.0
+        self.squared_deviations = 0.0
+        self.mean_square = 0.0
+
+    def reduce(self, value):
+        """
+        Updates the mean, variance and mean square with a new value
+        """
+
+        # Welford's update is numerically stable, unlike accumulating the sum and sum of squares
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.squared_deviations = self.squared_deviations + delta * (value - self.mean)
+        self.mean_square = self.mean_square + (value**2 - self.mean_square) / self.count
+
+    def get_result(self):
+        """
+        :return: a dictionary with the "mean", (population) "variance" and "rms" of the quantity
+        """
+
+        return {"mean": self.mean, "variance": self.squared_deviations / max(self.count, 1), "rms": np.sqrt(self.mean_square)}
+
+class Histogram(Reducer):
+    """
+    Class defining a histogram of a scalar quantity, over fixed bins
+    """
+
+    def __init__(self, quantity, bins, error = None):
+        """
+        :param quantity: the name of the quantity (see Reducer)
+        :param bins: an increasing array with the edges of the bins
+        :param error: if the values, or their difference from the initial value, are counted (see Reducer)
+        """
+
+        self.bins = np.asarray(bins, dtype = np.float64)
+
+        super().__init__(quantity, error = error)
+
+    def reset(self):
+        super().reset()
+
+        # counts of values below the first edge, within each bin, and above the last edge
+        self.counts = np.zeros(len(self.bins) + 1, dtype = np.int64)
+
+    def reduce(self, value):
+        """
+        Counts a new value within its bin
+        """
+
+        self.counts[np.searchsorted(self.bins, value, side = "right")] += 1
+
+    def get_result(self):
+        """
+        :return: an array with the number of values below the first edge, within each bin, and above the last edge
+        """
+
+        return self.counts
+
+class Sample(Reducer):
+    """
+    Class defining a sample of a quantity, every k steps (so it uses O(steps/k) memory)
+    """
+
+    def __init__(self, quantity, every, error = None):
+        """
+        :param quantity: the name of the quantity (see Reducer)
+        :param every: the number of steps between samples (the initial value is always sampled)
+        :param error: if the values, or their difference from the initial value, are sampled (see Reducer)
+        """
+
+        self.every = every
+
+        super().__init__(quantity, error = error)
+
+    def reset(self):
+        super().reset()
+        self.samples = []
+
+    def reduce(self, value):
+        """
+        Keeps a new value if it falls on a sampled step
+        """
+
+        if (self.count - 1) % self.every == 0:
+            self.samples.append(value)
+
+    def get_result(self):
+        """
+        :return: an array with the sampled values, at steps 0, k, 2k...
+        """
+
+        return np.array(self.samples)
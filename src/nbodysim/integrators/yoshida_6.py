@@ -0,0 +1,15 @@
+from nbodysim.integrators.composition import Composition
+
+class Yoshida6(Composition):
+    """
+    Class defining an integrator via the 6th order Yoshida method (Yoshida, 1990, solution A).
+    A step is a symmetric composition of 7 Leapfrog steps, requiring 7 accelerations.
+    """
+
+    # weights of the Leapfrog steps (w_3, w_2, w_1, w_0, w_1, w_2, w_3), with w_0 = 1 - 2(w_1 + w_2 + w_3)
+    weights = (0.784513610477560, 0.235573213359357, -1.17767998417887)
+    weights = weights + (1 - 2 * sum(weights),) + weights[::-1]
+
+    # consecutive Leapfrog steps share their half kicks
+    kicks = (weights[0] / 2,) + tuple((first + second) / 2 for first, second in zip(weights[:-1], weights[1:])) + (weights[-1] / 2,)
+    drifts = weights
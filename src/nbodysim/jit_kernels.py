@@ -0,0 +1,304 @@
+import numpy as np
+
+# numba is an optional dependency: if it isn't installed, integrators use the pure numpy implementation instead
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Helper file containing kernels compiled just in time (JIT) via numba, for integrators with jit = True
+# For small systems (i.e the Figure of 8), the overhead of every small numpy operation dominates the cost of a step,
+# so each kernel performs a whole stage of a step (force, integration step or diagnostics) within a single compiled call
+
+# True if numba is installed, so that the kernels can be compiled
+jit_available = njit is not None
+
+def compile_kernel(kernel):
+    """
+    Compiles a kernel with numba (the first time it is called, for each type of its arguments)
+    :param kernel: function to compile
+    :return: the compiled function, or the function itself if numba isn't installed
+    """
+
+    if not jit_available:
+        return kernel
+
+    return njit(kernel)
+
+@compile_kernel
+def direct_acceleration(positions, masses, G, acceleration):
+    """
+    Calculates the acceleration of every body by direct summation over every distinct pair of bodies
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param masses: an array with the mass of each body
+    :param G: constant of gravitation
+    :param acceleration: an (n x d) matrix of float64, into which the accelerations are written (its values are overwritten)
+    :return: a tuple, with the (n x d) matrix of accelerations and the minimum distance between any 2 bodies
+    """
+
+    n, dims = positions.shape
+    acceleration[:, :] = 0.0
+    separation = np.zeros(dims)
+    min_distance = np.inf
+
+    for i in range(n):
+        for j in range(i):
+            squared_distance = 0.0
+
+            # positions may be stored in single precision, but forces are accumulated in double precision
+            for axis in range(dims):
+                separation[axis] = np.float64(positions[j, axis]) - positions[i, axis]
+                squared_distance += separation[axis] * separation[axis]
+
+            distance = np.sqrt(squared_distance)
+
+            min_distance = min(min_distance, distance)
+
+            # bodies at the same position exert no force on each other
+            if squared_distance == 0:
+                continue
+
+            inv_dist_mag3 = G / (squared_distance * distance)
+
+            # by Newton's third law, j feels the same force as i, albeit in the opposite direction
+            for axis in range(dims):
+                acceleration[i, axis] += masses[j] * inv_dist_mag3 * separation[axis]
+                acceleration[j, axis] -= masses[i] * inv_dist_mag3 * separation[axis]
+
+    return acceleration, min_distance
+
+@compile_kernel
+def direct_interactions(positions, velocities, masses, G, acceleration):
+    """
+    Calculates the interactions between every distinct pair of bodies in a single fused loop (see nm.tiled_interactions)
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param velocities: an (n x d) matrix with the velocities of the bodies.
+                       If it has no rows, the minimum ratio |dx|/|dv| isn't calculated (and is infinity)
+    :param masses: an array with the mass of each body
+    :param G: constant of gravitation
+    :param acceleration: if False, the accelerations aren't calculated (and are 0)
+    :return: a tuple, with the (n x d) matrix of accelerations, the GPE of the system, the minimum distance between any 2 bodies,
+             and the minimum ratio |dx|/|dv| between any 2 bodies with different velocities
+    """
+
+    n, dims = positions.shape
+    total_acceleration = np.zeros((n, dims))
+    separation = np.zeros(dims)
+    ratios = velocities.shape[0] > 0
+    gpe = 0.0
+    min_distance = np.inf
+    min_ratio = np.inf
+
+    for i in range(n):
+        for j in range(i):
+            squared_distance = 0.0
+
+            for axis in range(dims):
+                separation[axis] = np.float64(positions[j, axis]) - positions[i, axis]
+                squared_distance += separation[axis] * separation[axis]
+
+            distance = np.sqrt(squared_distance)
+            min_distance = min(min_distance, distance)
+
+            if ratios:
+                squared_velocity = 0.0
+
+                for axis in range(dims):
+                    squared_velocity += (np.float64(velocities[j, axis]) - velocities[i, axis])**2
+
+                # bodies moving with the same velocity never approach each other, so they don't restrict the timestep
+                if squared_velocity != 0:
+                    min_ratio = min(min_ratio, distance / np.sqrt(squared_velocity))
+
+            # bodies at the same position exert no force on each other (nor have any potential energy)
+            if squared_distance == 0:
+                continue
+
+            gpe -= G * masses[i] * masses[j] / distance
+
+            if not acceleration:
+                continue
+
+            inv_dist_mag3 = G / (squared_distance * distance)
+
+            for axis in range(dims):
+                total_acceleration[i, axis] += masses[j] * inv_dist_mag3 * separation[axis]
+                total_acceleration[j, axis] -= masses[i] * inv_dist_mag3 * separation[axis]
+
+    return total_acceleration, gpe, min_distance, min_ratio
+
+@compile_kernel
+def direct_acceleration_jerk(positions, velocities, masses, G, acceleration, jerk):
+    """
+    Calculates the acceleration and jerk (time derivative of the acceleration) of every body in a single pass over every distinct pair of bodies
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param velocities: an (n x d) matrix with the velocities of the bodies
+    :param masses: an array with the mass of each body
+    :param G: constant of gravitation
+    :param acceleration: an (n x d) matrix of float64, into which the accelerations are written (its values are overwritten)
+    :param jerk: an (n x d) matrix of float64, into which the jerks are written (its values are overwritten)
+    :return: a tuple, with the (n x d) matrices of accelerations and jerks, and the minimum distance between any 2 bodies
+    """
+
+    n, dims = positions.shape
+    acceleration[:, :] = 0.0
+    jerk[:, :] = 0.0
+    separation = np.zeros(dims)
+    velocity_difference = np.zeros(dims)
+    min_distance = np.inf
+
+    for i in range(n):
+        for j in range(i):
+            squared_distance = 0.0
+            radial_velocity = 0.0
+
+            # positions and velocities may be stored in single precision, but forces are accumulated in double precision
+            for axis in range(dims):
+                separation[axis] = np.float64(positions[j, axis]) - positions[i, axis]
+                velocity_difference[axis] = np.float64(velocities[j, axis]) - velocities[i, axis]
+                squared_distance += separation[axis] * separation[axis]
+                radial_velocity += separation[axis] * velocity_difference[axis]
+
+            distance = np.sqrt(squared_distance)
+
+            min_distance = min(min_distance, distance)
+
+            # bodies at the same position exert no force on each other
+            if squared_distance == 0:
+                continue
+
+            inv_dist_mag3 = G / (squared_distance * distance)
+            radial_velocity = 3 * radial_velocity / squared_distance
+
+            # by Newton's third law, j feels the same force (and its derivative) as i, albeit in the opposite direction
+            for axis in range(dims):
+                pair_jerk = inv_dist_mag3 * (velocity_difference[axis] - radial_velocity * separation[axis])
+                acceleration[i, axis] += masses[j] * inv_dist_mag3 * separation[axis]
+                acceleration[j, axis] -= masses[i] * inv_dist_mag3 * separation[axis]
+                jerk[i, axis] += masses[j] * pair_jerk
+                jerk[j, axis] -= masses[i] * pair_jerk
+
+    return acceleration, jerk, min_distance
+
+@compile_kernel
+def leapfrog3_step(positions, velocities, acceleration, masses, delta, G, new_positions, new_velocities, new_acceleration, half_velocities):
+    """
+    Integration step for the 3-Step Leapfrog method (kick, drift, force & kick)
+    Results are written into preallocated matrices (i.e the slots of the orbit arrays), so the step allocates no memory.
+    :param positions: an (n x d) matrix with the positions of the bodies at step t
+    :param velocities: an (n x d) matrix with the velocities of the bodies at step t
+    :param acceleration: an (n x d) matrix with the accelerations of the bodies at step t
+    :param masses: an array with the mass of each body
+    :param delta: the timestep
+    :param G: constant of gravitation
+    :param new_positions: an (n x d) matrix, into which the positions for step t+1 are written
+    :param new_velocities: an (n x d) matrix, into which the velocities for step t+1 are written
+    :param new_acceleration: an (n x d) matrix of float64, into which the accelerations for step t+1 are written
+    :param half_velocities: an (n x d) matrix of float64, used for the velocities at step t+1/2
+    :return: the minimum distance between any 2 bodies
+    """
+
+    n, dims = positions.shape
+
+    for i in range(n):
+        for axis in range(dims):
+            half_velocities[i, axis] = velocities[i, axis] + acceleration[i, axis] * delta * 0.5
+            new_positions[i, axis] = positions[i, axis] + half_velocities[i, axis] * delta
+
+    min_distance = direct_acceleration(new_positions, masses, G, new_acceleration)[1]
+
+    for i in range(n):
+        for axis in range(dims):
+            new_velocities[i, axis] = half_velocities[i, axis] + new_acceleration[i, axis] * delta * 0.5
+
+    return min_distance
+
+@compile_kernel
+def diagnostics(positions, velocities, masses, G, linear_momentum, angular_momentum, total_linear_momentum, total_angular_momentum, com):
+    """
+    Calculates every quantity used by NBody to check the conservation of the system after an update
+    Vector quantities are written into preallocated arrays of float64 (their values are overwritten), so no memory is allocated.
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param velocities: an (n x d) matrix with the velocities of the bodies
+    :param masses: an array with the mass of each body
+    :param G: constant of gravitation
+    :param linear_momentum: an (n x d) matrix, into which the linear momentum of each body is written
+    :param angular_momentum: an (n x 3) matrix, into which the angular momentum of each body is written
+    :param total_linear_momentum: a d-vector, into which the total linear momentum is written
+    :param total_angular_momentum: a 3-vector, into which the total angular momentum is written
+    :param com: a d-vector, into which the COM is written
+    :return: a tuple with the kinetic energy, the GPE and the minimum distance between any 2 bodies
+    """
+
+    n, dims = positions.shape
+    angular_momentum[:, :] = 0.0
+    total_linear_momentum[:] = 0.0
+    total_angular_momentum[:] = 0.0
+    com[:] = 0.0
+    kinetic_energy = 0.0
+    total_mass = 0.0
+
+    for i in range(n):
+        squared_momentum = 0.0
+
+        for axis in range(dims):
+            linear_momentum[i, axis] = np.float64(masses[i]) * velocities[i, axis]
+            squared_momentum += linear_momentum[i, axis]**2
+
+        # planar bodies only have angular momentum along the z axis
+        if dims == 3:
+            angular_momentum[i, 0] = positions[i, 1] * linear_momentum[i, 2] - positions[i, 2] * linear_momentum[i, 1]
+            angular_momentum[i, 1] = positions[i, 2] * linear_momentum[i, 0] - positions[i, 0] * linear_momentum[i, 2]
+        angular_momentum[i, 2] = positions[i, 0] * linear_momentum[i, 1] - positions[i, 1] * linear_momentum[i, 0]
+
+        for axis in range(dims):
+            total_linear_momentum[axis] += linear_momentum[i, axis]
+            com[axis] += np.float64(masses[i]) * positions[i, axis]
+
+        for axis in range(3):
+            total_angular_momentum[axis] += angular_momentum[i, axis]
+
+        kinetic_energy += squared_momentum / (2 * masses[i])
+        total_mass += masses[i]
+
+    gpe = 0.0
+    min_distance = np.inf
+
+    for i in range(n):
+        for j in range(i):
+            squared_distance = 0.0
+
+            for axis in range(dims):
+                squared_distance += (np.float64(positions[j, axis]) - positions[i, axis])**2
+
+            distance = np.sqrt(squared_distance)
+
+            min_distance = min(min_distance, distance)
+
+            # bodies at the same position have no potential energy (see direct_interactions)
+            if squared_distance != 0:
+                gpe -= G * masses[i] * masses[j] / distance
+
+    for axis in range(dims):
+        com[axis] /= total_mass
+
+    return kinetic_energy, gpe, min_distance
+
+@compile_kernel
+def conserved(com, com_tolerance, total_linear_momentum, first_linear_momentum, total_angular_momentum, first_angular_momentum,
+              energy, first_energy, tolerance):
+    """
+    Checks every conservation condition of NBody.update at once (see NBody.conserved_quantity)
+    :return: True if the COM is within com_tolerance of the origin, and the total linear momentum, total angular momentum
+             and energy are within tolerance of their initial values
+    """
+
+    for axis in range(len(com)):
+        if abs(com[axis]) > com_tolerance or not abs(total_linear_momentum[axis] - first_linear_momentum[axis]) < tolerance:
+            return False
+
+    for axis in range(3):
+        if not abs(total_angular_momentum[axis] - first_angular_momentum[axis]) < tolerance:
+            return False
+
+    return abs(energy - first_energy) < tolerance
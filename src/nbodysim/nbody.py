@@ -3,13 +3,65 @@ from copy import deepcopy
 import numpy as np
 
 from nbodysim import nmath as nm
+from nbodysim import jit_kernels as jk
+from nbodysim.backends import registry
+from nbodysim.collisions import CollisionGrid
+from nbodysim.workspace import Workspace
 from nbodysim.exceptions import *
 
+class DerivedQuantity:
+    """
+    Descriptor of a quantity derived from the state of an NBody (i.e its energy), which is only calculated when first accessed.
+    Values are stored in the derived dictionary of the NBody, which is cleared whenever its state changes.
+    """
+
+    def __init__(self, calculate):
+        """
+        :param calculate: function calculating the quantity for an NBody. Functions calculating several quantities at once
+                          (i.e NBody.get_energy, which also sets the kinetic energy and GPE) may set them directly.
+        """
+
+        self.calculate = calculate
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, nbody, owner = None):
+        if nbody is None:
+            return self
+
+        if self.name not in nbody.derived:
+            value = self.calculate(nbody)
+            nbody.derived.setdefault(self.name, value)
+
+        return nbody.derived[self.name]
+
+    def __set__(self, nbody, value):
+        nbody.derived[self.name] = value
+
 class NBody:
     """
     Class used to simulate the n-body problem.
+    The masses, positions and velocities of the bodies (and tracers) are stored in a single contiguous buffer (see set_state),
+    which is all that is copied or pickled alongside the parameters of the simulation. Every other quantity is recalculated when required.
     """
-    def __init__(self, init_positions, init_velocities, masses, collision_tolerance = 10e-4, escape_tolerance = -1):
+
+    # parameters of the simulation which are pickled alongside its state (see __reduce__)
+    parameters = ("n", "n_tracers", "planar", "dims", "G", "collision_tolerance", "collision_skin", "backend", "memory", "workers", "precision",
+                  "escape_tolerance", "com", "first_energy", "first_angular_momentum", "first_linear_momentum", "tracer_collided", "tracer_escaped")
+
+    # every attribute is declared, so instances don't carry a dictionary
+    __slots__ = parameters + ("dtype", "collision_grid", "total_mass", "stacked_masses", "state", "state_masses", "state_positions", "state_velocities",
+                              "derived", "workspace", "last_positions", "last_velocities", "last_G", "last_interactions",
+                              "last_tracer_positions", "last_massive_positions", "last_tracer_interactions")
+
+    # data type used to store the positions and velocities of the bodies, for each precision
+    # in "mixed" precision, state is stored in single precision, whilst forces and energies are accumulated in double precision
+    precisions = {"double": np.float64, "mixed": np.float32}
+
+    def __init__(self, init_positions, init_velocities, masses, collision_tolerance = 10e-4, escape_tolerance = -1, backend = None, memory = 2**26, workers = 1, precision = "double", planar = False, collision_skin = None,
+                 tracer_positions = None, tracer_velocities = None):
         """
         :param init_positions: Python list or numpy array of position vectors for the bodies
         :param init_velocities: Python list or numpy array of velocity vectors for the bodies
@@ -19,41 +71,129 @@ class NBody:
         :param escape_tolerance: maximum distance away from the centre of mass (COM) allowed before ending simulation
                                  If None, escape_tolerance is automatically calculated
                                  If -1, escape_tolerance is not considered
+        :param backend: Backend instance (from nbodysim.backends) used to calculate accelerations (i.e BarnesHut),
+                        or the name of a registered backend (see backends.registry).
+                        If "auto", uses the fastest exact backend for the number of bodies, precision and workers (found and cached by registry.autotune)
+                        If None, accelerations are calculated by direct summation over every pair of bodies
+        :param memory: maximum number of bytes used at any time by direct summation (of accelerations, GPE or collision checks),
+                       which is performed in tiles of pairs of bodies. Larger budgets lead to larger (and slightly faster) tiles.
+        :param workers: number of threads over which direct summation is split (by tiles of pairs of bodies).
+                        Results are reproducible (bit for bit) for a given number of workers.
+        :param precision: "double" to store the positions and velocities as float64,
+                          or "mixed" to store them as float32 (halving memory traffic), whilst accumulating forces and energies in float64
+        :param planar: if True, every body must lie (and move) in the xy-plane, so positions and velocities are stored as (n x 2) matrices,
+                       and forces, distances and energies are calculated on 2-vectors (only the z component of angular momentum is non-zero).
+                       If None, planar is used whenever the z components of every position and velocity are 0 (and gravity is calculated by direct summation).
+        :param collision_skin: extra distance (beyond collision_tolerance) of the neighbour list used to detect collisions (see CollisionGrid)
+                               If None, equal to collision_tolerance.
+        :param tracer_positions: Python list or numpy array of position vectors for massless tracers (i.e test particles).
+                                 Tracers feel the gravity of the massive bodies, but never feed back (on the bodies, or on each other),
+                                 so they cost O(n * n_tracers). Tracers which collide or escape are flagged, without ending the simulation.
+                                 If None, there are no tracers.
+        :param tracer_velocities: Python list or numpy array of velocity vectors for the tracers
         """
 
+        assert precision in self.precisions, f"Precision must be one of {list(self.precisions)}, but was {precision}"
+
         # number of bodies in simulation
         self.n = len(init_positions)
 
         # ensures that input is correctly formatted (in terms of shape & data type)
-        self.check_update_input(init_positions, init_velocities, masses)
+        positions, velocities, masses = self.check_update_input(init_positions, init_velocities, masses)
+
+        if isinstance(backend, str):
+            backend = registry.get_backend(backend, n = self.n, precision = precision, workers = workers)
+
+        # only direct summation calculates interactions on 2-vectors
+        direct = backend is None or backend.interactions
+
+        if tracer_positions is None:
+            tracer_positions = np.zeros(shape = (0, 3))
+            tracer_velocities = np.zeros(shape = (0, 3))
+
+        tracer_positions = np.array(tracer_positions, dtype = np.float64).reshape((-1, 3))
+        tracer_velocities = np.array(tracer_velocities, dtype = np.float64).reshape((-1, 3))
+
+        # check: same number of tracers in the position and velocity tensors
+        assert len(tracer_positions) == len(tracer_velocities), \
+            f"{len(tracer_positions)} tracer positions given; {len(tracer_velocities)} tracer velocities given. These 2 quantities must be the same."
+
+        # number of tracers in simulation
+        self.n_tracers = len(tracer_positions)
+
+        # systems confined to the xy-plane drop the z components of their positions and velocities
+        in_plane = not np.any(positions[:, 2]) and not np.any(velocities[:, 2]) \
+                   and not np.any(tracer_positions[:, 2]) and not np.any(tracer_velocities[:, 2])
+
+        if planar is None:
+            planar = in_plane and direct
+
+        if planar:
+            assert direct, "Planar systems are only supported by direct summation (without a backend, or with a DirectBackend)"
+            assert in_plane, "Planar systems must have 0 as the z component of every position and velocity"
+
+            positions = positions[:, :2]
+            velocities = velocities[:, :2]
+            tracer_positions = tracer_positions[:, :2]
+            tracer_velocities = tracer_velocities[:, :2]
+
+        self.planar = planar
+
+        # number of components stored for each position and velocity
+        self.dims = 2 if planar else 3
 
         self.G = 1#6.67408e-11
         self.collision_tolerance = collision_tolerance
+        self.collision_skin = collision_skin
+        self.collision_grid = CollisionGrid(skin = collision_skin)
+        self.backend = backend
+        self.memory = memory
+        self.workers = workers
+        self.precision = precision
+        self.dtype = self.precisions[precision]
+
+        self.reset_caches()
+
+        # preallocated arrays reused by every update (see Workspace)
+        self.workspace = Workspace()
+
+        # backends which smooth gravity on small scales (i.e ParticleMesh) can't detect collisions
+        if backend is not None and not backend.collisional:
+            self.collision_tolerance = None
 
         if escape_tolerance is None:
             # escape tolerance set as 10 times the maximum distance of any body from the COM
-            self.escape_tolerance = np.max(nm.ten_norm(self.positions, sqrt = True, axis = 1)) * 10 # can be altered
+            self.escape_tolerance = np.max(nm.ten_norm(positions, sqrt = True, axis = 1)) * 10 # can be altered
         else:
             self.escape_tolerance = escape_tolerance
 
         # total mass of simulation
-        self.total_mass = np.sum(self.masses)
+        self.total_mass = np.sum(masses)
 
         # keep masses as stacked array aswell (convenient for calculations)
-        self.stacked_masses = np.vstack(self.masses)
+        self.stacked_masses = np.vstack(masses)
 
         # calculate COM and linear momentum of initial system
-        self.com = self.get_com()
-        self.linear_momentum = self.get_lmomentum()
-        self.total_linear_momentum = np.sum(self.linear_momentum, axis=0)
+        self.com = np.sum(self.stacked_masses * positions, axis = 0)/self.total_mass
+        total_linear_momentum = np.sum(self.stacked_masses * velocities, axis=0)
 
         # change to COM coordinates (COM becomes the origin, COM moves at constant velocity)
-        self.positions = self.positions - self.com
-        self.velocities = self.velocities - (self.total_linear_momentum)/self.total_mass
-
-        # compute a tensor (nxnx3) with entry (i,j) corresponding to the distance vector between the ith and jth body
-        self.distances = np.zeros(shape = (self.n, self.n, 3))
-        self.get_body_distances()
+        # the positions and velocities (of the bodies and tracers) and the masses are then stored in a single contiguous buffer
+        self.derived = {}
+        self.set_state(np.zeros(self.get_state_size(), dtype = np.uint8))
+        self.masses = masses
+        self.positions = positions - self.com
+        self.velocities = velocities - (total_linear_momentum)/self.total_mass
+        self.tracer_positions = tracer_positions - self.com
+        self.tracer_velocities = tracer_velocities - (total_linear_momentum)/self.total_mass
+
+        # check: no bodies start closer than collision_tolerance
+        self.check_collision()
+
+        # flags of the tracers which collided with a massive body, or escaped beyond escape_tolerance
+        self.tracer_collided = np.zeros(self.n_tracers, dtype = bool)
+        self.tracer_escaped = np.zeros(self.n_tracers, dtype = bool)
+        self.check_tracers(self.tracer_positions)
 
         # recalculate properties of the system based on COM coordinates
         # linear momentum, total linear momentum, angular momentum, total angular momentum,
@@ -77,6 +217,7 @@ class NBody:
         Ensures that positions, velocities and masses all have the same number of elements
         Ensure that positions and velocities are matrices of shape (n x 3)
         Lastly, ensures that position, velocity and mass tensors are numpy arrays
+        :return: a tuple with the positions, velocities and masses, as numpy arrays
         """
 
         # check: same number of bodies as elements in the position, velocity and mass tensors
@@ -88,102 +229,430 @@ class NBody:
         assert (len(init_positions[0]) == 3 and len(init_velocities[0]) == 3)
 
         # if parameters are Python lists, change to numpy arrays
-        # then, set positions, velocities and masses for the simulation
+        return np.asarray(init_positions), np.asarray(init_velocities), np.asarray(masses)
 
-        if (not isinstance(init_positions, np.ndarray)):
-            self.positions = np.array(init_positions)
-        else:
-            self.positions = init_positions
+    def get_state_size(self):
+        """
+        Calculates the number of bytes of the buffer holding the primary state of the simulation
+        :return: the size of the buffer, in bytes
+        """
 
-        if (not isinstance(init_velocities, np.ndarray)):
-            self.velocities = np.array(init_velocities)
-        else:
-            self.velocities = init_velocities
+        vectors = (self.n + self.n_tracers) * self.dims * np.dtype(self.dtype).itemsize
+
+        return self.n * np.dtype(np.float64).itemsize + 2 * vectors
+
+    def set_state(self, state):
+        """
+        Sets the buffer holding the primary state of the simulation, as a single contiguous array of bytes.
+        The buffer contains the masses of the bodies (as float64), followed by the positions and velocities of the bodies
+        and tracers (in the precision of the simulation), which are accessed as views of the buffer.
+        :param state: an array of get_state_size() bytes
+        """
+
+        rows = self.n + self.n_tracers
+        mass_bytes = self.n * np.dtype(np.float64).itemsize
+        vector_bytes = rows * self.dims * np.dtype(self.dtype).itemsize
+
+        # the masses come first, so every view is aligned to its data type
+        self.state = state
+        self.state_masses = state[:mass_bytes].view(np.float64)
+        self.state_positions = state[mass_bytes:mass_bytes + vector_bytes].view(self.dtype).reshape((rows, self.dims))
+        self.state_velocities = state[mass_bytes + vector_bytes:].view(self.dtype).reshape((rows, self.dims))
+
+    def reset_caches(self):
+        """
+        Clears the results of the last passes over the bodies (and tracers)
+        """
+
+        # positions, velocities & G of the last fused pass over every pair of bodies, alongside its results
+        # quantities calculated for the same system (i.e the acceleration calculated by the integrator, followed by the GPE and
+        # collision checks when the simulation is updated) are then reused instead of recomputed
+        self.last_positions = None
+        self.last_velocities = None
+        self.last_G = None
+        self.last_interactions = None
+
+        # positions of the tracers & massive bodies of the last pass over the tracers, alongside its results
+        self.last_tracer_positions = None
+        self.last_massive_positions = None
+        self.last_tracer_interactions = None
+
+    @property
+    def masses(self):
+        """
+        The mass of each body (a view of the state buffer)
+        """
+
+        return self.state_masses
+
+    @masses.setter
+    def masses(self, masses):
+        self.state_masses[:] = masses
+        self.derived.clear()
+
+        # the results of the last passes are only reused for the same positions, so they're cleared when the masses change
+        self.reset_caches()
+
+    @property
+    def positions(self):
+        """
+        The positions of the bodies (a view of the state buffer)
+        """
+
+        return self.state_positions[:self.n]
+
+    @positions.setter
+    def positions(self, positions):
+        self.state_positions[:self.n] = positions
+        self.derived.clear()
+
+    @property
+    def velocities(self):
+        """
+        The velocities of the bodies (a view of the state buffer)
+        """
+
+        return self.state_velocities[:self.n]
+
+    @velocities.setter
+    def velocities(self, velocities):
+        self.state_velocities[:self.n] = velocities
+        self.derived.clear()
+
+    @property
+    def tracer_positions(self):
+        """
+        The positions of the tracers (a view of the state buffer)
+        """
+
+        return self.state_positions[self.n:]
+
+    @tracer_positions.setter
+    def tracer_positions(self, tracer_positions):
+        self.state_positions[self.n:] = tracer_positions
+
+    @property
+    def tracer_velocities(self):
+        """
+        The velocities of the tracers (a view of the state buffer)
+        """
+
+        return self.state_velocities[self.n:]
+
+    @tracer_velocities.setter
+    def tracer_velocities(self, tracer_velocities):
+        self.state_velocities[self.n:] = tracer_velocities
+
+    def snapshot(self, out = None):
+        """
+        Copies the primary state of the simulation (the masses, positions and velocities of the bodies and tracers)
+        :param out: the buffer of a previous snapshot, into which the state is copied (so no memory is allocated).
+                    If None, a new buffer is allocated.
+        :return: the snapshot, as a contiguous array of bytes
+        """
+
+        if out is None:
+            return self.state.copy()
+
+        np.copyto(out, self.state)
+
+        return out
+
+    def restore(self, snapshot):
+        """
+        Restores the primary state of the simulation from a snapshot. The state is copied into the existing buffer,
+        so views of the positions and velocities remain valid. Derived quantities (momenta and energies) are recalculated on first access,
+        whilst the initial quantities used to check conservation (and the flags of the tracers) are kept.
+        :param snapshot: a snapshot of a simulation with the same number of bodies, tracers, dimensions and precision
+        """
+
+        assert snapshot.shape == self.state.shape, f"Snapshot of {len(snapshot)} bytes given, but the state has {len(self.state)} bytes"
+
+        np.copyto(self.state, snapshot)
+        self.derived = {}
+
+        # the snapshot might have different masses, for which the results of the last passes aren't valid
+        self.reset_caches()
+
+    def __reduce__(self):
+        """
+        Pickles (and copies) the simulation as its state buffer and parameters only,
+        so derived quantities (momenta and energies) and the results of the last passes over the bodies aren't sent
+        (nor those of the last evaluation of the backend, which only pickles its configuration, see Backend.__getstate__)
+        """
+
+        return (self.__class__.from_state, (self.state, {name: getattr(self, name) for name in self.parameters}))
+
+    @classmethod
+    def from_state(cls, state, parameters):
+        """
+        Creates a simulation from its state buffer and parameters (see __reduce__)
+        Derived quantities (momenta and energies) are recalculated on first access.
+        :param state: the state buffer of the simulation (see set_state)
+        :param parameters: a dictionary with the value of every attribute in NBody.parameters
+        :return: the NBody instance
+        """
+
+        nbody = cls.__new__(cls)
+
+        for name, value in parameters.items():
+            setattr(nbody, name, value)
+
+        nbody.dtype = cls.precisions[nbody.precision]
+        nbody.collision_grid = CollisionGrid(skin = nbody.collision_skin)
+        nbody.set_state(np.array(state))
+        nbody.total_mass = np.sum(nbody.masses)
+        nbody.stacked_masses = np.vstack(nbody.masses)
+        nbody.derived = {}
+        nbody.workspace = Workspace()
+        nbody.reset_caches()
+
+        return nbody
+
+    def get_interactions(self, positions = None, velocities = None, acceleration = True, out = None):
+        """
+        Calculates the accelerations, GPE, minimum distance between bodies and (if velocities are given) minimum ratio |dx|/|dv|
+        in a single fused pass over every pair of bodies (see nm.tiled_interactions).
+        The results of the last pass are reused if they were calculated for the same system.
+        :param positions: the positions of a system of bodies. If None, uses the positions within the simulation.
+        :param velocities: the velocities of the bodies. If None, the minimum ratio |dx|/|dv| isn't required
+        :param acceleration: if False, the accelerations aren't required
+        :param out: an (n x d) matrix of float64, into which the accelerations are written by direct summation (so they aren't allocated).
+                    Backends, and results reused from the last pass, ignore it, so the returned accelerations must be used.
+        :return: a tuple with the accelerations, the GPE, the minimum distance and the minimum ratio |dx|/|dv|
+        """
+
+        if positions is None:
+            positions = self.positions
+
+        # forces are calculated for the positions as they are stored (i.e rounded to single precision)
+        positions = np.asarray(positions, dtype = self.dtype)
+
+        if velocities is not None:
+            velocities = np.asarray(velocities, dtype = self.dtype)
+
+        same_positions = self.last_G == self.G and np.array_equal(self.last_positions, positions)
+        same_velocities = velocities is None or np.array_equal(self.last_velocities, velocities)
 
-        if (not isinstance(masses, np.ndarray)):
-            self.masses = np.array(masses)
+        # accelerations from the last pass remain valid if only the velocities changed
+        same_acceleration = same_positions and self.last_interactions[0] is not None
+
+        if same_positions and same_velocities and (not acceleration or same_acceleration):
+            return self.last_interactions
+
+        # backends performing direct summation calculate the interactions in place of nm.tiled_interactions
+        if self.backend is not None and self.backend.interactions:
+            interactions = self.backend.get_interactions(positions, self.masses, G = self.G, acceleration = acceleration and not same_acceleration,
+                                                         velocities = velocities)
         else:
-            self.masses = masses
+            interactions = nm.tiled_interactions(positions, self.masses, G = self.G, memory = self.memory,
+                                                 acceleration = acceleration and not same_acceleration, velocities = velocities,
+                                                 workers = self.workers, out = out)
+
+        if same_acceleration:
+            interactions = (self.last_interactions[0],) + interactions[1:]
+
+        # the arrays of the last pass are overwritten in place (so no memory is allocated in steady state)
+        self.last_positions = self.copy_into(self.last_positions, positions)
+        self.last_velocities = None if velocities is None else self.copy_into(self.last_velocities, velocities)
+        self.last_G = self.G
+        self.last_interactions = interactions
+
+        return interactions
+
+    @staticmethod
+    def copy_into(destination, source):
+        """
+        Copies an array into another, reusing the memory of the destination if it has the same shape and data type
+        :param destination: the array to overwrite (or None)
+        :param source: the array to copy
+        :return: the copy
+        """
+
+        if destination is None or destination.shape != source.shape or destination.dtype != source.dtype:
+            return np.array(source)
+
+        np.copyto(destination, source)
+
+        return destination
+
+    def get_variable_delta(self, positions, velocities, adaptive_constant, delta_lim = 10 ** -5):
+        """
+        Calculates variable delta for the system (see nm.variable_delta), using the fused pass over every pair of bodies
+        :param positions: positions of bodies in the system (followed by those of the tracers, which don't affect the timestep)
+        :param velocities: velocities of bodies in the system (followed by those of the tracers)
+        :param adaptive_constant: constant resizing factor for variable delta
+        :param delta_lim: smallest value allowed for the variable delta
+        :return: the calculated variable delta for the system
+        """
+
+        positions = positions[:self.n]
+        velocities = velocities[:self.n]
+
+        min_ratio = None if self.n == 1 else self.get_interactions(positions, velocities = velocities, acceleration = False)[3]
+
+        return nm.variable_delta(positions, velocities, adaptive_constant, delta_lim = delta_lim, min_ratio = min_ratio)
+
+    def get_tracer_interactions(self, tracer_positions = None, positions = None, acceleration = True):
+        """
+        Calculates the accelerations of the tracers, and their distances to the closest massive body (see nm.tracer_interactions)
+        The results of the last pass are reused if they were calculated for the same positions.
+        :param tracer_positions: the positions of the tracers. If None, uses the positions of the tracers within the simulation.
+        :param positions: the positions of the massive bodies. If None, uses the positions within the simulation.
+        :param acceleration: if False, the accelerations aren't required
+        :return: a tuple with the accelerations of the tracers, and the distance from each tracer to its closest massive body
+        """
+
+        if tracer_positions is None:
+            tracer_positions = self.tracer_positions
+
+        if positions is None:
+            positions = self.positions
+
+        if np.array_equal(self.last_tracer_positions, tracer_positions) and np.array_equal(self.last_massive_positions, positions) \
+                and (not acceleration or self.last_tracer_interactions[0] is not None):
+            return self.last_tracer_interactions
+
+        interactions = nm.tracer_interactions(tracer_positions, positions, self.masses, G = self.G, memory = self.memory, acceleration = acceleration)
+
+        self.last_tracer_positions = np.array(tracer_positions)
+        self.last_massive_positions = np.array(positions)
+        self.last_tracer_interactions = interactions
+
+        return interactions
+
+    def check_tracers(self, tracer_positions):
+        """
+        Flags the tracers which collided with a massive body (within collision_tolerance), or escaped beyond escape_tolerance.
+        Flagged tracers remain flagged, but they are still integrated (so the simulation isn't ended).
+        :param tracer_positions: the positions of the tracers
+        """
+
+        if self.escape_tolerance != -1:
+            self.tracer_escaped |= nm.ten_norm(tracer_positions, sqrt = True, axis = 1) > self.escape_tolerance
+
+        if self.collision_tolerance is not None:
+            self.tracer_collided |= self.get_tracer_interactions(tracer_positions, acceleration = False)[1] < self.collision_tolerance
+
+    @property
+    def all_positions(self):
+        """
+        The positions of the massive bodies, followed by those of the tracers (as stored by the integrators)
+        """
+
+        return self.state_positions
+
+    @property
+    def all_velocities(self):
+        """
+        The velocities of the massive bodies, followed by those of the tracers (as stored by the integrators)
+        """
+
+        return self.state_velocities
+
+    def check_collision(self, min_distance = None, positions = None):
+        """
+        Checks that no pair of bodies is closer than collision_tolerance. If collision_tolerance is None, collisions are not considered.
+        :param min_distance: the minimum distance between any 2 bodies, if it has already been calculated (i.e by a pass over every pair of bodies)
+                             If None, the last pass over every pair of bodies is used if it was performed for the same positions.
+                             Otherwise, collisions are detected in O(n) via the collision grid (see CollisionGrid).
+        :param positions: the positions of a system of bodies. If None, uses the positions within the simulation.
+        """
+
+        if self.collision_tolerance is not None:
+            if positions is None:
+                positions = self.positions
+
+            if min_distance is None and self.last_positions is not None and np.array_equal(self.last_positions, np.asarray(positions, dtype = self.dtype)):
+                min_distance = self.last_interactions[2]
+
+            # the collision grid also identifies the pair of bodies which collided
+            if min_distance is None or min_distance < self.collision_tolerance:
+                min_distance = self.collision_grid.check(positions, self.collision_tolerance)
+
+            check_exception(min_distance >= self.collision_tolerance,
+                            BodyCollisionException,
+                            lambda: f"A collision occurred. Distance between bodies was {min_distance}, but the collision distance is {self.collision_tolerance}.")
+
+    def get_pair_distances(self, positions = None):
+        """
+        Computes the direction vector between every distinct pair of bodies (i,j) of the system, with i > j.
+        Each pair is computed only once, since the direction vector from j to i is the negative of the one from i to j.
+        :param positions: the positions of a system of bodies. If None, uses the positions within the simulation.
+        :return: an (n(n-1)/2 x 3) matrix, with row k containing the direction vector from body i to body j,
+                 for the kth pair (i,j) of nm.pair_indices(n)
+        """
+
+        if positions is None:
+            positions = self.positions
+
+        i, j = nm.pair_indices(len(positions))
+
+        # compute distance vectors for all pairs at once
+        pair_distances = positions[j] - positions[i]
+
+        if self.collision_tolerance is not None and len(pair_distances) > 0:
+            # check: no body violates the collision_tolerance distance
+            self.check_collision(np.min(nm.ten_norm(pair_distances, axis = 1, sqrt = True)), positions)
+
+        return pair_distances
 
     def get_body_distances(self, positions = None):
         """
         Computes the direction vector from all bodies in an n-body system,
         storing them in a tensor of dimensions (n x n x 3),
         where entry (i,j) contains the direction vector from body i to body j.
+        The tensor is O(n^2) in memory, so it is only computed on demand (and never stored by the simulation).
         :param positions: the positions of a system of bodies. If None, uses the positions within the simulation.
-        :return: if positions is not None, a tensor with the distance vectors between the positions
+        :return: a tensor with the distance vectors between the positions
         """
 
         if positions is None:
-            # itereate over the upper triangular section of the tensor
-            for i in range(self.n):
-                for j in range(i):
-                    # compute distance vector using simulation positions
-                    distance_vec = self.positions[j] - self.positions[i]
-
-                    if self.collision_tolerance is not None:
-                        # check: no body violates the collision_tolerance distance
-                        check_exception(nm.ten_norm(distance_vec, axis = 0, sqrt = True) >= self.collision_tolerance,
-                                        BodyCollisionException,
-                                        f"A collision occurred. Distance between bodies was {nm.ten_norm(distance_vec, axis=0, sqrt=True)}, but the collision distance is {self.collision_tolerance}.")
-
-                    self.distances[i,j] = distance_vec
-
-                    # direction vector (i,j) is the negative of direction vector (j,i)
-                    self.distances[j,i] = -distance_vec
-        else:
-            # compute the number of bodies & create a corresponding tesnor to store the distance vectors
-            n = len(positions)
-            distances = np.zeros(shape = (n, n, 3))
+            positions = self.positions
 
-            # itereate over the upper triangular section of the tensor
-            for i in range(n):
-                for j in range(i):
-                    # compute distance vector using positions given as arguments
-                    distance_vec = positions[j] - positions[i]
+        return nm.pair_tensor(self.get_pair_distances(positions), len(positions))
 
-                    if self.collision_tolerance is not None:
-                        # check: no body violates the collision_tolerance distance
-                        if self.collision_tolerance is not None:
-                            # check: no body violates the collision_tolerance distance
-                            check_exception(nm.ten_norm(distance_vec, axis=0, sqrt=True) >= self.collision_tolerance,
-                                            BodyCollisionException,
-                                            f"A collision occurred. Distance between bodies was {nm.ten_norm(distance_vec, axis=0, sqrt=True)}, but the collision distance is {self.collision_tolerance}.")
-
-                    distances[i, j] = distance_vec
-
-                    # direction vector (i,j) is the negative of direction vector (j,i)
-                    distances[j, i] = -distance_vec
+    @property
+    def distances(self):
+        """
+        The (n x n x 3) tensor of distance vectors between the bodies of the simulation, computed on demand
+        """
 
-            return distances
+        return self.get_body_distances()
 
     def get_com(self):
         """
         Calculates the COM of the system
-        :return: a position vector in 3D for the COM of the system
+        :return: a position vector in 3D (2D for planar systems) for the COM of the system
         """
 
         com = np.sum(self.stacked_masses * self.positions, axis = 0)/self.total_mass
 
         return com
 
-    def get_lmomentum(self):
+    def get_lmomentum(self, out = None):
         """
         Calculates the linear momentum (product of mass and velocity) of each body in the system
-        :return: an (n x 3) matrix, with the linear momentum of body i at entry i
+        :param out: an (n x 3) matrix (n x 2 for planar systems), into which the linear momentum is written. If None, a new matrix is created.
+        :return: an (n x 3) matrix (n x 2 for planar systems), with the linear momentum of body i at entry i
         """
 
-        lmomentum = self.stacked_masses * self.velocities
+        lmomentum = np.multiply(self.stacked_masses, self.velocities, out = out)
 
         return lmomentum
 
-    def get_amomentum(self):
+    def get_amomentum(self, out = None):
         """
         Calculates the angular momentum (cross product of position and linear momentum) of each element of the system
+        :param out: an (n x 3) matrix, into which the angular momentum is written. If None, a new matrix is created.
         :return: an (n x 3) matrix, with the angular momentum of body i at entry i
         """
 
-        amomentum = nm.mat_cross(self.positions, self.linear_momentum)
+        # planar bodies only have angular momentum along the z axis
+        if self.planar:
+            return nm.planar_cross(self.positions, self.linear_momentum, out = out)
+
+        amomentum = nm.mat_cross(self.positions, self.linear_momentum, out = out)
 
         return amomentum
 
@@ -197,57 +666,102 @@ class NBody:
         kinetic_energy = np.sum(nm.ten_norm(self.linear_momentum, axis = 1, sqrt = False) / (2 * self.masses))
         self.kinetic_energy = kinetic_energy
 
-        # calculate the total GPE of the system
-        gpe = 0
+        # if the backend calculates the potential of each body, use it to calculate the GPE (each pair is counted twice)
+        potential = None if self.backend is None else self.backend.get_potential(self.positions.astype(np.float64), self.masses, G = self.G)
 
-        for i in range(self.n):
-            for j in range(i):
-                gpe += (self.masses[i]*self.masses[j]) / nm.ten_norm(self.distances[i, j], axis = 0)
+        if potential is not None:
+            gpe = 0.5 * np.sum(self.masses * potential)
+        else:
+            # calculate the total GPE of the system, as the sum over every distinct pair of bodies
+            gpe = self.get_interactions(acceleration = False)[1]
 
-        gpe *= (-self.G)
         self.gpe = gpe
 
         return kinetic_energy + gpe
 
-    def get_acceleration(self, positions = None):
+    def get_acceleration(self, positions = None, jit = False, out = None):
         """
         Calculates the acceleration of every particle of a system - solely dependent on position
         :param positions: if None, calculates acceleration based on positions of the system;
                           otherwise, uses positions passed as argument to perform calculation
-        :return: an (n x 3) matrix, with each entry i corresponding to the acceleration of o body i
+        :param jit: if True, direct summation is performed by a kernel compiled with numba (see jit_kernels)
+        :param out: a matrix of float64 with the shape of positions, into which the accelerations are written (so they aren't allocated).
+                    Backends, and results reused from the last pass, ignore it, so the returned accelerations must be used.
+        :return: an (n x 3) matrix (n x 2 for planar systems), with each entry i corresponding to the acceleration of o body i
+                 If positions contains the tracers after the massive bodies (as in all_positions), so does the matrix
         """
 
-        # calculate the magnitude of the distances between bodies
         if positions is None:
-            inv_dist_mag3 = nm.ten_norm(self.distances, axis = 2, sqrt = False)
+            positions = self.all_positions
+
+        # tracers feel the gravity of the massive bodies, without feeding back
+        if len(positions) > self.n:
+            positions = np.asarray(positions)
+            tracer_acceleration = self.get_tracer_interactions(positions[self.n:], positions[:self.n])[0]
+            acceleration = self.get_acceleration(positions[:self.n], jit = jit, out = None if out is None else out[:self.n])
+
+            if out is None:
+                return np.concatenate([acceleration, tracer_acceleration])
+
+            np.copyto(out[:self.n], acceleration)
+            np.copyto(out[self.n:], tracer_acceleration)
+
+            return out
+
+        # if a backend is used, it calculates the acceleration in place of direct summation
+        if self.backend is not None and not self.backend.interactions:
+            return self.backend.get_acceleration(np.asarray(positions, dtype = np.float64), self.masses, G = self.G)
+
+        if jit:
+            acceleration = np.zeros(np.shape(positions)) if out is None else out
+            min_distance = jk.direct_acceleration(positions, self.masses, self.G, acceleration)[1]
         else:
-            distances = self.get_body_distances(positions = positions)
-            inv_dist_mag3 = nm.ten_norm(distances, axis=2, sqrt=False)
-        # to avoid division by 0 error, and to avoid unnecessary computational costs,
-        # any distance which is 0 is set to infinity, so when reciprocating, the magnitude of the force becomes 0
-        inv_dist_mag3[inv_dist_mag3 == 0] = np.inf
+            # direct summation over every distinct pair of bodies, in tiles which fit in the memory budget
+            acceleration, _, min_distance, _ = self.get_interactions(positions, out = out)
+
+        # check: no body violates the collision_tolerance distance
+        self.check_collision(min_distance, positions)
 
-        # exponentiate; calculates 1/(magnitude of distance)^3
-        inv_dist_mag3 = inv_dist_mag3**(-1.5)
+        return acceleration
+
+    def get_acceleration_jerk(self, positions = None, velocities = None, jit = False):
+        """
+        Calculates the acceleration and jerk (time derivative of the acceleration) of every body, in a single pass over every pair of bodies
+        (i.e for Hermite integrators). Always calculated by direct summation, so any backend is ignored.
+        :param positions: if None, uses the positions of the system; otherwise, uses positions passed as argument to perform calculation
+        :param velocities: if None, uses the velocities of the system; otherwise, uses velocities passed as argument to perform calculation
+        :param jit: if True, direct summation is performed by a kernel compiled with numba (see jit_kernels)
+        :return: a tuple with the (n x 3) matrices of accelerations and jerks (n x 2 for planar systems)
+        """
 
-        # tensor, with entry (i,j) giving a unit vector for the direction of the force felt by i due to j
         if positions is None:
-            acc_direction = inv_dist_mag3[:,:,np.newaxis] * self.distances
-            self.acc_direction = acc_direction
+            positions = self.positions
+
+        if velocities is None:
+            velocities = self.velocities
+
+        if jit:
+            acceleration, jerk, min_distance = jk.direct_acceleration_jerk(positions, velocities, self.masses, self.G,
+                                                                           np.zeros(np.shape(positions)), np.zeros(np.shape(positions)))
         else:
-            acc_direction = inv_dist_mag3[:, :, np.newaxis] * distances
+            acceleration, jerk, min_distance = nm.tiled_acceleration_jerk(positions, velocities, self.masses, G = self.G, memory = self.memory)
 
-        # calculate the acceleration felt by each body, storing in (n x 3) matrix
-        acceleration = np.zeros(shape = (self.n, 3))
+        # check: no body violates the collision_tolerance distance
+        self.check_collision(min_distance, positions)
 
-        for i in range(self.n):
-            for j in range(self.n):
-                if i != j:
-                    acceleration[i] += self.masses[j] * acc_direction[i, j]
+        return acceleration, jerk
 
-        acceleration *= self.G
+    def get_force_error(self):
+        """
+        Compares the accelerations calculated by the backend against direct summation, using the positions of the simulation.
+        Direct summation is O(n^2), so this is only calculated on demand (i.e to choose the parameters of the backend).
+        :return: an array with the relative error of the acceleration of each body. 0 if no backend is used.
+        """
 
-        return acceleration
+        if self.backend is None:
+            return np.zeros(self.n)
+
+        return self.backend.get_force_error(self.positions.astype(np.float64), self.masses, G = self.G)
 
     def conserved_quantity(self, new_value, old_value, tolerance):
         """
@@ -260,88 +774,164 @@ class NBody:
 
         return (np.abs(new_value - old_value) < tolerance).all()
 
-    def update(self, new_positions, new_velocities, symplectic = True, tolerance = 10e-3):
+    def update(self, new_positions, new_velocities, symplectic = True, tolerance = 10e-3, jit = False, diagnose = True):
         """
         Updates the simulation, given newly calculated positions and distances.
-        :param new_positions: positions to update the system with (as a Python list or numpy array of dimension (n x 3)
-        :param new_velocities: velocities to update the system with (as a Python list or numpy array of dimension (n x 3)
+        :param new_positions: positions to update the system with (as a Python list or numpy array of dimension (n x 3), or (n x 2) for planar systems)
+                              If the simulation has tracers, their positions follow those of the massive bodies (as in all_positions)
+        :param new_velocities: velocities to update the system with (as a Python list or numpy array of dimension (n x 3), or (n x 2) for planar systems)
         :param symplectic: if symplectic is True, check that calculated quantities (energy, angular momentum, linear momentum) are conserved
         :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param jit: if True, the quantities of the system are calculated by a single kernel compiled with numba (see jit_kernels).
+                    Only used without a backend (since the GPE is calculated by direct summation)
+        :param diagnose: if False, the quantities of the system (momenta and energies) aren't calculated, and their conservation isn't checked.
+                         They are then calculated when first accessed. Collisions and escapes are always checked.
+                         If True, the momenta (linear_momentum, total_linear_momentum, angular_momentum and total_angular_momentum)
+                         are written into arrays preallocated by the NBody, so the arrays returned by these attributes are only valid
+                         until the next update, and must be copied to be kept.
         """
 
-        # check: same number of bodies as elements in the position and velocity
-        assert (self.n == len(new_positions) and self.n == len(new_velocities)), \
+        # check: same number of bodies (and tracers) as elements in the position and velocity
+        assert (self.n + self.n_tracers == len(new_positions) and self.n + self.n_tracers == len(new_velocities)), \
             f"{len(new_positions)} positions given; {len(new_velocities)} velocities given; \
                                     These 2 quantities must be the same."
 
-        # check: vectors are in R^3
-        assert (len(new_positions[0]) == 3 and len(new_velocities[0]) == 3)
+        # check: vectors are in R^3 (R^2 for planar systems)
+        assert (len(new_positions[0]) == self.dims and len(new_velocities[0]) == self.dims)
+
+        new_positions = np.asarray(new_positions)
+        new_velocities = np.asarray(new_velocities)
+
+        # tracers are updated (and flagged if they collided or escaped), but don't affect the quantities of the system
+        if self.n_tracers > 0:
+            self.tracer_positions = new_positions[self.n:]
+            self.tracer_velocities = new_velocities[self.n:]
+            new_positions = new_positions[:self.n]
+            new_velocities = new_velocities[:self.n]
 
         # check: no bodies gone beyond escape_tolerance
         if self.escape_tolerance != -1:
-            check_exception((nm.ten_norm(new_positions, sqrt = True, axis = 1) <= self.escape_tolerance).all(),
+            # distances from the COM are calculated within preallocated arrays (of floats, even for positions given as integers)
+            # ufuncs are reduced directly, as np.sum adds a noticeable overhead for small systems
+            dtype = new_positions.dtype if new_positions.dtype.kind == "f" else np.float64
+            squared_positions = np.square(new_positions, out = self.workspace.get("squared_positions", new_positions.shape, dtype))
+            distances = np.add.reduce(squared_positions, axis = 1, out = self.workspace.get("distances", (self.n,), dtype))
+
+            check_exception(np.sqrt(distances, out = distances).max() <= self.escape_tolerance,
                             BodyEscapeException,
                             "A body escaped beyond the allowed distance from the COM.")
 
-        # if positions and velocities have the correct format, update them
-        # also recalculate all the distances between the bodies
+        # if positions and velocities have the correct format, update them (in place, rounded to the precision of the simulation)
+        # also check that no bodies have collided
         self.positions = new_positions
         self.velocities = new_velocities
-        self.get_body_distances()
 
-        # calculate new linear momentum (used for kinetic energy and angular momentum calculation)
-        new_linear_momentum = self.get_lmomentum()
+        if self.n_tracers > 0:
+            self.check_tracers(self.tracer_positions)
 
-        new_total_linear_momentum = np.sum(new_linear_momentum, axis = 0)
+        if not diagnose:
+            # check: no bodies collided (reusing the last pass over every pair of bodies, if it was performed for these positions)
+            self.check_collision()
 
-        self.linear_momentum = new_linear_momentum
-        self.total_linear_momentum = new_total_linear_momentum
+            return
 
-        # calculate new angular and total angular momentum
-        new_angular_momentum = self.get_amomentum()
-        new_total_angular_momentum = np.sum(new_angular_momentum, axis=0)
+        # momenta are written into preallocated arrays, which are overwritten by the next update
+        new_linear_momentum = self.workspace.get("linear_momentum", (self.n, self.dims))
+        new_angular_momentum = self.workspace.get("angular_momentum", (self.n, 3))
+        new_total_linear_momentum = self.workspace.get("total_linear_momentum", (self.dims,))
+        new_total_angular_momentum = self.workspace.get("total_angular_momentum", (3,))
 
-        # calculate new total energy
-        new_energy = self.get_energy()
+        if jit and self.backend is None:
+            # calculate every quantity of the system in a single compiled kernel
+            new_com = self.workspace.get("com", (self.dims,))
+            self.kinetic_energy, self.gpe, min_distance = jk.diagnostics(new_positions, new_velocities, self.masses, self.G,
+                                                                         new_linear_momentum, new_angular_momentum,
+                                                                         new_total_linear_momentum, new_total_angular_momentum, new_com)
 
-        # calculate new COM
-        new_com = self.get_com()
+            self.check_collision(min_distance)
 
-        # check if quantities are conserved if the integration update is meant to be symplectic
-        if (symplectic):
-            # check: COM at the origin
-            check_exception((abs(new_com) <= 10e-10).all(), COMNotConservedException,f"COM should be 0, but is {new_com}")
+            self.linear_momentum = new_linear_momentum
+            self.total_linear_momentum = new_total_linear_momentum
+            new_energy = self.kinetic_energy + self.gpe
+        else:
+            self.check_collision()
 
-            # check: total linear momentum conserved
-            check_exception(self.conserved_quantity(new_total_linear_momentum, self.first_linear_momentum, tolerance = tolerance),
-                            LinearMomentumNotConservedException,
-                            f"Total Linear Momentum was NOT conserved after the update.\nInitial Total Linear Momentum: {self.first_linear_momentum}\nCalculated Total Linear Momentum: {new_total_linear_momentum}\n")
+            # calculate new linear momentum (used for kinetic energy and angular momentum calculation)
+            self.get_lmomentum(out = new_linear_momentum)
 
+            np.add.reduce(new_linear_momentum, axis = 0, out = new_total_linear_momentum)
 
-            # check: total angular momentum conserved
-            check_exception(self.conserved_quantity(new_total_angular_momentum, self.first_angular_momentum, tolerance = tolerance),
-                            AngularMomentumNotConservedException,
-                            f"Total Angular Momentum was NOT conserved after the update.\nInitial Total Angular Momentum: {self.first_angular_momentum}\nCalculated Total Angular Momentum: {new_total_angular_momentum}\n")
+            self.linear_momentum = new_linear_momentum
+            self.total_linear_momentum = new_total_linear_momentum
 
-            # check: total energy conserved
-            check_exception(self.conserved_quantity(new_energy, self.first_energy, tolerance = tolerance),
-                            EnergyNotConservedException,
-                            f"Total Energy was NOT conserved after the update.\nInitial Total Energy: {self.first_energy}\nCalculated Total Energy: {new_energy}\n")
+            # calculate new angular and total angular momentum
+            self.get_amomentum(out = new_angular_momentum)
+            np.add.reduce(new_angular_momentum, axis = 0, out = new_total_angular_momentum)
 
+            # calculate new total energy
+            new_energy = self.get_energy()
+
+            # calculate new COM
+            new_com = self.get_com()
 
         # set the newly calculated values of the system
         self.angular_momentum = new_angular_momentum
         self.total_angular_momentum = new_total_angular_momentum
         self.energy = new_energy
 
+        # check if quantities are conserved if the integration update is meant to be symplectic
+        if (symplectic):
+            self.check_conservation(tolerance = tolerance, com = new_com, jit = jit)
+
+    def check_conservation(self, tolerance = 10e-3, com = None, jit = False):
+        """
+        Checks that the COM is at the origin, and that the total linear momentum, total angular momentum and energy
+        are conserved (within a given tolerance of their initial values). Quantities which haven't been calculated since
+        the last update are calculated first. The messages of the exceptions are only built if a check fails.
+        :param tolerance: allowed absolute error for determining conservation of calculated quantities
+        :param com: the COM of the system, if it has already been calculated. If None, it is calculated.
+        :param jit: if True, every quantity is checked at once by a kernel compiled with numba (see jit_kernels)
+        """
+
+        com = self.get_com() if com is None else com
+
+        # check: COM at the origin
+        # backends approximating gravity don't satisfy Newton's third law exactly, so the COM drifts within tolerance
+        # the same applies to positions rounded to single precision
+        com_tolerance = 10e-10 if (self.backend is None or self.backend.symmetric) and self.precision == "double" else tolerance
+
+        # compiled kernels check every quantity at once, so the checks below are only required if one fails
+        if jit and self.backend is None and jk.conserved(com, com_tolerance, self.total_linear_momentum, self.first_linear_momentum,
+                                                         self.total_angular_momentum, self.first_angular_momentum,
+                                                         self.energy, self.first_energy, tolerance):
+            return
+
+        check_exception((abs(com) <= com_tolerance).all(), COMNotConservedException, lambda: f"COM should be 0, but is {com}")
+
+        # check: total linear momentum conserved
+        check_exception(self.conserved_quantity(self.total_linear_momentum, self.first_linear_momentum, tolerance = tolerance),
+                        LinearMomentumNotConservedException,
+                        lambda: f"Total Linear Momentum was NOT conserved after the update.\nInitial Total Linear Momentum: {self.first_linear_momentum}\nCalculated Total Linear Momentum: {self.total_linear_momentum}\n")
+
+        # check: total angular momentum conserved
+        check_exception(self.conserved_quantity(self.total_angular_momentum, self.first_angular_momentum, tolerance = tolerance),
+                        AngularMomentumNotConservedException,
+                        lambda: f"Total Angular Momentum was NOT conserved after the update.\nInitial Total Angular Momentum: {self.first_angular_momentum}\nCalculated Total Angular Momentum: {self.total_angular_momentum}\n")
+
+        # check: total energy conserved
+        check_exception(self.conserved_quantity(self.energy, self.first_energy, tolerance = tolerance),
+                        EnergyNotConservedException,
+                        lambda: f"Total Energy was NOT conserved after the update.\nInitial Total Energy: {self.first_energy}\nCalculated Total Energy: {self.energy}\n")
+
     def copy(self):
         """
-        Copies the NBody instance
+        Copies the NBody instance (only its state and parameters are copied, see __reduce__)
         """
         return deepcopy(self)
 
     def __str__(self):
         return f"Bodies: {self.n}\n" + \
+               f"Tracers: {self.n_tracers}\n" + \
                f"Total Mass: {self.total_mass}\n" + \
                f"Centre of Mass: {self.com}\n" + \
                f"Linear Momentum:\n {self.linear_momentum}\n" + \
@@ -352,4 +942,13 @@ class NBody:
                f"Gravitational Potential Energy: {self.gpe}\n" \
                f"Total Energy: {self.energy}\n"
 
-
+    # quantities derived from the state of the simulation, calculated when first accessed
+    # the kinetic energy and GPE are calculated alongside the total energy
+    # the momenta are overwritten in place by the next update (see update), so they must be copied to be kept
+    linear_momentum = DerivedQuantity(get_lmomentum)
+    total_linear_momentum = DerivedQuantity(lambda nbody: np.sum(nbody.linear_momentum, axis = 0))
+    angular_momentum = DerivedQuantity(get_amomentum)
+    total_angular_momentum = DerivedQuantity(lambda nbody: np.sum(nbody.angular_momentum, axis = 0))
+    kinetic_energy = DerivedQuantity(get_energy)
+    gpe = DerivedQuantity(get_energy)
+    energy = DerivedQuantity(get_energy)
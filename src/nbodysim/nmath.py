@@ -1,3 +1,5 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
 import warnings
 
@@ -20,6 +22,435 @@ def ten_norm(ten, axis = 1, sqrt = True):
     else:
         return np.sum(ten**2, axis = axis)
 
+# only the most recently used sizes are kept, as the index arrays of large systems take O(n^2) memory
+@lru_cache(maxsize = 8)
+def pair_indices(n):
+    """
+    Calculates the indices of every distinct pair of bodies in a system of n bodies,
+    given by the entries (i,j) of the lower triangular section of an (n x n) matrix (so i > j)
+    Results are cached for the 8 most recently used system sizes, so the index arrays are only built again for sizes no longer in use
+    :param n: the number of bodies in the system
+    :return: a tuple (i, j) of index arrays, each with n(n-1)/2 entries
+    """
+
+    i, j = np.tril_indices(n, k = -1)
+
+    # the arrays are shared between every caller, so they can't be modified
+    i.setflags(write = False)
+    j.setflags(write = False)
+
+    return i, j
+
+def pair_tensor(pair_vectors, n):
+    """
+    Builds the antisymmetric (n x n x d) tensor of a pairwise quantity, given its value for every pair of pair_indices(n)
+    Entry (i,j) contains the vector for the pair, and entry (j,i) contains its negative (i.e direction vectors between bodies)
+    :param pair_vectors: an (n(n-1)/2 x d) matrix, with row k containing the vector for the kth pair of pair_indices(n)
+    :param n: the number of bodies in the system
+    :return: an (n x n x d) tensor, with 0 in the diagonal entries
+    """
+
+    i, j = pair_indices(n)
+
+    tensor = np.zeros(shape = (n, n, pair_vectors.shape[1]))
+    tensor[i, j] = pair_vectors
+    tensor[j, i] = -pair_vectors
+
+    return tensor
+
+def pair_sum(pair_vectors_i, pair_vectors_j, n):
+    """
+    Accumulates pairwise contributions onto the bodies on which they act
+    For the kth pair (i,j) of pair_indices(n), row k of pair_vectors_i is added to body i and row k of pair_vectors_j to body j
+    :param pair_vectors_i: an (n(n-1)/2 x d) matrix, with the contributions acting on the first body of each pair
+    :param pair_vectors_j: an (n(n-1)/2 x d) matrix, with the contributions acting on the second body of each pair
+    :param n: the number of bodies in the system
+    :return: an (n x d) matrix, with entry i containing the sum of all contributions acting on body i
+    """
+
+    i, j = pair_indices(n)
+
+    total = np.zeros(shape = (n, pair_vectors_i.shape[1]))
+
+    for k in range(pair_vectors_i.shape[1]):
+        total[:, k] = np.bincount(i, weights = pair_vectors_i[:, k], minlength = n) \
+                      + np.bincount(j, weights = pair_vectors_j[:, k], minlength = n)
+
+    return total
+
+def pair_acceleration(pair_distances, pair_masses_i, pair_masses_j, n, G = 1):
+    """
+    Calculates the acceleration of every body of a system by direct summation over every distinct pair of bodies
+    :param pair_distances: an (n(n-1)/2 x 3) matrix, with the direction vector from body i to body j for every pair (i,j) of pair_indices(n)
+    :param pair_masses_i: an (n(n-1)/2 x 1) matrix, with the mass of body i for every pair (i,j)
+    :param pair_masses_j: an (n(n-1)/2 x 1) matrix, with the mass of body j for every pair (i,j)
+    :param n: the number of bodies in the system
+    :param G: constant of gravitation
+    :return: an (n x 3) matrix, with each entry i corresponding to the acceleration of body i
+    """
+
+    # calculate the magnitude of the distances between bodies
+    inv_dist_mag3 = ten_norm(pair_distances, axis = 1, sqrt = False)
+
+    # to avoid division by 0 error, and to avoid unnecessary computational costs,
+    # any distance which is 0 is set to infinity, so when reciprocating, the magnitude of the force becomes 0
+    inv_dist_mag3[inv_dist_mag3 == 0] = np.inf
+
+    # exponentiate; calculates 1/(magnitude of distance)^3
+    inv_dist_mag3 = inv_dist_mag3**(-1.5)
+
+    # matrix, with row k giving the direction of the force felt by i due to j for the kth pair (i,j)
+    acc_direction = inv_dist_mag3[:, np.newaxis] * pair_distances
+
+    # calculate the acceleration felt by each body, storing in (n x 3) matrix
+    # by Newton's third law, j feels the same force as i, albeit in the opposite direction
+    acceleration = pair_sum(pair_masses_j * acc_direction, -pair_masses_i * acc_direction, n)
+
+    acceleration *= G
+
+    return acceleration
+
+def direct_acceleration(positions, masses, G = 1):
+    """
+    Calculates the acceleration of every body of a system by direct summation, without requiring an NBody instance
+    Used as the reference against which approximate methods of calculating gravity are compared
+    :param positions: an (n x 3) matrix with the positions of the bodies
+    :param masses: an array with the mass of each body
+    :param G: constant of gravitation
+    :return: an (n x 3) matrix, with each entry i corresponding to the acceleration of body i
+    """
+
+    return tiled_interactions(positions, masses, G = G)[0]
+
+def tile_size(memory):
+    """
+    Calculates the number of bodies along each side of a square tile of pairwise interactions fitting within a memory budget
+    :param memory: the maximum number of bytes used by the arrays of a tile
+    :return: the number of bodies along each side of the tile (at least 1)
+    """
+
+    # a tile holds up to 12 (t x t) arrays of float64 (separations along each axis, squared distances, masses, ...)
+    return max(1, int(np.sqrt(memory / (12 * 8))))
+
+@lru_cache(maxsize = None)
+def thread_pool(workers):
+    """
+    Provides a pool of threads, shared by every caller using the same number of workers (so threads are only ever created once)
+    :param workers: the number of threads in the pool
+    :return: a ThreadPoolExecutor with the given number of threads
+    """
+
+    return ThreadPoolExecutor(max_workers = workers)
+
+def tile_interactions(positions, masses, tiles, total_acceleration = None, velocities = None):
+    """
+    Calculates the interactions between the pairs of bodies of a list of tiles, one tile after the other
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param masses: an array with the mass of each body
+    :param tiles: a list of tuples (start_i, end_i, start_j, end_j), with the bodies i and j of each tile, such that start_i >= start_j
+    :param total_acceleration: an (n x d) matrix, onto which the accelerations (for G = 1) are accumulated. If None, they aren't calculated
+    :param velocities: an (n x d) matrix with the velocities of the bodies. If None, the ratios |dx|/|dv| aren't calculated
+    :return: a tuple, with the sum of m_i*m_j/|r_i - r_j| over the pairs, the minimum distance and the minimum ratio |dx|/|dv|
+    """
+
+    dims = positions.shape[1]
+    gpe = 0
+    min_distance = np.inf
+    min_ratio = np.inf
+
+    for start_i, end_i, start_j, end_j in tiles:
+        block_i = slice(start_i, end_i)
+        block_j = slice(start_j, end_j)
+
+        # direction vectors from body i to body j, along each axis
+        separations = [positions[np.newaxis, block_j, axis] - positions[block_i, axis, np.newaxis] for axis in range(dims)]
+        squared_distances = sum(separation**2 for separation in separations)
+
+        # within tiles on the diagonal, only the pairs (i,j) with i > j are distinct
+        if start_i == start_j:
+            pairs = np.tri(*squared_distances.shape, k = -1, dtype = bool)
+        else:
+            pairs = np.ones(shape = squared_distances.shape, dtype = bool)
+
+        # pairs are extracted row by row, so they are summed in the same order as pair_indices(n)
+        pair_distances = np.sqrt(squared_distances[pairs])
+
+        if len(pair_distances) == 0:
+            continue
+
+        min_distance = min(min_distance, np.min(pair_distances))
+
+        if velocities is not None:
+            velocity_differences = sum((velocities[np.newaxis, block_j, axis] - velocities[block_i, axis, np.newaxis])**2 for axis in range(dims))
+            pair_velocities = np.sqrt(velocity_differences[pairs])
+
+            # bodies moving with the same velocity never approach each other, so they don't restrict the timestep
+            ratios = np.divide(pair_distances, pair_velocities, out = np.full(len(pair_distances), np.inf), where = pair_velocities != 0)
+            min_ratio = min(min_ratio, np.min(ratios))
+
+        # bodies at the same position have no potential energy, as they exert no force on each other (see below)
+        pair_masses = (masses[block_i, np.newaxis] * masses[np.newaxis, block_j])[pairs]
+        gpe += np.sum(np.divide(pair_masses, pair_distances, out = np.zeros(len(pair_distances)), where = pair_distances != 0))
+
+        if total_acceleration is not None:
+            # pairs which aren't distinct, or bodies at the same position, are set to infinity so they exert no force
+            inv_dist_mag3 = np.where(pairs & (squared_distances != 0), squared_distances, np.inf)**(-1.5)
+
+            # by Newton's third law, j feels the same force as i, albeit in the opposite direction
+            for axis in range(dims):
+                acc_direction = inv_dist_mag3 * separations[axis]
+                total_acceleration[block_i, axis] += acc_direction @ masses[block_j]
+                total_acceleration[block_j, axis] -= masses[block_i] @ acc_direction
+
+    return gpe, min_distance, min_ratio
+
+def tiled_interactions(positions, masses, G = 1, memory = 2**26, acceleration = True, velocities = None, workers = 1, out = None):
+    """
+    Calculates the interactions between every distinct pair of bodies of a system by direct summation, in a single fused pass.
+    The (n x n) matrix of pairs is processed in square tiles which fit within a memory budget, so no O(n^2) array is ever built.
+    Only the tiles on or below the diagonal are computed: by Newton's third law, each tile above the diagonal mirrors one below it.
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param masses: an array with the mass of each body
+    :param G: constant of gravitation
+    :param memory: the maximum number of bytes used by the arrays of the tiles (shared between the workers)
+    :param acceleration: if False, the accelerations aren't calculated (i.e when only the GPE and collisions are needed)
+    :param velocities: an (n x d) matrix with the velocities of the bodies.
+                       If not None, the minimum ratio |dx|/|dv| between any 2 bodies (used for the adaptive timestep) is calculated
+    :param workers: the number of threads over which the tiles are split.
+                    Results are reproducible (bit for bit) for a given number of workers.
+    :param out: an (n x d) matrix of float64, into which the accelerations are written (so they aren't allocated). If None, a new matrix is created.
+    :return: a tuple, with the (n x d) matrix of accelerations (None if acceleration is False),
+             the GPE of the system, the minimum distance between any 2 bodies (infinity if there are less than 2 bodies),
+             and the minimum ratio |dx|/|dv| between any 2 bodies with different velocities (None if velocities is None)
+    """
+
+    # positions and velocities may be stored in single precision, but interactions are always accumulated in double precision
+    positions = np.asarray(positions, dtype = np.float64)
+
+    if velocities is not None:
+        velocities = np.asarray(velocities, dtype = np.float64)
+
+    n = len(positions)
+    tile = tile_size(memory / workers)
+
+    # with several workers, tiles are made small enough for every worker to process a few of them
+    if workers > 1:
+        tile = min(tile, max(1, -(-n // int(np.ceil(np.sqrt(8 * workers))))))
+
+    tiles = [(start_i, min(start_i + tile, n), start_j, min(start_j + tile, n))
+             for start_i in range(0, n, tile) for start_j in range(0, start_i + 1, tile)]
+
+    # tiles are assigned to the workers in a fixed (round robin) order, and each worker accumulates onto its own accelerations
+    # the results of the workers are then combined in a fixed order, so no result depends on the scheduling of the threads
+    worker_tiles = [tiles[worker::workers] for worker in range(workers)]
+    # the first worker accumulates onto the given matrix (if any)
+    if acceleration and out is not None:
+        out.fill(0)
+
+    worker_accelerations = [(out if worker == 0 and out is not None else np.zeros(shape = positions.shape)) if acceleration else None
+                            for worker in range(workers)]
+
+    if workers == 1:
+        worker_results = [tile_interactions(positions, masses, tiles, worker_accelerations[0], velocities)]
+    else:
+        worker_results = list(thread_pool(workers).map(
+            lambda worker: tile_interactions(positions, masses, worker_tiles[worker], worker_accelerations[worker], velocities),
+            range(workers)))
+
+    gpe = 0
+
+    for worker_gpe, _, _ in worker_results:
+        gpe += worker_gpe
+
+    min_distance = min(result[1] for result in worker_results)
+    min_ratio = None if velocities is None else min(result[2] for result in worker_results)
+
+    total_acceleration = worker_accelerations[0]
+
+    if acceleration:
+        for worker_acceleration in worker_accelerations[1:]:
+            total_acceleration += worker_acceleration
+
+        total_acceleration *= G
+
+    return total_acceleration, -G * gpe, min_distance, min_ratio
+
+def tile_acceleration_jerk(positions, velocities, masses, tiles, total_acceleration, total_jerk):
+    """
+    Calculates the accelerations and jerks (time derivatives of the accelerations) between the pairs of bodies of a list of tiles
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param velocities: an (n x d) matrix with the velocities of the bodies
+    :param masses: an array with the mass of each body
+    :param tiles: a list of tuples (start_i, end_i, start_j, end_j), with the bodies i and j of each tile, such that start_i >= start_j
+    :param total_acceleration: an (n x d) matrix, onto which the accelerations (for G = 1) are accumulated
+    :param total_jerk: an (n x d) matrix, onto which the jerks (for G = 1) are accumulated
+    :return: the minimum distance between any 2 bodies
+    """
+
+    dims = positions.shape[1]
+    min_distance = np.inf
+
+    for start_i, end_i, start_j, end_j in tiles:
+        block_i = slice(start_i, end_i)
+        block_j = slice(start_j, end_j)
+
+        # direction vectors and relative velocities from body i to body j, along each axis
+        separations = [positions[np.newaxis, block_j, axis] - positions[block_i, axis, np.newaxis] for axis in range(dims)]
+        velocity_differences = [velocities[np.newaxis, block_j, axis] - velocities[block_i, axis, np.newaxis] for axis in range(dims)]
+        squared_distances = sum(separation**2 for separation in separations)
+
+        # within tiles on the diagonal, only the pairs (i,j) with i > j are distinct
+        if start_i == start_j:
+            pairs = np.tri(*squared_distances.shape, k = -1, dtype = bool)
+        else:
+            pairs = np.ones(shape = squared_distances.shape, dtype = bool)
+
+        if not np.any(pairs):
+            continue
+
+        min_distance = min(min_distance, np.sqrt(np.min(squared_distances[pairs])))
+
+        # pairs which aren't distinct, or bodies at the same position, are set to infinity so they exert no force
+        squared_distances = np.where(pairs & (squared_distances != 0), squared_distances, np.inf)
+        inv_dist_mag3 = squared_distances**(-1.5)
+
+        # jerk of the pair: v/|r|^3 - 3(r.v)r/|r|^5
+        radial_velocities = 3 * sum(separation * velocity_difference for separation, velocity_difference in zip(separations, velocity_differences)) \
+                            * inv_dist_mag3 / squared_distances
+
+        # by Newton's third law, j feels the same force (and its derivative) as i, albeit in the opposite direction
+        for axis in range(dims):
+            acc_direction = inv_dist_mag3 * separations[axis]
+            jerk_direction = inv_dist_mag3 * velocity_differences[axis] - radial_velocities * separations[axis]
+            total_acceleration[block_i, axis] += acc_direction @ masses[block_j]
+            total_acceleration[block_j, axis] -= masses[block_i] @ acc_direction
+            total_jerk[block_i, axis] += jerk_direction @ masses[block_j]
+            total_jerk[block_j, axis] -= masses[block_i] @ jerk_direction
+
+    return min_distance
+
+def tiled_acceleration_jerk(positions, velocities, masses, G = 1, memory = 2**26):
+    """
+    Calculates the accelerations and jerks (time derivatives of the accelerations) of every body by direct summation,
+    in a single pass over every distinct pair of bodies, in tiles which fit within a memory budget (see tiled_interactions)
+    :param positions: an (n x d) matrix with the positions of the bodies (d = 3, or d = 2 for planar systems)
+    :param velocities: an (n x d) matrix with the velocities of the bodies
+    :param masses: an array with the mass of each body
+    :param G: constant of gravitation
+    :param memory: the maximum number of bytes used by the arrays of the tiles
+    :return: a tuple, with the (n x d) matrices of accelerations and jerks, and the minimum distance between any 2 bodies
+    """
+
+    # positions and velocities may be stored in single precision, but interactions are always accumulated in double precision
+    positions = np.asarray(positions, dtype = np.float64)
+    velocities = np.asarray(velocities, dtype = np.float64)
+
+    n = len(positions)
+
+    # each tile holds twice as many arrays as those of tiled_interactions (for the relative velocities)
+    tile = tile_size(memory / 2)
+    tiles = [(start_i, min(start_i + tile, n), start_j, min(start_j + tile, n))
+             for start_i in range(0, n, tile) for start_j in range(0, start_i + 1, tile)]
+
+    acceleration = np.zeros(shape = positions.shape)
+    jerk = np.zeros(shape = positions.shape)
+    min_distance = tile_acceleration_jerk(positions, velocities, masses, tiles, acceleration, jerk)
+
+    acceleration *= G
+    jerk *= G
+
+    return acceleration, jerk, min_distance
+
+def tracer_interactions(tracer_positions, positions, masses, G = 1, memory = 2**26, acceleration = True):
+    """
+    Calculates the interactions of massless tracers with the massive bodies of a system, in O(n_massive * n_tracers).
+    Tracers feel the gravity of the massive bodies, but exert no force (neither on the massive bodies, nor on each other).
+    The tracers are processed in blocks which fit within a memory budget, so no (n_tracers x n_massive) array is ever built.
+    :param tracer_positions: an (m x d) matrix with the positions of the tracers (d = 3, or d = 2 for planar systems)
+    :param positions: an (n x d) matrix with the positions of the massive bodies
+    :param masses: an array with the mass of each massive body
+    :param G: constant of gravitation
+    :param memory: the maximum number of bytes used by the arrays of each block
+    :param acceleration: if False, the accelerations aren't calculated (i.e when only collisions are checked)
+    :return: a tuple, with the (m x d) matrix of accelerations of the tracers (None if acceleration is False),
+             and an array with the distance from each tracer to its closest massive body
+    """
+
+    # positions may be stored in single precision, but interactions are always accumulated in double precision
+    tracer_positions = np.asarray(tracer_positions, dtype = np.float64)
+    positions = np.asarray(positions, dtype = np.float64)
+
+    m, dims = tracer_positions.shape
+    block = max(1, int(memory / (12 * 8 * max(len(positions), 1))))
+
+    total_acceleration = np.zeros(shape = (m, dims)) if acceleration else None
+    min_distances = np.full(m, np.inf)
+
+    if len(positions) == 0:
+        return total_acceleration, min_distances
+
+    for start in range(0, m, block):
+        tracers = slice(start, min(start + block, m))
+
+        # direction vectors from each tracer to each massive body, along each axis
+        separations = [positions[np.newaxis, :, axis] - tracer_positions[tracers, axis, np.newaxis] for axis in range(dims)]
+        squared_distances = sum(separation**2 for separation in separations)
+
+        min_distances[tracers] = np.sqrt(np.min(squared_distances, axis = 1))
+
+        if acceleration:
+            # tracers at the position of a massive body feel no force from it
+            inv_dist_mag3 = np.where(squared_distances != 0, squared_distances, np.inf)**(-1.5)
+
+            for axis in range(dims):
+                total_acceleration[tracers, axis] = (inv_dist_mag3 * separations[axis]) @ masses
+
+    if acceleration:
+        total_acceleration *= G
+
+    return total_acceleration, min_distances
+
+def expand_ranges(starts, counts):
+    """
+    Concatenates the integer ranges [starts[k], starts[k] + counts[k]) into a single array, without looping over the ranges
+    For example, expand_ranges([3, 10], [2, 3]) produces [3, 4, 10, 11, 12]
+    :param starts: the first integer of each range
+    :param counts: the number of integers in each range
+    :return: an array with sum(counts) integers
+    """
+
+    starts = np.asarray(starts, dtype = np.int64)
+    counts = np.asarray(counts, dtype = np.int64)
+
+    # shift a global counter, so that it restarts from the start of the corresponding range at every new range
+    shifts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+
+    return np.arange(np.sum(counts), dtype = np.int64) + shifts
+
+def box_pairs(starts_a, counts_a, starts_b, counts_b):
+    """
+    Enumerates every pair of elements between pairs of contiguous blocks, without looping over the blocks
+    For each k, pairs every element in [starts_a[k], starts_a[k] + counts_a[k]) with every element in [starts_b[k], starts_b[k] + counts_b[k])
+    :param starts_a: the first element of each block in the first set of blocks
+    :param counts_a: the number of elements of each block in the first set of blocks
+    :param starts_b: the first element of each block in the second set of blocks
+    :param counts_b: the number of elements of each block in the second set of blocks
+    :return: a tuple (a, b) of arrays, containing the elements of each pair
+    """
+
+    starts_a = np.asarray(starts_a, dtype = np.int64)
+    counts_b = np.asarray(counts_b, dtype = np.int64)
+    sizes = np.asarray(counts_a, dtype = np.int64) * counts_b
+
+    # index of each pair within the pairs of its blocks
+    local = expand_ranges(np.zeros_like(sizes), sizes)
+    repeated_counts_b = np.repeat(counts_b, sizes)
+
+    a = np.repeat(starts_a, sizes) + local // repeated_counts_b
+    b = np.repeat(np.asarray(starts_b, dtype = np.int64), sizes) + local % repeated_counts_b
+
+    return a, b
+
 def vec_cross(vec1, vec2):
     """
     Calculates cross product between 2 vectors
@@ -33,20 +464,56 @@ def vec_cross(vec1, vec2):
 
     return cross
 
-def mat_cross(mat1, mat2):
+def batch_cross(mat1, mat2, out = None):
     """
-    Calculates the cross product between 2 (n x 3) matrices,
+    Calculates the cross product between 2 stacks of vectors (i.e (B x n x 3) tensors, for B systems of n bodies),
+    Defined as the pairwise cross product of the vectors along the last axis, with one numpy call per component
+    :param out: a tensor of the same shape, into which the cross products are written. If None, a new tensor is created.
+    :return: a tensor of the same shape as mat1 and mat2, with the pairwise cross products of their vectors
+    """
+
+    batch_cross = np.zeros(shape = np.broadcast_shapes(np.shape(mat1), np.shape(mat2))) if out is None else out
+
+    batch_cross[..., 0] = mat1[..., 1] * mat2[..., 2] - mat1[..., 2] * mat2[..., 1]
+    batch_cross[..., 1] = mat1[..., 2] * mat2[..., 0] - mat1[..., 0] * mat2[..., 2]
+    batch_cross[..., 2] = mat1[..., 0] * mat2[..., 1] - mat1[..., 1] * mat2[..., 0]
+
+    return batch_cross
+
+def mat_cross(mat1, mat2, out = None):
+    """
+    Calculates the cross product between 2 (n x 3) matrices (see batch_cross),
     Defined as the pairwise cross product of the row vectors of the matrices
+    :param out: an (n x 3) matrix, into which the cross products are written. If None, a new matrix is created.
     :return: an (n x 3) matrix, with each row being the pairwise cross product of mat1 and mat2
     """
 
-    n = len(mat1)
-    mat_cross = np.zeros(shape = (n, 3))
+    return batch_cross(mat1, mat2, out = out)
 
-    for i in range(n):
-        mat_cross[i] = vec_cross(mat1[i], mat2[i])
+def batch_planar_cross(mat1, mat2, out = None):
+    """
+    Calculates the cross product between 2 stacks of vectors in the xy-plane (i.e (B x n x 2) tensors, for B systems of n bodies),
+    Defined as the pairwise cross product of the vectors along the last axis (which only has a z component)
+    :param out: a (B x n x 3) tensor, into which the cross products are written. If None, a new tensor is created.
+    :return: a (B x n x 3) tensor, with the pairwise cross products of the vectors of mat1 and mat2
+    """
+
+    batch_cross = np.zeros(shape = np.broadcast_shapes(np.shape(mat1), np.shape(mat2))[:-1] + (3,)) if out is None else out
 
-    return mat_cross
+    batch_cross[..., :2] = 0
+    batch_cross[..., 2] = mat1[..., 0] * mat2[..., 1] - mat1[..., 1] * mat2[..., 0]
+
+    return batch_cross
+
+def planar_cross(mat1, mat2, out = None):
+    """
+    Calculates the cross product between 2 (n x 2) matrices of vectors in the xy-plane (see batch_planar_cross),
+    Defined as the pairwise cross product of the row vectors of the matrices (which only has a z component)
+    :param out: an (n x 3) matrix, into which the cross products are written. If None, a new matrix is created.
+    :return: an (n x 3) matrix, with each row being the pairwise cross product of mat1 and mat2
+    """
+
+    return batch_planar_cross(mat1, mat2, out = out)
 
 def perc_change(initial, values, perc = False, init_val = 1):
     """
@@ -76,58 +543,104 @@ def perc_change(initial, values, perc = False, init_val = 1):
 
     return change
 
-def variable_delta(positions, velocities, adaptive_constant, delta_lim =10 ** -5):
+def batch_min_ratio(positions, velocities):
     """
-    Calculates variable delta for the system
-    :param positions: positions of bodies in the system
-    :param velocities: velocities of bodies in the system
+    Calculates the minimum ratio |dx|/|dv| between any 2 bodies with different velocities, for each of a stack of systems
+    Every pair of every system is processed at once, so (B x n(n-1)/2 x d) arrays are built (see tiled_interactions for large systems)
+    :param positions: a (B x n x d) tensor, with the positions of the bodies of each system
+    :param velocities: a (B x n x d) tensor, with the velocities of the bodies of each system
+    :return: an array with the minimum ratio of each system (infinity if no pair of bodies approaches each other)
+    """
+
+    i, j = pair_indices(positions.shape[1])
+
+    pair_distances = ten_norm(positions[:, j] - positions[:, i], axis = -1, sqrt = True)
+    pair_velocities = ten_norm(velocities[:, j] - velocities[:, i], axis = -1, sqrt = True)
+
+    # bodies moving with the same velocity never approach each other, so they don't restrict the timestep
+    ratios = np.divide(pair_distances, pair_velocities, out = np.full(pair_distances.shape, np.inf), where = pair_velocities != 0)
+
+    return np.min(ratios, axis = 1, initial = np.inf)
+
+def batch_variable_delta(positions, velocities, adaptive_constant, delta_lim = 10 ** -5, min_ratio = None):
+    """
+    Calculates variable delta for each of a stack of systems
+    :param positions: a (B x n x d) tensor, with the positions of the bodies of each system
+    :param velocities: a (B x n x d) tensor, with the velocities of the bodies of each system
     :param adaptive_constant: constant resizing factor for variable delta
-    :param delta_lim: smallest value allowed for the variable delta
-    :return: the calculated variable delta for the system
+    :param delta_lim: smallest value allowed for the variable delta (of any system)
+    :param min_ratio: an array with the minimum ratio |dx|/|dv| between any 2 bodies of each system, if it has already been calculated.
+                      If None, it is calculated from the positions and velocities (see batch_min_ratio)
+    :return: an array with the calculated variable delta of each system
     """
 
-    # check: positions and velocities are of the same size
-    n = len(positions)
+    positions = np.asarray(positions)
+    velocities = np.asarray(velocities)
 
-    assert n == len(velocities)
+    # check: positions and velocities are of the same size
+    assert positions.shape[:2] == velocities.shape[:2]
 
     # if only 1 body, then variable delta is the ratio of position magnitude to velocity magnitude, multiplied by adaptive_constant
-    if n == 1:
-        delta_x = ten_norm(positions[0], sqrt = True, axis = 0)
-        delta_v = ten_norm(velocities[0], sqrt=True, axis=0)
+    if positions.shape[1] == 1:
+        delta_x = ten_norm(positions[:, 0], sqrt = True, axis = -1)
+        delta_v = ten_norm(velocities[:, 0], sqrt = True, axis = -1)
         return adaptive_constant * delta_x / delta_v
 
-    # create an (n x n) array to hold all calculated deltas for the system
-    potential_deltas = np.ones(shape = (n, n))*np.inf
-
-    # fill potential deltas with the ratio of position magnitude to velocity magnitude
-    for i in range(n):
-        for j in range(i):
-                delta_x = ten_norm((positions[i] - positions[j]), sqrt = True, axis = 0)
-                delta_v = ten_norm((velocities[i] - velocities[j]), sqrt = True, axis = 0)
-                # entry (i,j) will be the same as (j,i) as we just consider magnitudes
-                potential_deltas[i, j] = np.divide(delta_x, delta_v, where = delta_v != 0)
-                potential_deltas[j, i] = potential_deltas[i, j]
+    # smallest ratio of position magnitude to velocity magnitude, over every distinct pair of bodies
+    if min_ratio is None:
+        min_ratio = batch_min_ratio(positions, velocities)
 
-    # variable delta will be the smallest delta within potential_deltas, multiplied by adaptive_constant
-    variable_delta = adaptive_constant * np.amin(potential_deltas)
+    # variable delta will be the smallest ratio, multiplied by adaptive_constant
+    variable_delta = adaptive_constant * np.asarray(min_ratio)
 
     # check; if delta is provided, ensure that the calculated variable delta does not become smaller than the minimum allowed
     if delta_lim is not None:
-        check_exception(variable_delta > delta_lim, SmallAdaptiveDeltaException, f"Adaptive delta was made too small ({variable_delta}) - orbit unfeasible")
+        check_exception(np.all(variable_delta > delta_lim), SmallAdaptiveDeltaException,
+                        lambda: f"Adaptive delta was made too small ({np.min(variable_delta)}, for system {np.argmin(variable_delta)}) - orbit unfeasible")
 
     return variable_delta
 
-def get_relative_normalised_positions(positions):
+def variable_delta(positions, velocities, adaptive_constant, delta_lim =10 ** -5, min_ratio = None):
+    """
+    Calculates variable delta for the system (see batch_variable_delta)
+    :param positions: positions of bodies in the system
+    :param velocities: velocities of bodies in the system
+    :param adaptive_constant: constant resizing factor for variable delta
+    :param delta_lim: smallest value allowed for the variable delta
+    :param min_ratio: the minimum ratio |dx|/|dv| between any 2 bodies, if it has already been calculated (i.e by tiled_interactions)
+                      If None, it is calculated from the positions and velocities
+    :return: the calculated variable delta for the system
+    """
+
+    # check: positions and velocities are of the same size
+    n = len(positions)
+
+    assert n == len(velocities)
+
+    # a single system is processed in memory bounded tiles, rather than building every pair at once
+    if n > 1 and min_ratio is None:
+        min_ratio = tiled_interactions(positions, np.ones(n), acceleration = False, velocities = velocities)[3]
+
+    return batch_variable_delta(np.asarray(positions)[np.newaxis], np.asarray(velocities)[np.newaxis], adaptive_constant, delta_lim = delta_lim,
+                                min_ratio = None if min_ratio is None else np.array([min_ratio]))[0]
+
+def batch_relative_normalised_positions(positions):
+    """
+    Calculates the normalised shape coordinates of a stack of 3-body trajectories
+    :param positions: a (B x 3 x steps x d) tensor, with the orbits of the 3 bodies of each system
+    :return: a tuple (X_1, X_2) of (B x steps) matrices, with the distances |r_1 - r_2| and |r_2 - r_3|
+             divided by the perimeter of the triangle of the bodies, at each step of each system
+    """
+
     # get the relative positions of the bodies
-    R_1 = positions[0,:,:] - positions[1,:,:]
-    R_2 = positions[1,:,:] - positions[2,:,:]
-    R_3 = positions[0,:,:] - positions[2,:,:]
+    R_1 = positions[:, 0] - positions[:, 1]
+    R_2 = positions[:, 1] - positions[:, 2]
+    R_3 = positions[:, 0] - positions[:, 2]
 
     # get scaling factor
-    norm_R_1 = ten_norm(R_1, axis = 1, sqrt = True)
-    norm_R_2 = ten_norm(R_2, axis = 1, sqrt = True)
-    norm_R_3 = ten_norm(R_3, axis = 1, sqrt = True)
+    norm_R_1 = ten_norm(R_1, axis = -1, sqrt = True)
+    norm_R_2 = ten_norm(R_2, axis = -1, sqrt = True)
+    norm_R_3 = ten_norm(R_3, axis = -1, sqrt = True)
     N = norm_R_1 + norm_R_2 + norm_R_3
 
     # get the new coordinates
@@ -136,6 +649,16 @@ def get_relative_normalised_positions(positions):
 
     return X_1, X_2
 
+def get_relative_normalised_positions(positions):
+    """
+    Calculates the normalised shape coordinates of a single (3 x steps x d) trajectory (see batch_relative_normalised_positions)
+    :return: a tuple (X_1, X_2) of arrays, with a coordinate for each step
+    """
+
+    X_1, X_2 = batch_relative_normalised_positions(positions[np.newaxis])
+
+    return X_1[0], X_2[0]
+
 def pair_encoder(x, y):
     return 0.5*(x + y)*(x + y + 1) + y
 
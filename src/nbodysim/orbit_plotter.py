@@ -34,7 +34,9 @@ class OrbitPlotter:
 
         # take properties of Integrator (used in calculations when plotting)
         self.n = integrator.nbody.n
-        self.position_orbit = integrator.position_orbit
+        # only the orbits of the massive bodies are plotted (the rows of any tracers follow them)
+        self.position_orbit = self.get_spatial_orbit(integrator.position_orbit[:self.n])
+        self.velocity_orbit = self.get_spatial_orbit(integrator.velocity_orbit[:self.n])
         self.delta = integrator.delta
         self.steps = integrator.steps
 
@@ -48,6 +50,18 @@ class OrbitPlotter:
         # set up the figure for plotting
         self.set_fig()
 
+    def get_spatial_orbit(self, orbit):
+        """
+        Planar systems store (n x steps x 2) orbits, so a z component of 0 is added to plot them alongside 3D systems
+        :param orbit: an (n x steps x d) tensor with the positions (or velocities) of the bodies throughout the orbit
+        :return: an (n x steps x 3) tensor with the same orbit
+        """
+
+        if orbit.shape[2] == 3:
+            return orbit
+
+        return np.concatenate([orbit, np.zeros(shape = orbit.shape[:2] + (1,), dtype = orbit.dtype)], axis = 2)
+
     def generate_colour(self):
         """
         Uses the seed from init to generate a random list of n colours, one for each orbit
@@ -372,9 +386,9 @@ class OrbitPlotter:
         self.plot_dim(self.position_orbit, dim = 2, ax = ax_position_z, title = r"Position $z$")
 
         # plot velocities over time
-        self.plot_dim(self.integrator.velocity_orbit, dim = 0, ax=ax_velocity_x, title = r"Velocity $x$")
-        self.plot_dim(self.integrator.velocity_orbit, dim = 1, ax = ax_velocity_y, title = r"Velocity $y$")
-        self.plot_dim(self.integrator.velocity_orbit, dim = 2, ax = ax_velocity_z, title = r"Velocity $z$")
+        self.plot_dim(self.velocity_orbit, dim = 0, ax=ax_velocity_x, title = r"Velocity $x$")
+        self.plot_dim(self.velocity_orbit, dim = 1, ax = ax_velocity_y, title = r"Velocity $y$")
+        self.plot_dim(self.velocity_orbit, dim = 2, ax = ax_velocity_z, title = r"Velocity $z$")
 
         # if required, plot the adaptive delta
         if self.integrator.adaptive:
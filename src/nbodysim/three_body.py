@@ -35,7 +35,7 @@ def get_euler_nbod(r_1: np.array, masses, G = 1):
     # initialise velocities for simulation
     init_velocities = np.array([[0,0,0], init_velocity, -init_velocity])
 
-    return NBody(init_positions, init_velocities, masses, escape_tolerance=-1)
+    return NBody(init_positions, init_velocities, masses, escape_tolerance=-1, planar = True)
 
 # ------------------------------ LAGRANGE ------------------------------
 
@@ -78,7 +78,7 @@ def get_lagrange_nbod(r_1: np.array, mass, G = 1):
     init_positions = np.array([r_1, r_2, r_3])
     init_velocities = np.array([v_1, R @ v_1, R @ (R @ v_1)])
 
-    return NBody(init_positions, init_velocities, mass*np.ones(shape = (3,)), escape_tolerance=-1)
+    return NBody(init_positions, init_velocities, mass*np.ones(shape = (3,)), escape_tolerance=-1, planar = True)
 
 # ------------------------------ FIGURE 8 ------------------------------
 
@@ -92,7 +92,7 @@ m = 1
 def get_og_figure_8():
     return NBody(np.array([r_1, -r_1, [0, 0, 0]]),
                      np.array([v_2, v_2, v_3]),
-                     m * np.ones(shape=(3,)), collision_tolerance=None)
+                     m * np.ones(shape=(3,)), collision_tolerance=None, planar = True)
 
 
 
@@ -113,7 +113,7 @@ def get_figure_8(v_1, y_1, collision_tolerance = 10**(-4), escape_tolerance = 10
     # calculate the x-coordinate of position of one of the side bodies given the desired velocity and y-coordinate
     # ensures that energy is conserved
     squared_x_component = (5/(2*(3*m*nm.ten_norm(v_1, axis = 0, sqrt = False) - E_0))) ** 2 - y_1 ** 2
-    check_exception(squared_x_component >= 0, Figure8InitException, msg = f"Attempted to root {squared_x_component} when initialising Figure 8")
+    check_exception(squared_x_component >= 0, Figure8InitException, msg = lambda: f"Attempted to root {squared_x_component} when initialising Figure 8")
     x_component = np.sqrt(squared_x_component)
 
     # compute initial velocities of the 3 bodies
@@ -125,7 +125,8 @@ def get_figure_8(v_1, y_1, collision_tolerance = 10**(-4), escape_tolerance = 10
     # compute initial positions of the 3 bodies
     init_positions = np.array([x_1, -x_1, [0,0,0]])
 
-    nbod = NBody(init_positions, init_velocities, m*np.ones(shape = (3,)), collision_tolerance=collision_tolerance, escape_tolerance=escape_tolerance)
+    # the Figure 8 is confined to the xy-plane, so it uses the planar fast path (i.e for stability sweeps)
+    nbod = NBody(init_positions, init_velocities, m*np.ones(shape = (3,)), collision_tolerance=collision_tolerance, escape_tolerance=escape_tolerance, planar = True)
 
     assert abs(nbod.energy - E_0) < 10**(-6)
 
@@ -0,0 +1,32 @@
+import numpy as np
+
+class Workspace:
+    """
+    Class holding preallocated arrays, which are reused across the steps of a simulation (via out= arithmetic),
+    so that no temporary arrays are created in steady state.
+    Arrays are allocated on first request, and only reallocated if their shape or data type changes.
+    Arrays are overwritten by the next step using them, so they must be copied to be kept.
+    """
+
+    def __init__(self):
+        # preallocated arrays, by name and data type
+        self.arrays = {}
+
+    def get(self, name, shape, dtype = np.float64):
+        """
+        Provides a preallocated array (its values are those left by its last use)
+        :param name: the name of the array
+        :param shape: the shape of the array
+        :param dtype: the data type of the array
+        :return: the array
+        """
+
+        # arrays are stored by name and data type, so only their shape is compared (comparing data types is comparatively slow)
+        key = (name, dtype)
+        array = self.arrays.get(key)
+
+        if array is None or array.shape != shape:
+            array = np.empty(shape, dtype = dtype)
+            self.arrays[key] = array
+
+        return array
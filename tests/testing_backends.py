@@ -0,0 +1,210 @@
+import json
+import os
+import tempfile
+
+import numpy as np
+from numpy import testing
+
+import nmath as nm
+import nbody
+from nbody import NBody
+from backends.barnes_hut import BarnesHut
+from backends.fmm import FMM
+from backends.particle_mesh import ParticleMesh
+from backends.direct import TiledDirect, VectorisedDirect, CompiledDirect
+from backends import registry
+from integrators.leapfrog_3 import Leapfrog3
+
+DP = 12
+
+np.random.seed(42)
+
+N = 200
+positions = np.random.normal(size = (N, 3))
+velocities = 0.1 * np.random.normal(size = (N, 3))
+masses = np.random.uniform(0.5, 1.5, size = N) / N
+
+def test_barnes_hut():
+    direct_acceleration = nm.direct_acceleration(positions, masses)
+
+    # TEST: NO NODE IS APPROXIMATED WITH OPENING ANGLE 0 -> SAME AS DIRECT SUMMATION
+    testing.assert_array_almost_equal(BarnesHut(theta = 0).get_acceleration(positions, masses), direct_acceleration, DP)
+
+    # TEST: FORCE ERROR DECREASES WITH THE OPENING ANGLE
+    errors = [np.max(BarnesHut(theta = theta).get_force_error(positions, masses)) for theta in [1, 0.5, 0.2]]
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[1] < 0.05
+
+    # TEST: WALKING THE OCTREE IN CHUNKS PRODUCES THE SAME ACCELERATIONS
+    testing.assert_array_almost_equal(BarnesHut(theta = 0.5).get_acceleration(positions, masses),
+                                      BarnesHut(theta = 0.5, chunk_size = 7).get_acceleration(positions, masses), DP)
+
+def test_barnes_hut_nbody():
+    nbod = NBody(positions, velocities, masses, collision_tolerance = None, backend = BarnesHut(theta = 0.5))
+
+    assert np.max(nbod.get_force_error()) < 0.05
+
+    leapfrog = Leapfrog3(nbody = nbod, steps = 10, delta = 10**-3, tolerance = 10**-3)
+    leapfrog.get_orbits()
+
+    assert leapfrog.integrated
+
+def test_fmm():
+    # TEST: TAYLOR COEFFICIENTS OF 1/|R| MATCH THE DERIVATIVES OF 1/|R|
+    fmm = FMM(order = 2)
+    R = np.array([[1, -2, 0.5]])
+    R_mag = nm.ten_norm(R, axis = 1, sqrt = True)[0]
+    coefficients = fmm.taylor_coefficients(R)[0]
+    testing.assert_almost_equal(coefficients[0], 1/R_mag, DP)
+    testing.assert_array_almost_equal(coefficients[1:4], -R[0]/R_mag**3, DP)
+    testing.assert_almost_equal(coefficients[4], (3*R[0, 0]**2/R_mag**5 - 1/R_mag**3)/2, DP)
+
+    # TEST: ACCURACY INCREASES WITH THE ORDER OF THE EXPANSIONS
+    errors = [np.max(FMM(order = order).get_force_error(positions, masses)) for order in [2, 4, 6]]
+    assert errors[0] > errors[1] > errors[2]
+    assert errors[2] < 0.01
+
+    # TEST: POTENTIAL OF EACH BODY
+    i, j = nm.pair_indices(N)
+    inv_distances = 1 / nm.ten_norm(positions[j] - positions[i], axis = 1, sqrt = True)
+    direct_potential = -(np.bincount(i, weights = masses[j] * inv_distances, minlength = N)
+                         + np.bincount(j, weights = masses[i] * inv_distances, minlength = N))
+    testing.assert_allclose(FMM(order = 6).get_potential(positions, masses), direct_potential, rtol = 10**-3)
+
+    # TEST: SYSTEMS WITHIN A SINGLE LEAF ARE SUMMED DIRECTLY, SO THEY ARE EXACT FOR ANY ORDER
+    testing.assert_array_almost_equal(FMM(order = 2).get_acceleration(positions[:3], masses[:3]), nm.direct_acceleration(positions[:3], masses[:3]), DP)
+    testing.assert_allclose(FMM(order = 2, leaf_size = N).get_potential(positions, masses), direct_potential, rtol = 10**-12)
+
+def test_fmm_nbody():
+    nbod = NBody(positions, velocities, masses, collision_tolerance = None)
+    nbod_fmm = NBody(positions, velocities, masses, collision_tolerance = None, backend = FMM(order = 6))
+
+    # TEST: GPE CALCULATED FROM THE POTENTIALS
+    testing.assert_allclose(nbod_fmm.gpe, nbod.gpe, rtol = 10**-5)
+
+    leapfrog = Leapfrog3(nbody = nbod_fmm, steps = 10, delta = 10**-3, tolerance = 10**-3)
+    leapfrog.get_orbits()
+
+    assert leapfrog.integrated
+
+def test_particle_mesh():
+    i, j = nm.pair_indices(N)
+    inv_distances = 1 / nm.ten_norm(positions[j] - positions[i], axis = 1, sqrt = True)
+    direct_potential = -(np.bincount(i, weights = masses[j] * inv_distances, minlength = N)
+                         + np.bincount(j, weights = masses[i] * inv_distances, minlength = N))
+
+    for scheme in ParticleMesh.schemes:
+        # TEST: ACCURACY INCREASES WITH THE SIZE OF THE GRID
+        errors = [np.median(ParticleMesh(grid_size = grid_size, scheme = scheme).get_force_error(positions, masses))
+                  for grid_size in [16, 32, 64]]
+        assert errors[0] > errors[1] > errors[2]
+
+        # TEST: POTENTIAL OF EACH BODY (WITHOUT THE POTENTIAL INDUCED ON ITSELF)
+        potential = ParticleMesh(grid_size = 64, scheme = scheme).get_potential(positions, masses)
+        assert np.median(np.abs(potential / direct_potential - 1)) < 0.01
+
+def test_particle_mesh_nbody():
+    nbod = NBody(positions, velocities, masses, collision_tolerance = None)
+    nbod_pm = NBody(positions, velocities, masses, backend = ParticleMesh(grid_size = 64))
+
+    # TEST: COLLISIONS AREN'T CONSIDERED
+    assert nbod_pm.collision_tolerance is None
+
+    # TEST: GPE CALCULATED FROM THE POTENTIALS
+    testing.assert_allclose(nbod_pm.gpe, nbod.gpe, rtol = 10**-2)
+
+    leapfrog = Leapfrog3(nbody = nbod_pm, steps = 10, delta = 10**-3, tolerance = 10**-3)
+    leapfrog.get_orbits()
+
+    assert leapfrog.integrated
+
+def test_direct_backends():
+    interactions = nm.tiled_interactions(positions, masses, velocities = velocities)
+
+    for backend in [TiledDirect(), TiledDirect(memory = 2**12, workers = 3), VectorisedDirect(), CompiledDirect()]:
+        # TEST: SAME INTERACTIONS AS NM.TILED_INTERACTIONS
+        backend_interactions = backend.get_interactions(positions, masses, velocities = velocities)
+        testing.assert_allclose(backend_interactions[0], interactions[0], rtol = 10**-12)
+        testing.assert_allclose(backend_interactions[1:], interactions[1:], rtol = 10**-12)
+
+        # TEST: ACCELERATIONS AND RATIOS ONLY CALCULATED WHEN REQUIRED
+        assert backend.get_interactions(positions, masses, acceleration = False)[0] is None
+        assert backend.get_interactions(positions, masses)[3] is None
+
+        # TEST: COINCIDENT BODIES EXERT NO FORCE AND HAVE NO POTENTIAL ENERGY, AS WITH NM.TILED_INTERACTIONS
+        coincident = np.vstack([positions, positions[:1]])
+        with np.errstate(all = "raise"):
+            coincident_interactions = backend.get_interactions(coincident, np.append(masses, 1.0))
+
+        testing.assert_allclose(coincident_interactions[1], nm.tiled_interactions(coincident, np.append(masses, 1.0))[1], rtol = 10**-12)
+        assert np.isfinite(coincident_interactions[0]).all()
+
+def test_direct_backends_nbody():
+    nbod = NBody(positions, velocities, masses, collision_tolerance = None)
+    nbod_vectorised = NBody(positions, velocities, masses, collision_tolerance = None, backend = "direct-vectorised")
+
+    # TEST: NAMED BACKEND CREATED FROM THE REGISTRY, WITH THE SAME ENERGY
+    assert isinstance(nbod_vectorised.backend, nbody.registry.VectorisedDirect)
+    testing.assert_allclose(nbod_vectorised.energy, nbod.energy, rtol = 10**-12)
+
+    leapfrog = Leapfrog3(nbody = nbod, steps = 10, delta = 10**-3, tolerance = 10**-3)
+    leapfrog_vectorised = Leapfrog3(nbody = nbod_vectorised, steps = 10, delta = 10**-3, tolerance = 10**-3)
+    leapfrog.get_orbits()
+    leapfrog_vectorised.get_orbits()
+
+    testing.assert_allclose(leapfrog_vectorised.position_orbit, leapfrog.position_orbit, rtol = 10**-10)
+
+    # TEST: PLANAR SYSTEMS SUPPORTED BY DIRECT BACKENDS
+    planar_positions = positions * np.array([1, 1, 0])
+    planar_velocities = velocities * np.array([1, 1, 0])
+    assert NBody(planar_positions, planar_velocities, masses, collision_tolerance = None, backend = "direct-compiled", planar = None).planar
+
+def test_registry():
+    with tempfile.TemporaryDirectory() as directory:
+        check_registry(os.path.join(directory, "autotune.json"))
+
+def check_registry(path):
+    # TEST: ONLY EXACT BACKENDS CONSIDERED BY DEFAULT, THREADS ONLY WITH SEVERAL WORKERS
+    candidates = registry.get_candidates(N)
+    assert "barnes-hut" not in candidates and "direct-threaded" not in candidates and "direct-tiled" in candidates
+    assert "barnes-hut" in registry.get_candidates(N, exact = False) and "direct-threaded" in registry.get_candidates(N, workers = 2)
+
+    # TEST: FASTEST BACKEND CACHED ON DISK, AND REUSED BY LATER CALLS
+    fastest = registry.autotune(N, repeats = 1, path = path)
+    cache = registry.load_cache(path)
+    key = registry.get_cache_key(N)
+    assert cache[key]["backend"] == fastest and set(cache[key]["timings"]) == set(candidates)
+
+    cache[key]["backend"] = "direct-tiled"
+    with open(path, "w") as file:
+        json.dump(cache, file)
+    assert registry.autotune(N, path = path) == "direct-tiled"
+
+    # TEST: SYSTEMS OF SIMILAR SIZE SHARE THE SAME RESULT
+    assert registry.get_cache_key(N + 10) == key and registry.get_cache_key(N, precision = "mixed") != key
+
+    # TEST: "AUTO" BACKEND USES THE CACHED RESULT
+    cache_file = nbody.registry.cache_file
+    nbody.registry.cache_file = path
+    try:
+        assert isinstance(NBody(positions, velocities, masses, collision_tolerance = None, backend = "auto").backend, nbody.registry.TiledDirect)
+    finally:
+        nbody.registry.cache_file = cache_file
+
+    # TEST: CORRUPT (I.E TRUNCATED) CACHE IS IGNORED AND REPLACED, WITHOUT LEAVING TEMPORARY FILES
+    with open(path, "w") as file:
+        file.write(json.dumps(cache)[:20])
+    assert registry.load_cache(path) == {}
+    assert registry.autotune(N, repeats = 1, path = path) in candidates
+    assert key in registry.load_cache(path) and os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+def test_main():
+    test_barnes_hut()
+    test_barnes_hut_nbody()
+    test_fmm()
+    test_fmm_nbody()
+    test_particle_mesh()
+    test_particle_mesh_nbody()
+    test_direct_backends()
+    test_direct_backends_nbody()
+    test_registry()
@@ -0,0 +1,80 @@
+import numpy as np
+from numpy import testing
+
+import nmath as nm
+from nbody import NBody
+from collisions import CollisionGrid
+from nbodysim.exceptions import BodyCollisionException
+
+np.random.seed(42)
+
+N = 500
+TOLERANCE = 0.05
+positions = np.random.uniform(-1, 1, size = (N, 3))
+
+def brute_force_pairs(positions, radius):
+    i, j = nm.pair_indices(len(positions))
+    close = nm.ten_norm(positions[j] - positions[i], axis = 1, sqrt = True) <= radius
+
+    return {(min(a, b), max(a, b)) for a, b in zip(i[close], j[close])}
+
+def test_collision_grid_pairs():
+    grid = CollisionGrid()
+    i, j = grid.get_cell_pairs(positions, 2 * TOLERANCE)
+
+    # TEST: EVERY PAIR WITHIN THE SIDE OF A CELL IS FOUND, AND NO PAIR IS REPEATED
+    cell_pairs = {(min(a, b), max(a, b)) for a, b in zip(i, j)}
+    assert len(cell_pairs) == len(i)
+    assert brute_force_pairs(positions, 2 * TOLERANCE) <= cell_pairs
+
+    # TEST: NEIGHBOUR LIST CONTAINS EXACTLY THE PAIRS WITHIN COLLISION_TOLERANCE + SKIN
+    grid.update_neighbours(positions, TOLERANCE)
+    assert {(min(a, b), max(a, b)) for a, b in zip(grid.pairs_i, grid.pairs_j)} == brute_force_pairs(positions, 2 * TOLERANCE)
+
+    # TEST: SAME PAIRS FOR PLANAR SYSTEMS
+    i, j = grid.get_cell_pairs(positions[:, :2], 2 * TOLERANCE)
+    assert brute_force_pairs(positions[:, :2], 2 * TOLERANCE) <= {(min(a, b), max(a, b)) for a, b in zip(i, j)}
+
+def test_collision_grid_check():
+    grid = CollisionGrid()
+
+    # keep a subset of bodies which are all further than the tolerance from each other
+    i, j = nm.pair_indices(N)
+    too_close = nm.ten_norm(positions[j] - positions[i], axis = 1, sqrt = True) < TOLERANCE
+    separated = np.delete(positions, np.unique(i[too_close]), axis = 0)
+    i, j = nm.pair_indices(len(separated))
+    min_distance = np.min(nm.ten_norm(separated[j] - separated[i], axis = 1, sqrt = True))
+
+    # TEST: MINIMUM DISTANCE FOUND, WITHOUT A COLLISION
+    testing.assert_almost_equal(grid.check(separated, TOLERANCE), min_distance, 15)
+
+    # TEST: NEIGHBOUR LIST REUSED WHILE BODIES MOVE LESS THAN SKIN/2, AND REBUILT OTHERWISE
+    reference_positions = grid.reference_positions
+    grid.check(separated + 0.2 * TOLERANCE, TOLERANCE)
+    assert grid.reference_positions is reference_positions
+    grid.check(separated + TOLERANCE, TOLERANCE)
+    assert grid.reference_positions is not reference_positions
+
+    # TEST: COLLISION RAISED, IDENTIFYING THE PAIR OF BODIES
+    collided = np.array(separated)
+    collided[7] = collided[3] + 0.1 * TOLERANCE
+    testing.assert_raises_regex(BodyCollisionException, "between bodies (3 and 7|7 and 3)", grid.check, collided, TOLERANCE)
+
+def test_nbody_collisions():
+    velocities = np.zeros(shape = (N, 3))
+    masses = np.ones(N) / N
+
+    nbod = NBody(positions, velocities, masses, collision_tolerance = 10**-3)
+
+    # TEST: COLLISIONS OF THE SIMULATION DETECTED BY THE GRID, IDENTIFYING THE PAIR OF BODIES
+    collided = np.array(nbod.positions)
+    collided[1] = collided[0]
+    testing.assert_raises_regex(BodyCollisionException, "between bodies (0 and 1|1 and 0)", nbod.check_collision, None, collided)
+
+    # TEST: COLLISIONS DETECTED BY A PASS OVER EVERY PAIR ARE ALSO IDENTIFIED
+    testing.assert_raises_regex(BodyCollisionException, "between bodies (0 and 1|1 and 0)", nbod.get_acceleration, collided)
+
+def test_main():
+    test_collision_grid_pairs()
+    test_collision_grid_check()
+    test_nbody_collisions()
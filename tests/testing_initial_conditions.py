@@ -0,0 +1,78 @@
+import numpy as np
+from numpy import testing
+
+import nmath as nm
+import initial_conditions as ic
+
+DP = 12
+
+N = 2000
+generators = [ic.plummer_sphere, ic.king_model, ic.uniform_sphere, ic.rotating_disc, ic.hierarchical_multiple]
+
+def virial_ratio(positions, velocities, masses, G = 1):
+    kinetic_energy = 0.5 * np.sum(masses * nm.ten_norm(velocities, axis = 1, sqrt = False))
+    gpe = nm.tiled_interactions(positions, masses, acceleration = False, G = G)[1]
+
+    return 2 * kinetic_energy / abs(gpe)
+
+def test_generators():
+    for generator in generators:
+        positions, velocities, masses = generator(N, mass = 2)
+
+        # TEST: N BODIES WITH THE GIVEN TOTAL MASS, IN THE COM FRAME
+        assert positions.shape == velocities.shape == (N, 3) and masses.shape == (N,)
+        testing.assert_almost_equal(np.sum(masses), 2, DP)
+        testing.assert_array_almost_equal(masses @ positions, np.zeros(3), DP)
+        testing.assert_array_almost_equal(masses @ velocities, np.zeros(3), DP)
+
+        # TEST: SAME SYSTEM FOR THE SAME SEED, AND A DIFFERENT ONE OTHERWISE
+        testing.assert_array_equal(generator(N, mass = 2)[0], positions)
+        assert not np.array_equal(generator(N, mass = 2, seed = 7)[0], positions)
+
+def test_equilibrium():
+    # TEST: PLUMMER SPHERES, KING MODELS AND HIERARCHICAL MULTIPLES START IN VIRIAL EQUILIBRIUM (2K = |W|)
+    testing.assert_allclose(virial_ratio(*ic.plummer_sphere(N)), 1, atol = 0.05)
+    testing.assert_allclose(virial_ratio(*ic.plummer_sphere(N, mass = 3, scale_radius = 0.5, G = 2), G = 2), 1, atol = 0.05)
+
+    for W0 in [1, 6, 12]:
+        testing.assert_allclose(virial_ratio(*ic.king_model(N, W0 = W0)), 1, atol = 0.05)
+
+    for n in [2, 3, 5, 8]:
+        testing.assert_allclose(virial_ratio(*ic.hierarchical_multiple(n)), 1, atol = 10**-2)
+
+    # TEST: KING MODELS ARE TRUNCATED AT THEIR TIDAL RADIUS (UP TO THE SHIFT TO THE COM FRAME)
+    radii, W, enclosed_mass = ic.king_profile(6)
+    assert W[-1] == 0 and np.all(np.diff(enclosed_mass) > 0)
+    assert np.max(nm.ten_norm(ic.king_model(N, W0 = 6)[0], axis = 1)) <= radii[-1] * 1.05
+
+    # TEST: COLD SPHERES AT REST WITHIN THEIR RADIUS (UP TO THE SHIFT TO THE COM FRAME)
+    positions, velocities, _ = ic.uniform_sphere(N, radius = 3)
+    assert not np.any(velocities) and np.max(nm.ten_norm(positions, axis = 1)) <= 3 * 1.05
+
+    # TEST: DISCS IN THE XY-PLANE, ROTATING IN THE SAME DIRECTION ON CIRCULAR ORBITS AROUND THE CENTRAL BODY
+    positions, velocities, masses = ic.rotating_disc(N, central_mass = 10)
+    assert not np.any(positions[:, 2]) and not np.any(velocities[:, 2])
+    assert np.all(nm.planar_cross(positions[1:, :2], velocities[1:, :2])[:, 2] > 0)
+    assert masses[0] == 10 and len(masses) == N
+
+def test_get_nbod():
+    # TEST: READY TO INTEGRATE NBODY INSTANCES, WITH PARAMETERS PASSED TO NBODY
+    nbod = ic.get_plummer_nbod(100, precision = "mixed")
+    assert nbod.n == 100 and nbod.precision == "mixed"
+    testing.assert_array_almost_equal(nbod.positions, ic.plummer_sphere(100)[0], 6)
+
+    assert ic.get_rotating_disc_nbod(100).planar
+    assert not ic.get_rotating_disc_nbod(100, planar = False).planar
+    assert ic.get_king_nbod(100).n == ic.get_uniform_sphere_nbod(100).n == ic.get_hierarchical_nbod(100).n == 100
+
+def test_large_n():
+    # TEST: LARGE SYSTEMS BUILT WITHOUT LOOPING OVER THE BODIES
+    for generator in generators:
+        positions, velocities, masses = generator(10**5)
+        assert positions.shape == (10**5, 3) and np.all(np.isfinite(positions)) and np.all(np.isfinite(velocities))
+
+def test_main():
+    test_generators()
+    test_equilibrium()
+    test_get_nbod()
+    test_large_n()
@@ -1,9 +1,24 @@
+import warnings
+
 import numpy as np
 from numpy import testing
 
 import nmath as nm
+import jit_kernels as jk
 from nbody import NBody
 from integrators.leapfrog_3 import Leapfrog3
+from integrators.composition import Composition
+from integrators.forest_ruth import ForestRuth
+from integrators.yoshida_6 import Yoshida6
+from integrators.blanes_moan import BlanesMoan
+from integrators.hermite import Hermite
+from integrators.ias15 import IAS15
+from integrators.bulirsch_stoer import BulirschStoer
+from integrators.dormand_prince_5 import DormandPrince5
+from integrators.dormand_prince_8 import DormandPrince8
+from integrators.reducers import Reducer, MaxAbs, Moments, Histogram, Sample
+from backends.barnes_hut import BarnesHut
+from nbodysim.exceptions import EnergyNotConservedException, check_exception
 
 DP = 15
 
@@ -106,6 +121,488 @@ def test_leapfrog3_step():
 
     testing.assert_array_almost_equal(leapfrog.nbody.total_angular_momentum, expected_new_total_angular_momentum, DP)
 
+def test_leapfrog3_jit():
+    nbod = NBody(init_positions, init_velocities, masses)
+    nbod_jit = NBody(init_positions, init_velocities, masses)
+
+    leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+    leapfrog_jit = Leapfrog3(nbody = nbod_jit, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True, jit = True)
+
+    # TEST: FALLS BACK TO NUMPY IF NUMBA ISN'T INSTALLED
+    assert leapfrog_jit.jit == jk.jit_available
+
+    leapfrog.get_orbits()
+    leapfrog_jit.get_orbits()
+
+    # TEST: COMPILED KERNELS PRODUCE THE SAME ORBITS AND QUANTITIES
+    testing.assert_array_almost_equal(leapfrog_jit.position_orbit, leapfrog.position_orbit, DP - 2)
+    testing.assert_array_almost_equal(leapfrog_jit.velocity_orbit, leapfrog.velocity_orbit, DP - 2)
+    testing.assert_array_almost_equal(leapfrog_jit.historic_energy, leapfrog.historic_energy, DP - 2)
+    testing.assert_array_almost_equal(nbod_jit.angular_momentum, nbod.angular_momentum, DP - 2)
+
+def test_leapfrog3_mixed_precision():
+    nbod = NBody(init_positions, init_velocities, masses)
+    nbod_mixed = NBody(init_positions, init_velocities, masses, precision = "mixed")
+
+    leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+    leapfrog_mixed = Leapfrog3(nbody = nbod_mixed, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+
+    leapfrog.get_orbits()
+    leapfrog_mixed.get_orbits()
+
+    # TEST: STATE AND ORBITS STORED IN SINGLE PRECISION, ENERGIES ACCUMULATED IN DOUBLE PRECISION
+    assert nbod_mixed.positions.dtype == np.float32 and nbod_mixed.velocities.dtype == np.float32
+    assert leapfrog_mixed.position_orbit.dtype == np.float32 and leapfrog_mixed.velocity_orbit.dtype == np.float32
+    assert leapfrog_mixed.historic_energy.dtype == np.float64 and leapfrog_mixed.acc_t.dtype == np.float64
+
+    # TEST: ORBITS AND ENERGIES AGREE WITH DOUBLE PRECISION, UP TO SINGLE PRECISION ROUNDING
+    testing.assert_allclose(leapfrog_mixed.position_orbit, leapfrog.position_orbit, atol = 10**-6)
+    testing.assert_allclose(leapfrog_mixed.historic_energy, leapfrog.historic_energy, atol = 10**-6)
+
+    # TEST: ORBITS CAN BE STORED IN SINGLE PRECISION FOR A DOUBLE PRECISION NBODY
+    leapfrog_orbits = Leapfrog3(nbody = NBody(init_positions, init_velocities, masses), steps = STEPS, delta = DELTA, precision = "mixed")
+    assert leapfrog_orbits.position_orbit.dtype == np.float32 and leapfrog_orbits.nbody.positions.dtype == np.float64
+
+def test_leapfrog3_planar():
+    nbod = NBody(init_positions, init_velocities, masses)
+    nbod_planar = NBody(init_positions, init_velocities, masses, planar = True)
+
+    # TEST: PLANAR SYSTEMS DETECTED FROM THE Z COMPONENTS
+    assert NBody(init_positions, init_velocities, masses, planar = None).planar
+    assert not NBody(init_positions + 1, init_velocities, masses, planar = None).planar
+
+    leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+    leapfrog_planar = Leapfrog3(nbody = nbod_planar, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+
+    leapfrog.get_orbits()
+    leapfrog_planar.get_orbits()
+
+    # TEST: ORBITS STORED WITH 2 COMPONENTS, MATCHING THE X AND Y COMPONENTS OF THE 3D ORBITS
+    assert leapfrog_planar.position_orbit.shape == leapfrog_planar.velocity_orbit.shape and leapfrog_planar.position_orbit.shape == (2,10,2)
+    testing.assert_array_almost_equal(leapfrog_planar.position_orbit, leapfrog.position_orbit[:, :, :2], DP)
+    testing.assert_array_almost_equal(leapfrog_planar.velocity_orbit, leapfrog.velocity_orbit[:, :, :2], DP)
+
+    # TEST: ENERGIES AND ANGULAR MOMENTUM MATCH THE 3D SYSTEM
+    testing.assert_array_almost_equal(leapfrog_planar.historic_energy, leapfrog.historic_energy, DP)
+    testing.assert_array_almost_equal(nbod_planar.total_angular_momentum, nbod.total_angular_momentum, DP)
+
+    # TEST: SAME ORBITS WITH COMPILED KERNELS
+    leapfrog_jit = Leapfrog3(nbody = NBody(init_positions, init_velocities, masses, planar = True), steps = STEPS, delta = DELTA, tolerance = TOLERANCE, jit = True)
+    leapfrog_jit.get_orbits()
+    testing.assert_array_almost_equal(leapfrog_jit.position_orbit, leapfrog_planar.position_orbit, DP)
+
+def test_leapfrog3_tracers():
+    tracer_positions = np.array([[2,0,0], [0,0,3], [0,1.0005,0], [50,0,0]])
+    tracer_velocities = np.array([[0,0.5,0], [0.5,0,0], [0,0,0], [0,0,0]])
+
+    nbod = NBody(init_positions, init_velocities, masses, escape_tolerance = 10)
+    nbod_tracers = NBody(init_positions, init_velocities, masses, escape_tolerance = 10, tracer_positions = tracer_positions, tracer_velocities = tracer_velocities)
+
+    # TEST: TRACERS WITHIN COLLISION_TOLERANCE OR BEYOND ESCAPE_TOLERANCE FLAGGED, WITHOUT ENDING THE SIMULATION
+    testing.assert_array_equal(nbod_tracers.tracer_collided, [False, False, True, False])
+    testing.assert_array_equal(nbod_tracers.tracer_escaped, [False, False, False, True])
+
+    # TEST: TRACERS ACCELERATED AS BODIES OF MASS 0
+    all_masses = np.concatenate([masses, np.zeros(4)])
+    testing.assert_allclose(nbod_tracers.get_acceleration(), nm.direct_acceleration(nbod_tracers.all_positions, all_masses), rtol = 10**-12)
+
+    leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+    leapfrog_tracers = Leapfrog3(nbody = nbod_tracers, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+
+    leapfrog.get_orbits()
+    leapfrog_tracers.get_orbits()
+
+    # TEST: TRACERS INTEGRATED AS THE ROWS FOLLOWING THE MASSIVE BODIES, WITHOUT FEEDING BACK
+    assert leapfrog_tracers.position_orbit.shape == (6,10,3)
+    testing.assert_array_equal(leapfrog_tracers.position_orbit[:2], leapfrog.position_orbit)
+    testing.assert_array_equal(leapfrog_tracers.historic_energy, leapfrog.historic_energy)
+    testing.assert_array_equal(nbod_tracers.tracer_positions, leapfrog_tracers.position_orbit[2:, -1])
+
+    # TEST: SAME ORBITS WITH COMPILED KERNELS
+    leapfrog_jit = Leapfrog3(nbody = NBody(init_positions, init_velocities, masses, tracer_positions = tracer_positions, tracer_velocities = tracer_velocities),
+                             steps = STEPS, delta = DELTA, tolerance = TOLERANCE, jit = True)
+    leapfrog_jit.get_orbits()
+    testing.assert_allclose(leapfrog_jit.position_orbit, leapfrog_tracers.position_orbit, rtol = 10**-12)
+
+def test_leapfrog3_workspace():
+    for jit in [False, True]:
+        nbod = NBody(init_positions, init_velocities, masses)
+        leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, jit = jit)
+        leapfrog.simulation_step(1)
+
+        # TEST: STEPS WRITE DIRECTLY INTO THE ORBIT ARRAYS, AND ACCELERATIONS ALTERNATE BETWEEN 2 PREALLOCATED MATRICES
+        new_positions, new_velocities, acc_tt = leapfrog.integration_step(2, DELTA)
+        assert np.shares_memory(new_positions, leapfrog.position_orbit) and np.shares_memory(new_velocities, leapfrog.velocity_orbit)
+        assert any(acc_tt is array for array in leapfrog.workspace.arrays.values()) and acc_tt is not leapfrog.acc_t
+
+        # TEST: NO ARRAYS ALLOCATED IN STEADY STATE
+        leapfrog.update_simulation(2, new_positions, new_velocities, symplectic = True)
+        leapfrog.acc_t = acc_tt
+        arrays = dict(leapfrog.workspace.arrays)
+        leapfrog.get_orbits()
+        assert leapfrog.workspace.arrays.keys() == arrays.keys()
+        assert all(leapfrog.workspace.arrays[key] is array for key, array in arrays.items())
+
+        # TEST: SAME ORBITS AS A NUMPY STEP OUTSIDE OF THE WORKSPACE
+        half_velocities = leapfrog.velocity_orbit[:, -2] + nbod.get_acceleration(leapfrog.position_orbit[:, -2]) * DELTA * 0.5
+        testing.assert_allclose(leapfrog.position_orbit[:, -1], leapfrog.position_orbit[:, -2] + half_velocities * DELTA, rtol = 10**-12)
+
+def test_leapfrog3_diagnostics():
+    nbod = NBody(init_positions, init_velocities, masses)
+    leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE)
+    leapfrog.get_orbits()
+
+    # TEST: WITHOUT DIAGNOSTICS, CONSERVATION ISN'T CHECKED (EVEN IF THE ENERGY ISN'T CONSERVED), WITH THE SAME ORBITS
+    nbod_never = NBody(init_positions, init_velocities, masses)
+    nbod_never.first_energy += 1
+    leapfrog_never = Leapfrog3(nbody = nbod_never, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, diagnostics = None)
+    leapfrog_never.get_orbits()
+    testing.assert_array_equal(leapfrog_never.position_orbit, leapfrog.position_orbit)
+
+    # TEST: QUANTITIES CALCULATED WHEN FIRST ACCESSED, MATCHING THOSE CALCULATED BY THE UPDATE
+    assert "energy" not in nbod_never.derived
+    testing.assert_almost_equal(nbod_never.energy, nbod.energy, DP)
+    testing.assert_array_almost_equal(nbod_never.total_angular_momentum, nbod.total_angular_momentum, DP)
+
+    # TEST: EVERY K STEPS, AND ONLY ONCE THE ORBITS ARE CALCULATED
+    nbod_sampled = NBody(init_positions, init_velocities, masses)
+    leapfrog_sampled = Leapfrog3(nbody = nbod_sampled, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, diagnostics = 3)
+
+    for t in range(1, 4):
+        leapfrog_sampled.simulation_step(t)
+        assert ("energy" in nbod_sampled.derived) == (t == 3)
+
+    nbod_end = NBody(init_positions, init_velocities, masses)
+    nbod_end.first_energy += 1
+    leapfrog_end = Leapfrog3(nbody = nbod_end, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, diagnostics = "end")
+    testing.assert_raises(EnergyNotConservedException, leapfrog_end.get_orbits)
+    assert leapfrog_end.int_step == STEPS
+
+    testing.assert_raises(AssertionError, Leapfrog3, nbod_end, STEPS, DELTA, diagnostics = 0)
+
+    # TEST: MESSAGES ONLY BUILT IF THE CHECK FAILS
+    check_exception(True, EnergyNotConservedException, lambda: 1 / 0)
+    testing.assert_raises_regex(EnergyNotConservedException, "^built$", check_exception, False, EnergyNotConservedException, lambda: "built")
+
+def test_leapfrog3_reducers():
+    nbod = NBody(init_positions, init_velocities, masses)
+    leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, store_properties = True)
+    leapfrog.get_orbits()
+
+    energy = leapfrog.historic_energy
+    relative_error = (energy - energy[0]) / abs(energy[0])
+    bins = np.linspace(-10**-4, 10**-4, 5)
+
+    reducers = [MaxAbs("energy", error = "relative"), Moments("energy", error = "absolute"), Moments("total_angular_momentum"),
+                Histogram("energy", bins, error = "relative"), Sample("energy", every = 3)]
+    nbod_reduced = NBody(init_positions, init_velocities, masses)
+    leapfrog_reduced = Leapfrog3(nbody = nbod_reduced, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, reducers = reducers)
+    leapfrog_reduced.get_orbits()
+    max_error, energy_moments, momentum_moments, histogram, sample = reducers
+
+    # TEST: REDUCTIONS MATCH THOSE OF THE HISTORIC ARRAYS, WITH THE SAME ORBITS
+    testing.assert_array_equal(leapfrog_reduced.position_orbit, leapfrog.position_orbit)
+    testing.assert_almost_equal(max_error.get_result(), np.max(np.abs(relative_error)), DP)
+    testing.assert_almost_equal(energy_moments.get_result()["mean"], np.mean(energy - energy[0]), DP)
+    testing.assert_almost_equal(energy_moments.get_result()["variance"], np.var(energy - energy[0]), DP)
+    testing.assert_almost_equal(energy_moments.get_result()["rms"], np.sqrt(np.mean((energy - energy[0])**2)), DP)
+    testing.assert_array_almost_equal(momentum_moments.get_result()["mean"], np.mean(leapfrog.historic_angular_momentum, axis = 0), DP)
+    testing.assert_array_equal(histogram.get_result(), np.bincount(np.searchsorted(bins, relative_error, side = "right"), minlength = len(bins) + 1))
+    testing.assert_array_equal(sample.get_result(), energy[::3])
+
+    # TEST: FINAL VALUES KEPT, AND NO HISTORIC ARRAYS ALLOCATED
+    assert max_error.count == STEPS
+    testing.assert_almost_equal(max_error.last, energy[-1], DP)
+    assert not hasattr(leapfrog_reduced, "historic_energy")
+
+    # TEST: REDUCERS CLEARED WHEN THE ARRAYS ARE SET AGAIN, STARTING FROM THE CURRENT SYSTEM
+    leapfrog_reduced.set_arrays()
+    assert max_error.count == 1 and max_error.get_result() == 0
+    testing.assert_array_equal(sample.get_result(), energy[-1:])
+
+    testing.assert_raises(AssertionError, MaxAbs, "energy", error = "squared")
+
+    # TEST: RELATIVE ERROR OF A QUANTITY WHICH IS INITIALLY ZERO FALLS BACK TO THE ABSOLUTE ERROR, INSTEAD OF INF/NAN
+    zero_error, absolute_error = MaxAbs("total_linear_momentum", error = "relative"), MaxAbs("total_linear_momentum", error = "absolute")
+
+    for value in [np.zeros(3), np.array([10**-12, 0, -10**-12])]:
+        zero_error.update(value)
+        absolute_error.update(value)
+
+    assert np.isfinite(zero_error.get_result()) and zero_error.get_result() == absolute_error.get_result()
+
+    # TEST: BASE REDUCER RESULT IS THE LAST VALUE
+    reducer = Reducer("energy")
+    reducer.update(-1.5)
+    reducer.update(-2.5)
+    assert reducer.get_result() == -2.5
+
+def test_leapfrog3_layout():
+    nbod = NBody(init_positions, init_velocities, masses)
+    leapfrog = Leapfrog3(nbody = nbod, steps = STEPS, delta = DELTA, tolerance = TOLERANCE)
+    leapfrog.get_orbits()
+
+    # TEST: STEPS STORED CONTIGUOUSLY, WITH BODY-MAJOR ORBITS AS VIEWS OF THE SAME MEMORY
+    assert leapfrog.position_steps.shape == (STEPS, 2, 3) and leapfrog.position_steps.flags.c_contiguous
+    assert np.shares_memory(leapfrog.position_orbit, leapfrog.position_steps) and np.shares_memory(leapfrog.velocity_orbit, leapfrog.velocity_steps)
+    testing.assert_array_equal(leapfrog.position_orbit[1], leapfrog.position_steps[:, 1])
+    testing.assert_array_equal(leapfrog.velocity_orbit[:, -1], nbod.velocities)
+
+    # TEST: ADAPTIVE ORBITS TRUNCATED WITHOUT COPYING THE STEPS
+    nbod_adaptive = NBody(init_positions, init_velocities, masses)
+    leapfrog_adaptive = Leapfrog3(nbody = nbod_adaptive, steps = STEPS, delta = DELTA, tolerance = TOLERANCE, adaptive = True, adaptive_constant = C)
+    position_steps = leapfrog_adaptive.position_steps
+    leapfrog_adaptive.get_orbits()
+
+    assert leapfrog_adaptive.position_steps.base is position_steps and leapfrog_adaptive.position_steps.flags.c_contiguous
+    assert leapfrog_adaptive.position_orbit.shape == (2, len(leapfrog_adaptive.times), 3)
+    testing.assert_array_equal(leapfrog_adaptive.position_orbit[:, -1], nbod_adaptive.positions)
+
+def test_compositions():
+    figure_8 = (np.array([[0.97000436, -0.24308753, 0], [-0.97000436, 0.24308753, 0], [0, 0, 0]]),
+                np.array([[0.466203685, 0.43236573, 0], [0.466203685, 0.43236573, 0], [-0.93240737, -0.86473146, 0]]),
+                np.ones(3))
+
+    def energy_error(integrator_class, steps, **kwargs):
+        nbod = NBody(*figure_8, collision_tolerance = None, planar = True)
+        integrator = integrator_class(nbody = nbod, steps = steps + 1, delta = 2 / steps, tolerance = 1, **kwargs)
+        integrator.get_orbits()
+
+        return abs(nbod.energy - nbod.first_energy), integrator
+
+    for integrator_class, order, evaluations in [(ForestRuth, 4, 3), (BlanesMoan, 4, 6), (Yoshida6, 6, 7)]:
+        error, integrator = energy_error(integrator_class, 50)
+
+        # TEST: ORDER OF THE METHOD (ERROR DIVIDED BY 2^ORDER WHEN HALVING THE TIMESTEP), AND ACCELERATIONS PER STEP
+        testing.assert_allclose(np.log2(error / energy_error(integrator_class, 100)[0]), order, atol = 0.3)
+        assert integrator.step_evaluations == evaluations
+
+        # TEST: SAME ENERGY ERROR AS LEAPFROG3 WITH SEVERAL TIMES FEWER ACCELERATIONS
+        assert error < energy_error(Leapfrog3, 3 * 50 * evaluations)[0]
+
+        # TEST: STORED PROPERTIES, ADAPTIVE TIMESTEP AND COMPILED KERNELS
+        _, integrator_stored = energy_error(integrator_class, 50, store_properties = True)
+        testing.assert_array_equal(integrator_stored.position_orbit, integrator.position_orbit)
+        testing.assert_allclose(integrator_stored.historic_energy, integrator.nbody.first_energy, atol = 10**-5)
+
+        _, integrator_adaptive = energy_error(integrator_class, 50, adaptive = True, adaptive_constant = 0.05)
+        assert abs(integrator_adaptive.times[-1] - 2) < 0.1
+
+        _, integrator_jit = energy_error(integrator_class, 50, jit = True)
+        testing.assert_allclose(integrator_jit.position_orbit, integrator.position_orbit, atol = 10**-12)
+
+    # TEST: COMPOSITIONS ENDING WITH A KICK OF 0 (I.E POSITION VERLET) STILL CALCULATE THE ACCELERATION AT THE END OF EACH STEP
+    class PositionVerlet(Composition):
+        kicks = (0, 1, 0)
+        drifts = (0.5, 0.5)
+
+    error, integrator = energy_error(PositionVerlet, 50)
+    testing.assert_allclose(np.log2(error / energy_error(PositionVerlet, 100)[0]), 2, atol = 0.3)
+    testing.assert_array_equal(integrator.acc_t, integrator.nbody.get_acceleration())
+    assert integrator.step_evaluations == 2
+
+def test_hermite():
+    eccentricity = 0.9
+    apocentre = 1 + eccentricity
+    speed = np.sqrt(2 * (1 - eccentricity) / apocentre)
+    period = 2 * np.pi / np.sqrt(2)
+
+    def binary_error(integrator_class, steps, **kwargs):
+        nbod = NBody(np.array([[apocentre / 2, 0, 0], [-apocentre / 2, 0, 0]]), np.array([[0, speed / 2, 0], [0, -speed / 2, 0]]), masses,
+                     collision_tolerance = None)
+        integrator = integrator_class(nbody = nbod, steps = steps + 1, delta = period / steps, tolerance = 1, **kwargs)
+        integrator.get_orbits()
+
+        # after a period, the bodies of an eccentric binary return to their initial positions (through a close approach)
+        return np.max(np.abs(nbod.positions[0] - [apocentre / 2, 0, 0])), integrator
+
+    # TEST: 4TH ORDER METHOD, REACHING THE ACCURACY OF LEAPFROG3 WITH SEVERAL TIMES LARGER STEPS THROUGH A CLOSE APPROACH
+    error, integrator = binary_error(Hermite, 4000)
+    testing.assert_allclose(np.log2(binary_error(Hermite, 2000)[0] / error), 4, atol = 0.5)
+    assert error < binary_error(Leapfrog3, 16000)[0]
+
+    # TEST: SAME ORBITS FROM THE COMPILED KERNEL, WITH STORED PROPERTIES
+    _, integrator_jit = binary_error(Hermite, 500, jit = True, store_properties = True)
+    testing.assert_allclose(integrator_jit.position_orbit, binary_error(Hermite, 500)[1].position_orbit, atol = 10**-10)
+    assert integrator_jit.historic_energy.shape == (501,)
+
+    # TEST: AARSETH'S CRITERION SHRINKS THE STEPS DURING THE CLOSE APPROACH, REACHING A SMALL ERROR WITH FEWER STEPS THAN FIXED STEPS
+    error_adaptive, integrator_adaptive = binary_error(Hermite, 1, adaptive = True, adaptive_constant = 0.002, delta_lim = 10**-9)
+    deltas = np.diff(integrator_adaptive.times)
+    assert np.max(deltas) > 20 * np.min(deltas)
+    assert len(integrator_adaptive.times) < 2000
+    nbod = integrator_adaptive.nbody
+    assert abs(nbod.energy - nbod.first_energy) < 10**-6
+
+    # TEST: TRACERS AREN'T SUPPORTED
+    nbod_tracers = NBody(init_positions, init_velocities, masses, tracer_positions = [[3, 0, 0]], tracer_velocities = [[0, 0.5, 0]])
+    testing.assert_raises(AssertionError, Hermite, nbod_tracers, STEPS, DELTA)
+
+    # TEST: ORBITS STORED IN MIXED PRECISION, WHILST THE STEPS ARE INTEGRATED IN DOUBLE PRECISION
+    _, integrator_mixed = binary_error(Hermite, 500, precision = "mixed")
+    assert integrator_mixed.position_orbit.dtype == np.float32
+    testing.assert_array_equal(integrator_mixed.nbody.positions, binary_error(Hermite, 500)[1].nbody.positions)
+
+    # TEST: ONLY DIRECT SUMMATION SUPPORTED, AS USED FOR THE ACCELERATIONS AND JERKS
+    nbod_backend = NBody(init_positions, init_velocities, masses, collision_tolerance = None, backend = BarnesHut(theta = 0.5))
+    testing.assert_raises(AssertionError, Hermite, nbod_backend, STEPS, DELTA)
+    Hermite(NBody(init_positions, init_velocities, masses, backend = "direct-vectorised"), STEPS, DELTA)
+
+def test_ias15():
+    eccentricity = 0.9
+    apocentre = 1 + eccentricity
+    speed = np.sqrt(2 * (1 - eccentricity) / apocentre)
+    period = 2 * np.pi / np.sqrt(2)
+
+    def binary_nbod():
+        return NBody(np.array([[apocentre / 2, 0, 0], [-apocentre / 2, 0, 0]]), np.array([[0, speed / 2, 0], [0, -speed / 2, 0]]), masses,
+                     collision_tolerance = None)
+
+    nbod = binary_nbod()
+
+    # TEST: A PERIOD OF AN ECCENTRIC BINARY AT MACHINE PRECISION, IN FAR FEWER STEPS THAN LEAPFROG3, ENDING AT THE TARGET TIME
+    integrator = IAS15(nbody = nbod, steps = 1, delta = period, tolerance = 10**-12, store_properties = True)
+    integrator.get_orbits()
+    assert len(integrator.times) < 300 and integrator.times[-1] == period
+    assert np.max(np.abs(nbod.positions[0] - [apocentre / 2, 0, 0])) < 10**-13
+    assert np.max(np.abs(integrator.historic_energy - nbod.first_energy)) < 10**-14
+
+    # TEST: THE FIRST STEP (A WHOLE PERIOD) IS RECALCULATED WITH SMALLER TIMESTEPS, WHICH SHRINK DURING THE CLOSE APPROACH
+    deltas = np.diff(integrator.times)
+    assert integrator.rejected_steps >= 1 and integrator.force_evaluations > 7 * (len(deltas) + integrator.rejected_steps)
+    assert deltas[0] < period / 10 and np.max(deltas) > 20 * np.min(deltas)
+    testing.assert_allclose(integrator.historic_delta[1:], deltas, rtol = 10**-12)
+
+    # TEST: SAME FINAL POSITIONS FROM THE COMPILED KERNEL (THE TIMESTEPS DIFFER BY ROUNDING), AND TRACERS ARE INTEGRATED ALONGSIDE THE BODIES
+    integrator_jit = IAS15(nbody = binary_nbod(), steps = 1, delta = period, tolerance = 10**-12, jit = True)
+    integrator_jit.get_orbits()
+    testing.assert_allclose(integrator_jit.nbody.positions, nbod.positions, atol = 10**-13)
+
+    # TEST: ORBITS STORED IN SINGLE PRECISION, WHILST THE STEPS ARE INTEGRATED IN DOUBLE PRECISION (SO THE SAME NUMBER OF STEPS IS REQUIRED)
+    integrator_mixed = IAS15(nbody = binary_nbod(), steps = 1, delta = period, tolerance = 10**-12, precision = "mixed")
+    integrator_mixed.get_orbits()
+    assert integrator_mixed.position_steps.dtype == np.float32 and len(integrator_mixed.times) < 300
+    testing.assert_allclose(integrator_mixed.nbody.positions, nbod.positions, atol = 10**-13)
+
+    # TEST: SYSTEMS IN MIXED PRECISION AREN'T SUPPORTED (THEIR FORCES ARE CALCULATED IN SINGLE PRECISION)
+    nbod_mixed = NBody(np.array([[apocentre / 2, 0, 0], [-apocentre / 2, 0, 0]]), np.array([[0, speed / 2, 0], [0, -speed / 2, 0]]), masses,
+                       collision_tolerance = None, precision = "mixed")
+    testing.assert_raises(AssertionError, IAS15, nbod_mixed, 1, period)
+
+    nbod_tracers = NBody(init_positions, init_velocities, masses, tracer_positions = [[3, 0, 0]], tracer_velocities = [[0, 0.5, 0]])
+    integrator_tracers = IAS15(nbod_tracers, 10, 1)
+    integrator_tracers.get_orbits()
+    assert integrator_tracers.position_orbit.shape[0] == 3 and integrator_tracers.times[-1] == 10
+
+def test_bulirsch_stoer():
+    # perturbed figure-8, integrated to machine precision by IAS15 as a reference
+    perturbed_figure_8 = (np.array([[0.97000436, -0.24308753, 0], [-0.97000436, 0.24308753, 0], [0, 0, 0]]),
+                          np.array([[0.516203685, 0.45236573, 0], [0.516203685, 0.45236573, 0], [-1.03240737, -0.90473146, 0]]),
+                          np.ones(3))
+
+    def orbits(integrator_class, steps, delta, **kwargs):
+        nbod = NBody(*perturbed_figure_8, collision_tolerance = None, planar = True)
+        integrator = integrator_class(nbody = nbod, steps = steps, delta = delta, tolerance = 1, **kwargs)
+        integrator.get_orbits()
+
+        return nbod.positions, integrator
+
+    reference, _ = orbits(IAS15, 1, 10)
+
+    # TEST: HIGH ACCURACY WITH FEW LARGE STEPS, ENDING AT THE TARGET TIME, AND MORE ACCURATE FOR A SMALLER EPSILON
+    positions, integrator = orbits(BulirschStoer, 1, 10, epsilon = 10**-12)
+    assert len(integrator.times) < 100 and integrator.times[-1] == 10
+    assert np.max(np.abs(positions - reference)) < 10**-9
+    assert np.max(np.abs(orbits(BulirschStoer, 1, 10, epsilon = 10**-8)[0] - reference)) > 10 * np.max(np.abs(positions - reference))
+
+    # TEST: THE ORDER ADAPTS WITHIN THE EXTRAPOLATION TABLE, AND THE FIRST STEP (OF THE WHOLE INTEGRATION) IS REJECTED
+    assert 1 <= integrator.order < len(integrator.substeps) and integrator.rejected_steps >= 1
+
+    # TEST: OVER 1000 TIMES MORE ACCURATE THAN LEAPFROG3 WITH FEWER ACCELERATIONS (INCLUDING THOSE OF REJECTED STEPS)
+    positions_leapfrog, leapfrog = orbits(Leapfrog3, 10**4 + 1, 10**-3)
+    assert leapfrog.force_evaluations == 10**4
+    assert integrator.force_evaluations < leapfrog.force_evaluations / 3
+    assert 1000 * np.max(np.abs(positions - reference)) < np.max(np.abs(positions_leapfrog - reference))
+
+    # TEST: ADAPTIVE LEAPFROG3 CALCULATES EACH STEP TWICE (SO IT REMAINS TIME-REVERSIBLE)
+    _, leapfrog_adaptive = orbits(Leapfrog3, 10**3, 10**-2, adaptive = True, adaptive_constant = 0.01)
+    assert leapfrog_adaptive.force_evaluations == 2 * (len(leapfrog_adaptive.times) - 1)
+
+    # TEST: TRACERS, STORED PROPERTIES, AND AT LEAST 2 ROWS OF EXTRAPOLATION
+    nbod_tracers = NBody(init_positions, init_velocities, masses, tracer_positions = [[3, 0, 0]], tracer_velocities = [[0, 0.5, 0]])
+    integrator_tracers = BulirschStoer(nbod_tracers, 10, 1, store_properties = True)
+    integrator_tracers.get_orbits()
+    assert integrator_tracers.position_orbit.shape[0] == 3 and integrator_tracers.historic_energy.shape == (len(integrator_tracers.times),)
+    testing.assert_raises(AssertionError, BulirschStoer, nbod_tracers, STEPS, DELTA, max_order = 1)
+
+def test_embedded_runge_kutta():
+    eccentricity = 0.9
+    apocentre = 1 + eccentricity
+    speed = np.sqrt(2 * (1 - eccentricity) / apocentre)
+    period = 2 * np.pi / np.sqrt(2)
+
+    def binary_error(integrator_class, epsilon, **kwargs):
+        nbod = NBody(np.array([[apocentre / 2, 0, 0], [-apocentre / 2, 0, 0]]), np.array([[0, speed / 2, 0], [0, -speed / 2, 0]]), masses,
+                     collision_tolerance = None)
+        integrator = integrator_class(nbody = nbod, steps = 1, delta = period, tolerance = 1, epsilon = epsilon, **kwargs)
+        integrator.get_orbits()
+
+        return np.max(np.abs(nbod.positions[0] - [apocentre / 2, 0, 0])), integrator
+
+    # accelerations of the stages of each attempted step, alongside the acceleration at the end of each accepted step (unless it's the last stage)
+    for integrator_class, order, evaluations, end_evaluations in [(DormandPrince5, 5, 6, 0), (DormandPrince8, 8, 11, 1)]:
+        # TEST: WEIGHTS OF THE ORDER OF THE METHOD, AND ERROR ESTIMATES OF LOWER ORDER (AT LEAST 3)
+        for k in range(order):
+            testing.assert_almost_equal(integrator_class.b @ integrator_class.c**k, 1 / (k + 1), DP)
+
+        for k in range(3):
+            testing.assert_almost_equal(integrator_class.error_weights[0] @ integrator_class.c**k, 0, DP)
+
+        # TEST: GLOBAL ERROR OVER A PERIOD OF AN ECCENTRIC BINARY BOUNDED BY EPSILON, ENDING AT THE TARGET TIME
+        for epsilon in [10**-8, 10**-10]:
+            error, integrator = binary_error(integrator_class, epsilon, store_properties = True)
+            assert error < 10 * epsilon and integrator.times[-1] == period
+
+        # TEST: REJECTIONS (AT LEAST OF THE FIRST STEP, A WHOLE PERIOD) COUNTED ALONGSIDE THE ADAPTIVE TIMESTEPS, AND THEIR ACCELERATIONS
+        assert integrator.historic_rejections.shape == integrator.historic_delta.shape == (len(integrator.times),)
+        testing.assert_allclose(integrator.historic_delta[1:], np.diff(integrator.times), rtol = 10**-12)
+        assert integrator.historic_rejections[1] >= 1 and np.sum(integrator.historic_rejections) == integrator.rejected_steps
+        accepted_steps = len(integrator.times) - 1
+        assert integrator.force_evaluations == evaluations * (accepted_steps + integrator.rejected_steps) + end_evaluations * accepted_steps
+
+        # TEST: ORBITS STORED IN SINGLE PRECISION, WHILST THE STEPS ARE INTEGRATED IN DOUBLE PRECISION
+        error_mixed, integrator_mixed = binary_error(integrator_class, 10**-10, precision = "mixed")
+        assert integrator_mixed.position_steps.dtype == np.float32 and error_mixed < 10**-9
+        assert len(integrator_mixed.times) == len(binary_error(integrator_class, 10**-10)[1].times)
+
+    # TEST: FOR SYSTEMS IN MIXED PRECISION, EPSILON IS LIMITED BY THE ROUNDING OF THE FORCES (SO THE TARGET TIME IS STILL REACHED)
+    nbod_mixed = NBody(np.array([[apocentre / 2, 0, 0], [-apocentre / 2, 0, 0]]), np.array([[0, speed / 2, 0], [0, -speed / 2, 0]]), masses,
+                       collision_tolerance = None, precision = "mixed")
+    with warnings.catch_warnings(record = True) as caught:
+        warnings.simplefilter("always")
+        integrator_mixed = DormandPrince8(nbod_mixed, 1, period, tolerance = 1, epsilon = 10**-12)
+
+    assert any(issubclass(warning.category, UserWarning) for warning in caught)
+    integrator_mixed.get_orbits()
+    assert integrator_mixed.epsilon == DormandPrince8.min_epsilon and integrator_mixed.times[-1] == period
+
+    # TEST: DEFAULT EPSILON OF EACH METHOD, INHERITING THE INITIALISATION OF EMBEDDEDRUNGEKUTTA
+    assert binary_error(DormandPrince5, None)[1].epsilon == 10**-10 and binary_error(DormandPrince8, None)[1].epsilon == 10**-12
+
+    # TEST: THE 8TH ORDER METHOD REQUIRES FEWER ACCELERATIONS FOR A SMALL EPSILON
+    assert binary_error(DormandPrince8, 10**-12)[1].force_evaluations < binary_error(DormandPrince5, 10**-12)[1].force_evaluations / 2
+
 def test_main():
     test_leapfrog3_init()
-    test_leapfrog3_step()
\ No newline at end of file
+    test_leapfrog3_step()
+    test_leapfrog3_jit()
+    test_leapfrog3_mixed_precision()
+    test_leapfrog3_planar()
+    test_leapfrog3_tracers()
+    test_leapfrog3_reducers()
+    test_leapfrog3_layout()
+    test_compositions()
+    test_hermite()
+    test_ias15()
+    test_bulirsch_stoer()
+    test_embedded_runge_kutta()
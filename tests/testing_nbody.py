@@ -1,7 +1,11 @@
+import pickle
+
 import numpy as np
 from numpy import testing
 
 from nbody import NBody
+from backends.fmm import FMM
+from backends.barnes_hut import BarnesHut
 
 DP = 13
 
@@ -25,6 +29,55 @@ def test_nbody_copy():
                                        [2, 3, 4]])
     testing.assert_raises(AssertionError, testing.assert_array_equal, nbod.angular_momentum, nbod2.angular_momentum)
 
+def test_nbody_state():
+    # TEST: NO INSTANCE DICTIONARY, STATE STORED IN A SINGLE BUFFER (POSITIONS AND VELOCITIES ARE VIEWS)
+    assert not hasattr(nbod, "__dict__")
+    assert np.shares_memory(nbod.positions, nbod.state) and np.shares_memory(nbod.velocities, nbod.state)
+    assert np.shares_memory(nbod.masses, nbod.state)
+
+    # TEST: PICKLED AS STATE AND PARAMETERS ONLY, DERIVED QUANTITIES RECALCULATED ON FIRST ACCESS
+    nbod2 = pickle.loads(pickle.dumps(nbod))
+    assert nbod2.derived == {}
+    testing.assert_equal(nbod.positions, nbod2.positions)
+    testing.assert_equal(nbod.velocities, nbod2.velocities)
+    testing.assert_equal(nbod.masses, nbod2.masses)
+    testing.assert_equal(nbod.energy, nbod2.energy)
+    testing.assert_equal(nbod.gpe, nbod2.gpe)
+    testing.assert_equal(nbod.total_angular_momentum, nbod2.total_angular_momentum)
+    testing.assert_equal(nbod.first_energy, nbod2.first_energy)
+
+    # TEST: BACKENDS PICKLED AS THEIR CONFIGURATION ONLY, WITHOUT THE RESULTS OF THEIR LAST EVALUATION
+    for backend in [FMM(order = 6), BarnesHut(theta = 0.3)]:
+        nbod_backend = NBody(init_positions, init_velocities, masses, collision_tolerance = None, backend = backend)
+        acceleration = nbod_backend.get_acceleration()
+        nbod_pickled = pickle.loads(pickle.dumps(nbod_backend))
+
+        assert all(getattr(nbod_pickled.backend, name) is None for name in backend.caches)
+        assert all(getattr(backend, name) is not None for name in backend.caches)
+        assert nbod_pickled.backend.__dict__.keys() == backend.__dict__.keys()
+        testing.assert_equal(nbod_pickled.get_acceleration(), acceleration)
+
+    # TEST: SNAPSHOT RESTORED IN PLACE (VIEWS REMAIN VALID), INTO A PREALLOCATED BUFFER
+    positions = nbod2.positions
+    snapshot = nbod2.snapshot()
+    energy = nbod2.energy
+    nbod2.update(nbod2.positions * 2, nbod2.velocities, symplectic = False)
+    assert nbod2.energy != energy
+    nbod2.restore(snapshot)
+    testing.assert_equal(nbod.positions, positions)
+    testing.assert_equal(energy, nbod2.energy)
+    assert nbod2.snapshot(out = snapshot) is snapshot
+    testing.assert_raises(AssertionError, nbod2.restore, snapshot[1:])
+
+    # TEST: FORCES AND ENERGIES RECALCULATED WHEN THE MASSES CHANGE, OR ARE RESTORED FROM A SNAPSHOT
+    acceleration, gpe = nbod2.get_acceleration(), nbod2.gpe
+    nbod2.masses = 2 * masses
+    testing.assert_array_almost_equal(nbod2.get_acceleration(), 2 * acceleration, DP)
+    testing.assert_almost_equal(nbod2.gpe, 4 * gpe, DP)
+    nbod2.restore(snapshot)
+    testing.assert_array_almost_equal(nbod2.get_acceleration(), acceleration, DP)
+    testing.assert_almost_equal(nbod2.gpe, gpe, DP)
+
 def test_nbody_check_update_input():
     # TEST: PYTHON ARRAY GIVEN -> CONVERTED TO NUMPY
     arr_positions = [[1,-1,1], [2,4,2], [3,2,1]]
@@ -165,6 +218,15 @@ def test_nbody_update_symp():
     testing.assert_equal(total_angular_momentum, nbod.total_angular_momentum)
     testing.assert_equal(np.abs(accelerations), np.abs(nbod.get_acceleration()))
 
+    # TEST: MOMENTA OVERWRITTEN IN PLACE BY THE NEXT UPDATE (PREALLOCATED), SO COPIES MUST BE KEPT INSTEAD
+    nbod2 = NBody(init_positions, init_velocities, masses)
+    nbod2.update(nbod2.positions, nbod2.velocities, symplectic = False)
+    total_angular_momentum = nbod2.total_angular_momentum
+    kept_angular_momentum = total_angular_momentum.copy()
+    nbod2.update(nbod2.positions, 2 * nbod2.velocities, symplectic = False)
+    assert nbod2.total_angular_momentum is total_angular_momentum
+    testing.assert_array_almost_equal(total_angular_momentum, 2 * kept_angular_momentum, DP)
+
 def test_nbody_update_errors():
 
     # TEST: ESCAPE TOLERANCE CONDITION FAILS
@@ -181,6 +243,7 @@ def test_nbody_update_errors():
 
 def test_main():
     test_nbody_copy()
+    test_nbody_state()
     test_nbody_check_update_input()
     test_nbody_init()
     test_nbody_get_body_distances()
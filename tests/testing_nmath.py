@@ -3,6 +3,8 @@ import random
 import numpy as np
 from numpy import testing
 import nmath as nm
+import jit_kernels as jk
+from nbodysim.exceptions import SmallAdaptiveDeltaException
 
 DP = 13
 
@@ -38,6 +40,127 @@ def test_mat_cross():
     rand_2 = np.random.rand(4,3)
     testing.assert_equal(nm.mat_cross(rand_1, rand_2), np.cross(rand_1, rand_2))
 
+def test_batch_cross():
+    rand_1 = np.random.rand(5, 4, 3)
+    rand_2 = np.random.rand(5, 4, 3)
+
+    # TEST: SAME CROSS PRODUCTS AS EACH SYSTEM ON ITS OWN
+    testing.assert_equal(nm.batch_cross(rand_1, rand_2), np.cross(rand_1, rand_2))
+    testing.assert_equal(nm.batch_cross(rand_1, rand_2)[2], nm.mat_cross(rand_1[2], rand_2[2]))
+    testing.assert_equal(nm.batch_planar_cross(rand_1[..., :2], rand_2[..., :2])[3], nm.planar_cross(rand_1[3, :, :2], rand_2[3, :, :2]))
+
+    # TEST: CROSS PRODUCTS WRITTEN INTO THE GIVEN TENSOR
+    out = np.empty((5, 4, 3))
+    assert nm.batch_cross(rand_1, rand_2, out = out) is out
+
+def test_pair_indices():
+    i, j = nm.pair_indices(4)
+    testing.assert_equal(i, np.array([1, 2, 2, 3, 3, 3]))
+    testing.assert_equal(j, np.array([0, 0, 1, 0, 1, 2]))
+
+    # TEST: INDICES ARE CACHED PER SYSTEM SIZE
+    assert nm.pair_indices(4)[0] is i
+
+    # TEST: CACHE IS BOUNDED, SO INDICES OF MANY SIZES AREN'T ALL KEPT
+    for n in range(5, 25):
+        nm.pair_indices(n)
+
+    assert nm.pair_indices.cache_info().currsize <= nm.pair_indices.cache_info().maxsize == 8
+
+    # TEST: PAIR TENSOR IS ANTISYMMETRIC, PAIR SUM MATCHES SUM OVER TENSOR ROWS
+    pair_vectors = np.random.rand(6, 3)
+    tensor = nm.pair_tensor(pair_vectors, 4)
+    testing.assert_equal(tensor, -tensor.transpose(1, 0, 2))
+    testing.assert_array_almost_equal(nm.pair_sum(pair_vectors, -pair_vectors, 4), np.sum(tensor, axis = 1), DP)
+
+def test_tiled_interactions():
+    positions = np.random.rand(50, 3)
+    masses = np.random.rand(50)
+    velocities = np.random.rand(50, 3)
+    i, j = nm.pair_indices(50)
+    pair_distances = positions[j] - positions[i]
+    distances = nm.ten_norm(pair_distances, axis = 1, sqrt = True)
+
+    expected_acceleration = nm.pair_acceleration(pair_distances, masses[i][:, np.newaxis], masses[j][:, np.newaxis], 50, G = 2)
+    expected_gpe = -2 * np.sum(masses[i] * masses[j] / distances)
+
+    # TEST: SAME RESULTS FOR A SINGLE TILE, AND FOR MEMORY BUDGETS WHICH SPLIT THE PAIRS INTO MANY (UNEVEN) TILES
+    for memory in [2**26, 80 * 7**2, 1]:
+        acceleration, gpe, min_distance, min_ratio = nm.tiled_interactions(positions, masses, G = 2, memory = memory, velocities = velocities)
+        testing.assert_allclose(acceleration, expected_acceleration, rtol = 10**-12)
+        testing.assert_allclose(gpe, expected_gpe, rtol = 10**-12)
+        testing.assert_equal(min_distance, np.min(distances))
+        testing.assert_equal(min_ratio, np.min(distances / nm.ten_norm(velocities[j] - velocities[i], axis = 1, sqrt = True)))
+
+    # TEST: TILES SPLIT OVER SEVERAL WORKERS GIVE THE SAME RESULTS, REPRODUCIBLE FOR A GIVEN NUMBER OF WORKERS
+    acceleration, gpe, min_distance, _ = nm.tiled_interactions(positions, masses, G = 2, workers = 4)
+    testing.assert_allclose(acceleration, expected_acceleration, rtol = 10**-12)
+    testing.assert_allclose(gpe, expected_gpe, rtol = 10**-12)
+    testing.assert_equal(min_distance, np.min(distances))
+    testing.assert_equal(nm.tiled_interactions(positions, masses, G = 2, workers = 4)[0], acceleration)
+
+    # TEST: ACCELERATIONS WRITTEN INTO A PREALLOCATED MATRIX (WITH STALE VALUES), FOR 1 OR SEVERAL WORKERS
+    out = np.ones(shape = (50, 3))
+    assert nm.tiled_interactions(positions, masses, G = 2, workers = 4, out = out)[0] is out
+    testing.assert_equal(out, acceleration)
+    assert nm.tiled_interactions(positions, masses, G = 2, out = out)[0] is out
+    testing.assert_allclose(out, expected_acceleration, rtol = 10**-12)
+
+    # TEST: ACCELERATIONS AND RATIOS CAN BE SKIPPED
+    acceleration, _, _, min_ratio = nm.tiled_interactions(positions, masses, acceleration = False)
+    assert acceleration is None and min_ratio is None
+
+    # TEST: COINCIDENT BODIES EXERT NO FORCE AND HAVE NO POTENTIAL ENERGY, WITHOUT INF/NAN
+    coincident = np.vstack([positions, positions[:1]])
+    with np.errstate(all = "raise"):
+        acceleration, gpe, min_distance, _ = nm.tiled_interactions(coincident, np.append(masses, 1.0), G = 2)
+
+    assert min_distance == 0 and np.isfinite(gpe) and np.isfinite(acceleration).all()
+    testing.assert_allclose(gpe, expected_gpe - 2 * np.sum(masses[1:] / nm.ten_norm(positions[1:] - positions[0], axis = 1, sqrt = True)), rtol = 10**-12)
+
+def test_tiled_acceleration_jerk():
+    positions = np.random.rand(60, 3)
+    velocities = np.random.rand(60, 3)
+    masses = np.random.rand(60)
+
+    acceleration, jerk, min_distance = nm.tiled_acceleration_jerk(positions, velocities, masses, G = 2, memory = 2**12)
+
+    # TEST: SAME ACCELERATIONS AND MINIMUM DISTANCE AS TILED INTERACTIONS
+    expected_acceleration, _, expected_distance, _ = nm.tiled_interactions(positions, masses, G = 2)
+    testing.assert_allclose(acceleration, expected_acceleration, rtol = 10**-10)
+    testing.assert_almost_equal(min_distance, expected_distance, DP)
+
+    # TEST: JERK IS THE TIME DERIVATIVE OF THE ACCELERATION (BY CENTRAL DIFFERENCES ALONG THE VELOCITIES)
+    epsilon = 10**-6
+    expected_jerk = (nm.tiled_interactions(positions + epsilon * velocities, masses, G = 2)[0]
+                     - nm.tiled_interactions(positions - epsilon * velocities, masses, G = 2)[0]) / (2 * epsilon)
+    testing.assert_allclose(jerk, expected_jerk, atol = 10**-6 * np.max(np.abs(jerk)))
+
+    # TEST: SAME RESULTS FROM THE COMPILED KERNEL, AND FOR PLANAR SYSTEMS
+    jit_acceleration, jit_jerk, _ = jk.direct_acceleration_jerk(positions, velocities, masses, 2.0, np.zeros((60, 3)), np.zeros((60, 3)))
+    testing.assert_allclose(jit_acceleration, acceleration, rtol = 10**-10)
+    testing.assert_allclose(jit_jerk, jerk, rtol = 10**-10, atol = 10**-10)
+    planar_jerk = nm.tiled_acceleration_jerk(positions[:, :2], velocities[:, :2], masses)[1]
+    testing.assert_allclose(planar_jerk, jk.direct_acceleration_jerk(positions[:, :2], velocities[:, :2], masses, 1.0, np.zeros((60, 2)), np.zeros((60, 2)))[1], rtol = 10**-10, atol = 10**-10)
+
+def test_tracer_interactions():
+    positions = np.random.rand(5, 3)
+    masses = np.random.rand(5)
+    tracer_positions = np.random.rand(40, 3)
+
+    # tracers behave as bodies of mass 0, following the massive bodies
+    expected_acceleration = nm.tiled_interactions(np.vstack([positions, tracer_positions]), np.concatenate([masses, np.zeros(40)]), G = 2)[0][5:]
+    expected_distances = np.min(nm.ten_norm(tracer_positions[:, np.newaxis, :] - positions[np.newaxis, :, :], axis = 2, sqrt = True), axis = 1)
+
+    # TEST: SAME RESULTS FOR A SINGLE BLOCK OF TRACERS, AND FOR MEMORY BUDGETS WHICH SPLIT THE TRACERS INTO MANY (UNEVEN) BLOCKS
+    for memory in [2**26, 12 * 8 * 5 * 7, 1]:
+        acceleration, min_distances = nm.tracer_interactions(tracer_positions, positions, masses, G = 2, memory = memory)
+        testing.assert_allclose(acceleration, expected_acceleration, rtol = 10**-12)
+        testing.assert_allclose(min_distances, expected_distances, rtol = 10**-12)
+
+    # TEST: ACCELERATIONS CAN BE SKIPPED
+    assert nm.tracer_interactions(tracer_positions, positions, masses, acceleration = False)[0] is None
+
 def test_perc_change():
     testing.assert_array_almost_equal(nm.perc_change(5, np.array([5,-7,8,10.5])), np.array([0,2.4,0.6,1.1]), DP)
     testing.assert_almost_equal(nm.perc_change(5,5.832747327), 0.1665494654, DP)
@@ -51,8 +174,33 @@ def test_variable_delta():
     testing.assert_almost_equal(nm.variable_delta(easy_positions, easy_velocities, adaptive_constant= 0.5), np.sqrt(3 / 53), DP)
     testing.assert_almost_equal(nm.variable_delta(easy_positions, easy_velocities, adaptive_constant= 0.5), 0.23791547571544322, DP)
 
+def test_batch_variable_delta():
+    positions = np.random.rand(6, 5, 3)
+    velocities = np.random.rand(6, 5, 3)
+
+    # TEST: SAME VARIABLE DELTA AS EACH SYSTEM ON ITS OWN, INCLUDING SINGLE BODIES
+    testing.assert_allclose(nm.batch_variable_delta(positions, velocities, adaptive_constant = 0.5, delta_lim = None),
+                            [nm.variable_delta(p, v, adaptive_constant = 0.5, delta_lim = None) for p, v in zip(positions, velocities)], rtol = 10**-14)
+    testing.assert_equal(nm.batch_variable_delta(positions[:, :1], velocities[:, :1], adaptive_constant = 1),
+                         [nm.variable_delta(p, v, adaptive_constant = 1) for p, v in zip(positions[:, :1], velocities[:, :1])])
+
+    # TEST: EXCEPTION RAISED IF ANY SYSTEM HAS A DELTA THAT IS TOO SMALL
+    positions[4, 1] = positions[4, 0] + 10**-9
+    testing.assert_raises_regex(SmallAdaptiveDeltaException, "for system 4", nm.batch_variable_delta, positions, velocities, 1)
+
 def test_relative_normalised_positions():
-    pass
+    positions = np.random.rand(4, 3, 20, 3)
+    X_1, X_2 = nm.batch_relative_normalised_positions(positions)
+
+    # TEST: SAME COORDINATES AS EACH TRAJECTORY ON ITS OWN
+    assert X_1.shape == X_2.shape == (4, 20)
+    testing.assert_equal(nm.get_relative_normalised_positions(positions[1])[0], X_1[1])
+    testing.assert_equal(nm.get_relative_normalised_positions(positions[1])[1], X_2[1])
+
+    # TEST: COORDINATES ARE THE SIDES OF THE TRIANGLE, DIVIDED BY ITS PERIMETER
+    sides = [np.linalg.norm(positions[:, a] - positions[:, b], axis = -1) for a, b in [(0, 1), (1, 2), (0, 2)]]
+    testing.assert_array_almost_equal(X_1, sides[0] / sum(sides), DP)
+    testing.assert_array_almost_equal(X_2, sides[1] / sum(sides), DP)
 
 def test_pair_encoder():
 
@@ -87,7 +235,13 @@ def test_main():
     test_ten_norm()
     test_vec_cross()
     test_mat_cross()
+    test_batch_cross()
+    test_pair_indices()
+    test_tiled_interactions()
+    test_tiled_acceleration_jerk()
+    test_tracer_interactions()
     test_perc_change()
     test_variable_delta()
+    test_batch_variable_delta()
     test_relative_normalised_positions()
     test_pair_encoder()
\ No newline at end of file
@@ -1,8 +1,14 @@
 import testing_nmath
 import testing_nbody
 import testing_integrators
+import testing_backends
+import testing_collisions
+import testing_initial_conditions
 
 def test_all():
     testing_nmath.test_main()
     testing_nbody.test_main()
     testing_integrators.test_main()
+    testing_backends.test_main()
+    testing_collisions.test_main()
+    testing_initial_conditions.test_main()